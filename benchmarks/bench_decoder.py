@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""Compares the fixed-offset ERC20 call data decoder with the previous decoding path (lowercasing the input and
+the selector for every transaction and decoding with `eth_abi.decode_abi`) over the transactions of whole blocks.
+
+The blocks are read from a JSON file with a list of `eth_getBlockByNumber(number, true)` results. Record one with
+`--record ENDPOINT_URI`, which fetches the latest `--count` blocks from a node. Without a file, synthetic blocks
+with a mainnet-like mix of Ether transfers, token transfers and other contract calls are used.
+
+Usage: python benchmarks/bench_decoder.py [--blocks FILE] [--token ADDRESS] [--rounds N]
+       python benchmarks/bench_decoder.py --record ENDPOINT_URI --blocks FILE [--count N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from eth_abi import decode_abi
+from eth_utils import (
+    encode_hex,
+    function_signature_to_4byte_selector,
+)
+import requests
+from web3.utils.encoding import to_hex
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from erc20token.decoder import decode_block_calls, decode_transfer_input  # noqa: E402
+
+ERC20_TRANSFER_ABI_PREFIX = encode_hex(function_signature_to_4byte_selector('transfer(address, uint256)'))
+SYNTHETIC_TOKEN = '0x' + 'ab' * 20
+
+
+def record_blocks(endpoint_uri, count):
+    """Fetch the latest blocks with their transactions from a node."""
+    def call(method, params):
+        response = requests.post(endpoint_uri, json={'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params})
+        return response.json()['result']
+
+    head = int(call('eth_blockNumber', []), 16)
+    return [call('eth_getBlockByNumber', [hex(number), True]) for number in range(head - count + 1, head + 1)]
+
+
+def make_blocks(count, txs_per_block=150, seed=1):
+    """Generate blocks where about a third of the transactions are token transfers, a third are Ether transfers
+    and the rest are calls to other contracts."""
+    rnd = random.Random(seed)
+
+    def address():
+        return '0x' + ''.join(rnd.choice('0123456789abcdef') for _ in range(40))
+
+    blocks = []
+    for _ in range(count):
+        txs = []
+        for _ in range(txs_per_block):
+            kind = rnd.random()
+            if kind < 0.33:
+                amount = hex(rnd.getrandbits(80))[2:].rstrip('L')
+                tx_input = '0xa9059cbb' + address()[2:].rjust(64, '0') + amount.rjust(64, '0')
+                txs.append({'from': address(), 'to': SYNTHETIC_TOKEN, 'input': tx_input, 'value': '0x0'})
+            elif kind < 0.66:
+                txs.append({'from': address(), 'to': address(), 'input': '0x', 'value': '0xde0b6b3a7640000'})
+            else:
+                tx_input = '0x' + ''.join(rnd.choice('0123456789abcdef') for _ in range(8 + 64 * rnd.randint(1, 6)))
+                txs.append({'from': address(), 'to': address(), 'input': tx_input, 'value': '0x0'})
+        blocks.append({'transactions': txs})
+    return blocks
+
+
+def previous_path(txs, token_address):
+    """The decoding path used before the decoder module: checks and decodes every transaction with eth_abi."""
+    decoded = []
+    for tx in txs:
+        if not tx.get('to') or tx['to'].lower() != token_address.lower():
+            continue
+        tx_input = tx.get('input')
+        if not tx_input or tx_input == '0x':
+            continue
+        if not tx_input.lower().startswith(ERC20_TRANSFER_ABI_PREFIX.lower()):
+            continue
+        to, amount = decode_abi(['uint256', 'uint256'], tx_input[len(ERC20_TRANSFER_ABI_PREFIX):])
+        decoded.append((tx, to_hex(to), amount))
+    return decoded
+
+
+def per_tx_path(txs, token_address):
+    """The decoder module, one transaction at a time, as the monitors use it."""
+    token_address = token_address.lower()
+    decoded = []
+    for tx in txs:
+        to = tx.get('to')
+        if not to or (to != token_address and to.lower() != token_address):
+            continue
+        transfer = decode_transfer_input(tx.get('input'))
+        if transfer:
+            decoded.append((tx, transfer[0], transfer[1]))
+    return decoded
+
+
+def block_path(txs, token_address):
+    """The decoder module, a whole block in one pass (all of transfer, transferFrom and approve)."""
+    return decode_block_calls(txs, token_address)
+
+
+def run(fn, blocks, token_address, rounds):
+    """Decodes all the blocks `rounds` times, returns transactions per second and the number of decoded calls."""
+    num_txs = sum(len(block['transactions']) for block in blocks)
+    start = time.time()
+    for _ in range(rounds):
+        for block in blocks:
+            fn(block['transactions'], token_address)
+    elapsed = time.time() - start
+    num_decoded = sum(len(fn(block['transactions'], token_address)) for block in blocks)
+    return num_txs * rounds / elapsed, num_decoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--blocks', help='JSON file with recorded blocks')
+    parser.add_argument('--token', help='token contract address to decode calls of, default is the most called one')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--record', metavar='ENDPOINT_URI', help='record the latest blocks into the --blocks file')
+    parser.add_argument('--count', type=int, default=20, help='the number of blocks to record or generate')
+    args = parser.parse_args()
+
+    if args.record:
+        with open(args.blocks, 'w') as f:
+            json.dump(record_blocks(args.record, args.count), f)
+        return
+
+    if args.blocks:
+        with open(args.blocks) as f:
+            blocks = json.load(f)
+    else:
+        blocks = make_blocks(args.count)
+    token_address = args.token
+    if not token_address:
+        counts = {}
+        for block in blocks:
+            for tx in block['transactions']:
+                if tx.get('to') and tx.get('input', '0x')[:10].lower() == '0xa9059cbb':
+                    counts[tx['to'].lower()] = counts.get(tx['to'].lower(), 0) + 1
+        token_address = max(counts, key=counts.get) if counts else SYNTHETIC_TOKEN
+
+    print('{} blocks, {} transactions, token {}'.format(
+        len(blocks), sum(len(block['transactions']) for block in blocks), token_address))
+    for name, fn in [('eth_abi decode_abi (previous)', previous_path),
+                     ('decoder, per transaction', per_tx_path),
+                     ('decoder, whole block', block_path)]:
+        rate, num_decoded = run(fn, blocks, token_address, args.rounds)
+        print('{:<32} {:>12.0f} tx/s  {:>6} calls decoded'.format(name, rate, num_decoded))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""Compares the request rate of RetryHTTPProvider (a keep-alive session with a sized connection pool) with the
+per-call path of the web3 HTTPProvider (`make_post_request`) and with a new connection per request.
+
+Usage: python benchmarks/bench_provider.py [--requests N] [--threads N] [--latency SECONDS]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+from web3 import HTTPProvider
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from erc20token.provider import RetryHTTPProvider  # noqa: E402
+from fake_node import FakeNode  # noqa: E402
+
+
+class NoKeepAliveProvider(HTTPProvider):
+    """Opens a new connection for every request."""
+
+    def make_request(self, method, params):
+        response = requests.post(self.endpoint_uri, data=self.encode_rpc_request(method, params),
+                                 headers={'Content-Type': 'application/json', 'Connection': 'close'}, timeout=10)
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
+def run(provider, num_requests, num_threads):
+    """Sends num_requests `eth_blockNumber` calls from num_threads threads and returns the rate per second."""
+    per_thread = num_requests // num_threads
+
+    def worker():
+        for _ in range(per_thread):
+            provider.make_request('eth_blockNumber', [])
+
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return per_thread * num_threads / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.0, help='artificial node latency in seconds')
+    args = parser.parse_args()
+
+    with FakeNode(latency=args.latency) as node:
+        providers = [
+            ('new connection per request', NoKeepAliveProvider(node.endpoint_uri)),
+            ('web3 make_post_request', HTTPProvider(node.endpoint_uri)),
+            ('RetryHTTPProvider pool_maxsize={}'.format(args.threads),
+             RetryHTTPProvider(node.endpoint_uri, pool_maxsize=args.threads)),
+        ]
+        for name, provider in providers:
+            run(provider, args.threads, args.threads)  # warm up
+            rate = run(provider, args.requests, args.threads)
+            print('{:<40} {:>10.1f} req/s'.format(name, rate))
+
+
+if __name__ == '__main__':
+    main()
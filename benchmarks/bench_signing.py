@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""Compares the transaction signing rate of the TransactionSigner with the previous signing path (building an
+`ethereum.transactions.Transaction`, signing it and RLP encoding it for every transaction), and measures the speedup
+of batch signing in a thread pool over sequential signing. The raw transactions of all the paths are checked to be
+identical.
+
+Usage: python benchmarks/bench_signing.py [--count N] [--threads N]
+"""
+
+import argparse
+import binascii
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from erc20token.signing import TransactionSigner  # noqa: E402
+
+PRIVATE_KEY = '0x' + '11' * 32
+TOKEN_ADDRESS = '0x' + 'ab' * 20
+GAS_PRICE = 10 * 10 ** 9
+GAS = 60000
+# transfer(address, uint256) call data
+DATA = binascii.unhexlify('a9059cbb' + '00' * 12 + '12' * 20 + '%064x' % 10 ** 18)
+
+
+def legacy_sign(nonce, gas_price, gas, to, value, data):
+    from ethereum.transactions import Transaction
+    import rlp
+    tx = Transaction(nonce=nonce, gasprice=gas_price, startgas=gas, to=to, value=value, data=data)
+    return '0x' + binascii.hexlify(rlp.encode(tx.sign(PRIVATE_KEY))).decode()
+
+
+def measure(name, fn, count):
+    start = time.time()
+    result = fn()
+    elapsed = time.time() - start
+    print('{:<28} {:>10.0f} signatures/s'.format(name, count / elapsed))
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    txs = [(nonce, GAS_PRICE, GAS, TOKEN_ADDRESS, 0, DATA) for nonce in range(args.count)]
+    signer = TransactionSigner(PRIVATE_KEY)
+    raw_txs, sequential_time = measure('signer', lambda: [signer.sign(*tx) for tx in txs], args.count)
+
+    pool_signer = TransactionSigner(PRIVATE_KEY, threads=args.threads)
+    pool_signer.sign_batch(txs[:pool_signer.parallel_threshold])  # start the pool
+    pool_raw_txs, pool_time = measure('signer, {} threads'.format(args.threads),
+                                      lambda: pool_signer.sign_batch(txs), args.count)
+    pool_signer.close()
+    assert pool_raw_txs == raw_txs, 'the thread pool disagrees'
+    print('{:<28} {:>10.2f}x'.format('thread pool speedup', sequential_time / pool_time))
+
+    try:
+        legacy_sign(*txs[0])
+    except ImportError as e:
+        print('{:<28} skipped: {}'.format('previous path', e))
+    else:
+        legacy_raw_txs, _ = measure('previous path', lambda: [legacy_sign(*tx) for tx in txs], args.count)
+        assert legacy_raw_txs == raw_txs, 'the signing paths disagree'
+
+
+if __name__ == '__main__':
+    main()
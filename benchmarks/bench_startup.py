@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""Measures SDK cold start: the time to import the package, and the time to construct an SDK and to complete the
+first transaction, with and without lazy initialization, against a local simulated node with an artificial latency.
+
+Usage: python benchmarks/bench_startup.py [--latency SECONDS] [--rounds N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import erc20token  # noqa: E402
+from erc20token.provider import RetryHTTPProvider  # noqa: E402
+from fake_chain import ERC20_ABI, FakeChain, PRIVATE_KEY, TOKEN_ADDRESS  # noqa: E402
+
+IMPORT_SCRIPT = 'import time; start = time.time(); import erc20token; print(time.time() - start)'
+RECIPIENT = '0x' + '12' * 20
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def measure_import(rounds):
+    """Imports the package in fresh interpreters and returns the median import time."""
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    times = [float(subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT], cwd=root))
+             for _ in range(rounds)]
+    return median(times)
+
+
+def measure_sdk(chain, lazy, rounds):
+    """Returns the median construction time, time to the first sent transaction and the number of requests made
+    during construction."""
+    construction_times = []
+    first_tx_times = []
+    requests = []
+    for _ in range(rounds):
+        count = chain.node.request_count
+        start = time.time()
+        sdk = erc20token.SDK(provider=RetryHTTPProvider(chain.endpoint_uri), private_key=PRIVATE_KEY,
+                             contract_address=TOKEN_ADDRESS, contract_abi=ERC20_ABI, gas_limit=60000, lazy=lazy)
+        construction_times.append(time.time() - start)
+        requests.append(chain.node.request_count - count)
+        sdk.send_tokens(RECIPIENT, 1)
+        first_tx_times.append(time.time() - start)
+        chain.mine()
+    return median(construction_times), median(first_tx_times), median(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='artificial node latency in seconds')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    print('{:<28} {:>10.1f} ms'.format('import erc20token', measure_import(args.rounds) * 1000))
+    with FakeChain(latency=args.latency) as chain:
+        for name, lazy in [('eager', False), ('lazy', True)]:
+            construction, first_tx, requests = measure_sdk(chain, lazy, args.rounds)
+            print('{:<28} {:>10.1f} ms  ({} requests)'.format(name + ' construction', construction * 1000, requests))
+            print('{:<28} {:>10.1f} ms'.format(name + ' to first transaction', first_tx * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""Runs the SDK benchmark suite against a local simulated node and emits the results as JSON.
+
+The scenarios are SDK construction time, `send_tokens` throughput with 1 to 64 threads (with and without pipelined
+nonces) and with 1 to 8 sender wallets, balance query throughput (single and batched), block decode and transaction
+signing speed and monitor end-to-end latency (from sending a transaction to its pending callback, and from mining its
+block to its mined callback).
+The node is a FakeChain (see fake_chain.py); `--latency` adds an artificial round-trip time to every request.
+
+The output is a JSON object with the SDK version, the Python version, the time of the run and a list of results,
+each with a name, a metric, a value, a unit and the scenario parameters. Compare the files of two runs to track
+regressions between releases.
+
+Usage: python benchmarks/bench_suite.py [--output FILE] [--latency SECONDS] [--quick]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import erc20token  # noqa: E402
+from erc20token.provider import RetryHTTPProvider  # noqa: E402
+from erc20token.signing import TransactionSigner  # noqa: E402
+from bench_decoder import block_path, make_blocks, SYNTHETIC_TOKEN  # noqa: E402
+from fake_chain import ERC20_ABI, FakeChain, PRIVATE_KEY, TOKEN_ADDRESS  # noqa: E402
+
+THREAD_COUNTS = [1, 2, 4, 8, 16, 32, 64]
+QUICK_THREAD_COUNTS = [1, 8, 64]
+RECIPIENT = '0x' + '12' * 20
+
+
+class Results(object):
+    """Collects benchmark results."""
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, name, metric, value, unit, **params):
+        self.results.append({'name': name, 'metric': metric, 'value': round(value, 6), 'unit': unit,
+                             'params': params})
+        param_str = ' '.join('{}={}'.format(k, v) for k, v in sorted(params.items()))
+        sys.stderr.write('{:<24} {:<16} {:>14.3f} {:<6} {}\n'.format(name, metric, value, unit, param_str))
+
+
+def make_sdk(chain, private_key=PRIVATE_KEY, **kwargs):
+    return erc20token.SDK(provider=RetryHTTPProvider(chain.endpoint_uri, pool_maxsize=64), private_key=private_key,
+                          contract_address=TOKEN_ADDRESS, contract_abi=ERC20_ABI, **kwargs)
+
+
+def run_threads(num_threads, fn, count):
+    """Calls fn(index) count times from num_threads threads and returns the elapsed time."""
+    indexes = iter(range(count))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                index = next(indexes, None)
+            if index is None:
+                return
+            fn(index)
+
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.time() - start
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+def bench_construction(chain, results, rounds):
+    for name, private_key, lazy in [('anonymous', '', False), ('wallet', PRIVATE_KEY, False),
+                                    ('wallet_lazy', PRIVATE_KEY, True)]:
+        make_sdk(chain, private_key, lazy=lazy)  # warm up
+        start = time.time()
+        for _ in range(rounds):
+            make_sdk(chain, private_key, lazy=lazy)
+        results.add('sdk_construction', 'mean_time', (time.time() - start) / rounds * 1000, 'ms',
+                    mode=name, rounds=rounds)
+
+
+def bench_send_tokens(chain, results, thread_counts, count):
+    for pipelined_nonce in (False, True):
+        sdk = make_sdk(chain, gas_price=10, gas_limit=60000, pipelined_nonce=pipelined_nonce)
+        for num_threads in thread_counts:
+            elapsed = run_threads(num_threads, lambda index: sdk.send_tokens(RECIPIENT, 1), count)
+            results.add('send_tokens', 'throughput', count / elapsed, 'tx/s',
+                        threads=num_threads, pipelined_nonce=pipelined_nonce, count=count)
+            chain.mine()
+
+
+def bench_senders(chain, results, wallet_counts, num_threads, count):
+    for num_wallets in wallet_counts:
+        sender_keys = ['0x{:064x}'.format(index + 1) for index in range(num_wallets)]
+        sdk = make_sdk(chain, gas_price=10, gas_limit=60000, sender_private_keys=sender_keys)
+        elapsed = run_threads(num_threads, lambda index: sdk.send_tokens(RECIPIENT, 1), count)
+        results.add('send_tokens_senders', 'throughput', count / elapsed, 'tx/s',
+                    wallets=num_wallets, threads=num_threads, count=count)
+        chain.mine()
+
+
+def bench_balances(chain, results, count):
+    sdk = make_sdk(chain, '')
+    addresses = ['0x' + '{:040x}'.format(index + 1) for index in range(count)]
+    for num_threads in (1, 8):
+        elapsed = run_threads(num_threads, lambda index: sdk.get_address_token_balance(addresses[index]), count)
+        results.add('token_balance', 'throughput', count / elapsed, 'query/s', threads=num_threads, count=count)
+    start = time.time()
+    sdk.get_address_token_balances(addresses)
+    results.add('token_balances_batch', 'throughput', count / (time.time() - start), 'query/s',
+                count=count, batch_size=sdk.batch_size)
+
+
+def bench_decode(results, num_blocks, rounds):
+    blocks = make_blocks(num_blocks)
+    num_txs = sum(len(block['transactions']) for block in blocks)
+    start = time.time()
+    for _ in range(rounds):
+        for block in blocks:
+            block_path(block['transactions'], SYNTHETIC_TOKEN)
+    results.add('block_decode', 'throughput', num_txs * rounds / (time.time() - start), 'tx/s',
+                blocks=num_blocks, txs_per_block=num_txs // num_blocks)
+
+
+def bench_signing(results, count):
+    txs = [(nonce, 10 ** 10, 60000, TOKEN_ADDRESS, 0, b'\xa9\x05\x9c\xbb' + b'\x00' * 64) for nonce in range(count)]
+    signer = TransactionSigner(PRIVATE_KEY)
+    start = time.time()
+    signer.sign_batch(txs)
+    results.add('sign', 'throughput', count / (time.time() - start), 'tx/s', count=count)
+
+
+def bench_monitor(chain, results, count, block_time):
+    sdk = make_sdk(chain, gas_price=10, gas_limit=60000, block_time=block_time)
+    sent_at = {}
+    pending_at = {}
+    mined_at = {}
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def callback(tx_id, status, from_address, to_address, amount):
+        with lock:
+            if status == erc20token.TransactionStatus.PENDING:
+                pending_at.setdefault(tx_id, time.time())
+            else:
+                mined_at.setdefault(tx_id, time.time())
+                if len(mined_at) == count:
+                    done.set()
+
+    sdk.monitor_token_transactions(callback, to_address=RECIPIENT)
+    time.sleep(block_time)  # let the filters start
+    for _ in range(count):
+        with lock:
+            sent_at[sdk.send_tokens(RECIPIENT, 1)] = time.time()
+        time.sleep(block_time / 5.0)
+    done.wait(block_time * 10 + 10)
+
+    pending_latencies = [pending_at[tx_id] - sent_at[tx_id] for tx_id in pending_at if tx_id in sent_at]
+    mined_latencies = []
+    for tx_id in mined_at:
+        index = int(chain.txs[tx_id]['blockNumber'], 16) - int(chain.blocks[0]['number'], 16)
+        mined_latencies.append(mined_at[tx_id] - chain.block_mined_at[index])
+    for name, latencies in [('monitor_pending', pending_latencies), ('monitor_mined', mined_latencies)]:
+        if not latencies:
+            results.add(name, 'received', 0, 'tx', count=count, block_time=block_time)
+            continue
+        for pct in (50, 95, 99):
+            results.add(name, 'latency_p{}'.format(pct), percentile(latencies, pct) * 1000, 'ms',
+                        count=count, block_time=block_time)
+        results.add(name, 'received', len(latencies), 'tx', count=count, block_time=block_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--latency', type=float, default=0.0, help='artificial node latency in seconds')
+    parser.add_argument('--quick', action='store_true', help='fewer thread counts and iterations')
+    args = parser.parse_args()
+
+    scale = 1 if args.quick else 4
+    results = Results()
+    with FakeChain(latency=args.latency) as chain:
+        bench_construction(chain, results, rounds=5 * scale)
+        bench_send_tokens(chain, results, QUICK_THREAD_COUNTS if args.quick else THREAD_COUNTS, count=64 * scale)
+        bench_senders(chain, results, [1, 4] if args.quick else [1, 2, 4, 8], num_threads=32, count=64 * scale)
+        bench_balances(chain, results, count=250 * scale)
+    bench_decode(results, num_blocks=5 * scale, rounds=5)
+    bench_signing(results, count=1000 * scale)
+    with FakeChain(latency=args.latency, block_time=1) as chain:
+        bench_monitor(chain, results, count=5 * scale, block_time=1)
+
+    report = {
+        'version': erc20token.__version__,
+        'python': platform.python_version(),
+        'timestamp': int(time.time()),
+        'latency': args.latency,
+        'results': results.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
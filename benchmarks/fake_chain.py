@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""A minimal simulated chain behind FakeNode, for benchmarks that send transactions and monitor them.
+Raw transactions are accepted into a pending pool and mined into a new block on a timer or on demand. Block and
+pending transaction filters, transaction and block queries and receipts are answered from the simulated state.
+Token transfers always succeed, and no contract code is executed.
+"""
+
+from binascii import hexlify, unhexlify
+import itertools
+import threading
+from time import sleep, time
+
+from eth_utils import keccak
+from ethereum.transactions import Transaction
+import rlp
+
+from fake_node import FakeNode
+
+# a minimal ERC20 ABI for benchmark SDK instances.
+ERC20_ABI = [
+    {'constant': True, 'inputs': [], 'name': 'totalSupply', 'outputs': [{'name': '', 'type': 'uint256'}],
+     'payable': False, 'stateMutability': 'view', 'type': 'function'},
+    {'constant': True, 'inputs': [{'name': '_owner', 'type': 'address'}], 'name': 'balanceOf',
+     'outputs': [{'name': 'balance', 'type': 'uint256'}], 'payable': False, 'stateMutability': 'view',
+     'type': 'function'},
+    {'constant': False, 'inputs': [{'name': '_to', 'type': 'address'}, {'name': '_value', 'type': 'uint256'}],
+     'name': 'transfer', 'outputs': [{'name': '', 'type': 'bool'}], 'payable': False,
+     'stateMutability': 'nonpayable', 'type': 'function'},
+    {'anonymous': False, 'inputs': [{'indexed': True, 'name': 'from', 'type': 'address'},
+                                    {'indexed': True, 'name': 'to', 'type': 'address'},
+                                    {'indexed': False, 'name': 'value', 'type': 'uint256'}],
+     'name': 'Transfer', 'type': 'event'},
+]
+TOKEN_ADDRESS = '0x' + 'ab' * 20
+PRIVATE_KEY = 'a60baaa34ed125af0570a3df7d4cd3e80dd5dc5070680573f8de0ecfc1957575'
+
+
+def _hex(value):
+    return hex(value).rstrip('L')
+
+
+def _data_hex(data):
+    return '0x' + hexlify(data).decode()
+
+
+class FakeChain(object):
+    """Simulated chain state, served by a FakeNode.
+
+    :param float latency: node latency in seconds, see FakeNode.
+
+    :param float block_time: if set, a block is mined every block_time seconds. Otherwise, call `mine`.
+
+    :param int start_block: the number of the first block.
+    """
+
+    def __init__(self, latency=0, block_time=None, start_block=0x100):
+        self.block_time = block_time
+        self.blocks = []  # raw blocks, without transactions bodies
+        self.block_txs = []  # list of tx hashes per block
+        self.blocks_by_hash = {}  # block hash -> block index
+        self.block_mined_at = []  # mining time per block
+        self.txs = {}  # tx hash -> raw tx
+        self.received = []  # tx hashes in order of arrival, for pending filters
+        self.pending = []
+        self.nonces = {}  # address -> next nonce
+        self.filters = {}  # filter id -> [kind, cursor]
+        self._filter_ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._mining = False
+        self._add_block(start_block, [])
+        self.node = FakeNode(latency=latency, results={
+            'eth_blockNumber': lambda params: _hex(self.head_number),
+            'eth_getTransactionCount': self._get_transaction_count,
+            'eth_sendRawTransaction': self._send_raw_transaction,
+            'eth_getTransactionByHash': lambda params: self.txs.get(params[0]),
+            'eth_getTransactionReceipt': self._get_receipt,
+            'eth_getBlockByHash': lambda params: self._get_block(self.blocks_by_hash.get(params[0]), params[1]),
+            'eth_getBlockByNumber': self._get_block_by_number,
+            'eth_newBlockFilter': lambda params: self._new_filter('block'),
+            'eth_newPendingTransactionFilter': lambda params: self._new_filter('pending'),
+            'eth_newFilter': lambda params: self._new_filter('logs'),
+            'eth_getFilterChanges': self._get_filter_changes,
+            'eth_uninstallFilter': lambda params: self.filters.pop(params[0], None) is not None,
+            'eth_getLogs': lambda params: [],
+            'eth_getBalance': _hex(10 ** 24),
+            'eth_call': '0x' + '{:064x}'.format(10 ** 30),  # balanceOf
+            'eth_getCode': lambda params: '0x6060' if params[0].lower() == TOKEN_ADDRESS else '0x',
+        })
+        self.endpoint_uri = self.node.endpoint_uri
+
+    @property
+    def head_number(self):
+        return int(self.blocks[-1]['number'], 16)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.node.start()
+        if self.block_time:
+            self._mining = True
+            miner = threading.Thread(target=self._miner)
+            miner.daemon = True
+            miner.start()
+
+    def stop(self):
+        self._mining = False
+        self.node.stop()
+
+    def mine(self):
+        """Mine the pending transactions into a new block.
+
+        :returns: the new block number.
+        """
+        with self._lock:
+            tx_hashes, self.pending = self.pending, []
+            return self._add_block(self.head_number + 1, tx_hashes)
+
+    def _miner(self):
+        while self._mining:
+            sleep(self.block_time)
+            self.mine()
+
+    def _add_block(self, number, tx_hashes):
+        block_hash = _data_hex(keccak(str(number).encode() + str(time()).encode()))
+        parent_hash = self.blocks[-1]['hash'] if self.blocks else '0x' + '0' * 64
+        for index, tx_hash in enumerate(tx_hashes):
+            self.txs[tx_hash].update(blockHash=block_hash, blockNumber=_hex(number), transactionIndex=_hex(index))
+        self.blocks_by_hash[block_hash] = len(self.blocks)
+        self.blocks.append({
+            'number': _hex(number), 'hash': block_hash, 'parentHash': parent_hash, 'nonce': '0x' + '0' * 16,
+            'sha3Uncles': '0x' + '0' * 64, 'logsBloom': '0x' + '0' * 512, 'transactionsRoot': '0x' + '0' * 64,
+            'stateRoot': '0x' + '0' * 64, 'receiptsRoot': '0x' + '0' * 64, 'miner': '0x' + '0' * 40,
+            'difficulty': '0x1', 'totalDifficulty': _hex(number), 'extraData': '0x', 'size': '0x200',
+            'gasLimit': '0x7a1200', 'gasUsed': _hex(36000 * len(tx_hashes)), 'timestamp': _hex(int(time())),
+            'uncles': [],
+        })
+        self.block_txs.append(tx_hashes)
+        self.block_mined_at.append(time())
+        return number
+
+    def _get_block(self, index, full_txs):
+        if index is None:
+            return None
+        block = dict(self.blocks[index])
+        tx_hashes = self.block_txs[index]
+        block['transactions'] = [dict(self.txs[tx_hash]) for tx_hash in tx_hashes] if full_txs else list(tx_hashes)
+        return block
+
+    def _get_block_by_number(self, params):
+        number = self.head_number if params[0] in ('latest', 'pending') else int(params[0], 16)
+        index = number - int(self.blocks[0]['number'], 16)
+        return self._get_block(index if 0 <= index < len(self.blocks) else None, params[1])
+
+    def _get_transaction_count(self, params):
+        with self._lock:
+            return _hex(self.nonces.get(params[0].lower(), 0))
+
+    def _send_raw_transaction(self, params):
+        raw = unhexlify(params[0][2:])
+        tx = rlp.decode(raw, Transaction)
+        tx_hash = _data_hex(keccak(raw))
+        sender = _data_hex(tx.sender)
+        with self._lock:
+            if tx.nonce != self.nonces.get(sender, 0):
+                raise ValueError('nonce too low' if tx.nonce < self.nonces.get(sender, 0) else 'nonce too high')
+            self.nonces[sender] = tx.nonce + 1
+            self.txs[tx_hash] = {
+                'hash': tx_hash, 'nonce': _hex(tx.nonce), 'blockHash': None, 'blockNumber': None,
+                'transactionIndex': None, 'from': sender, 'to': _data_hex(tx.to) if tx.to else None,
+                'value': _hex(tx.value), 'gas': _hex(tx.startgas), 'gasPrice': _hex(tx.gasprice),
+                'input': _data_hex(tx.data),
+            }
+            self.pending.append(tx_hash)
+            self.received.append(tx_hash)
+        return tx_hash
+
+    def _get_receipt(self, params):
+        tx = self.txs.get(params[0])
+        if not tx or not tx['blockNumber']:
+            return None
+        return {'transactionHash': tx['hash'], 'transactionIndex': tx['transactionIndex'],
+                'blockHash': tx['blockHash'], 'blockNumber': tx['blockNumber'], 'cumulativeGasUsed': '0x8ca0',
+                'gasUsed': '0x8ca0', 'contractAddress': None, 'logs': [], 'status': '0x1'}
+
+    def _new_filter(self, kind):
+        with self._lock:
+            filter_id = _hex(next(self._filter_ids))
+            cursor = len(self.blocks) if kind == 'block' else len(self.received)
+            self.filters[filter_id] = [kind, cursor]
+            return filter_id
+
+    def _get_filter_changes(self, params):
+        with self._lock:
+            entry = self.filters.get(params[0])
+            if not entry:
+                return []
+            kind, cursor = entry
+            if kind == 'block':
+                entry[1] = len(self.blocks)
+                return [block['hash'] for block in self.blocks[cursor:]]
+            if kind == 'pending':
+                entry[1] = len(self.received)
+                return self.received[cursor:]
+            return []
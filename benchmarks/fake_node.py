@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""A local stand-in for an Ethereum JSON-RPC node, used by the benchmarks.
+The node answers every call with a canned result after an optional artificial latency, and supports batches.
+"""
+
+import json
+import threading
+from time import sleep
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+DEFAULT_RESULTS = {
+    'web3_clientVersion': 'FakeNode/v0.1',
+    'eth_blockNumber': '0x100',
+    'eth_gasPrice': '0x2540be400',
+    'eth_getBalance': '0xde0b6b3a7640000',
+    'eth_getTransactionCount': '0x0',
+    'eth_estimateGas': '0x8ca0',
+    'eth_call': '0x' + '0' * 63 + '1',
+}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeNode(object):
+    """FakeNode runs a threaded JSON-RPC http server in the background.
+
+    :param float latency: seconds to wait before answering each http request.
+
+    :param dict results: method -> result, or method -> function(params) returning the result. An exception raised
+        by the function is returned as a JSON-RPC error.
+    """
+
+    def __init__(self, latency=0, results=None, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.results = dict(DEFAULT_RESULTS)
+        self.results.update(results or {})
+        self.request_count = 0
+        self._lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                payload = json.loads(body.decode('utf-8'))
+                response = node.handle(payload)
+                data = json.dumps(response).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _ThreadingHTTPServer((host, port), Handler)
+        self.endpoint_uri = 'http://{}:{}'.format(*self.server.server_address[:2])
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, payload):
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            sleep(self.latency)
+        if isinstance(payload, list):
+            return [self.handle_call(call) for call in payload]
+        return self.handle_call(payload)
+
+    def handle_call(self, call):
+        result = self.results.get(call['method'], '0x0')
+        if callable(result):
+            try:
+                result = result(call.get('params') or [])
+            except Exception as e:
+                return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32000, 'message': str(e)}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
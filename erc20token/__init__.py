@@ -3,6 +3,7 @@
 # Copyright (C) 2017 Kin Foundation
 
 from .exceptions import SdkConfigurationError, SdkNotConfiguredError
-from .sdk import TransactionStatus, TransactionData, SDK
+from .sdk import TransactionStatus, TransactionData, TokenTransfer, SDK
+from .transfers import TransferBatch
 from .utils import create_keyfile, load_keyfile
 from .version import __version__
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from itertools import count
+from queue import Queue
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# default historical log scan configuration.
+DEFAULT_SCAN_WORKERS = 4
+DEFAULT_SCAN_CHUNK_SIZE = 1000  # blocks
+MAX_SCAN_CHUNK_SIZE = 100000  # blocks
+SCAN_TARGET_LOGS_PER_CHUNK = 2000  # a chunk with far less logs than this grows the chunk size
+
+# error message fragments that nodes use when a log query matches too many results or takes too long.
+TOO_MANY_RESULTS_ERRORS = (
+    'more than',  # infura: query returned more than 10000 results
+    'too many',
+    'limit exceeded',
+    'response size',
+    'timeout',
+    'timed out',
+)
+
+
+class RangeTooLargeError(Exception):
+    """The node refused a log query because the block range matched too many results."""
+
+
+class LogScanner(object):
+    """LogScanner reads the logs of a block range with `eth_getLogs`, in chunks fetched by a pool of worker threads.
+
+    The chunk size adapts to the density of the logs: a chunk the node refuses as too large is split in halves,
+    and the following chunks are smaller; chunks with few logs make the following chunks larger.
+    The logs are yielded in block order, and only a bounded number of chunks is fetched ahead of the consumer.
+    """
+
+    def __init__(self, provider, workers=DEFAULT_SCAN_WORKERS, chunk_size=DEFAULT_SCAN_CHUNK_SIZE,
+                 max_chunk_size=MAX_SCAN_CHUNK_SIZE):
+        """Create a new scanner.
+
+        :param provider: the JSON-RPC provider to query.
+
+        :param int workers: the number of chunks fetched concurrently.
+
+        :param int chunk_size: the initial number of blocks in a chunk.
+
+        :param int max_chunk_size: the maximal number of blocks in a chunk.
+        """
+        self.provider = provider
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self._lock = threading.Lock()
+
+    def iter_logs(self, filter_params, from_block, to_block):
+        """Iterate over the logs of a block range.
+
+        :param dict filter_params: log filter parameters (address and topics). The block range is set by the scanner.
+
+        :param int from_block: the first block to scan.
+
+        :param int to_block: the last block to scan.
+
+        :returns: a generator of raw log entries, in block and log index order.
+
+        :raises: ValueError: if the node returned an error.
+        """
+        if from_block > to_block:
+            return
+        tasks = Queue()
+        results = {}  # chunk index -> logs or exception
+        results_ready = threading.Condition()
+        stopped = []
+
+        def worker():
+            while True:
+                task = tasks.get()
+                if task is None or stopped:
+                    return
+                index, start, end = task
+                try:
+                    result = self._get_logs(filter_params, start, end)
+                except Exception as e:
+                    result = e
+                with results_ready:
+                    results[index] = result
+                    results_ready.notify_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        next_start = from_block
+        next_index = 0
+        try:
+            for index in count():
+                # keep at most two chunks per worker ahead of the consumer
+                while next_start <= to_block and next_index < index + 2 * self.workers:
+                    end = min(next_start + self.chunk_size - 1, to_block)
+                    tasks.put((next_index, next_start, end))
+                    next_index += 1
+                    next_start = end + 1
+                if index >= next_index:
+                    return
+                with results_ready:
+                    while index not in results:
+                        results_ready.wait()
+                    result = results.pop(index)
+                if isinstance(result, Exception):
+                    raise result
+                for log in result:
+                    yield log
+        finally:
+            stopped.append(True)
+            for _ in threads:
+                tasks.put(None)
+
+    def _get_logs(self, filter_params, start, end):
+        """Get the logs of a block range, splitting it if the node refuses it as too large."""
+        params = dict(filter_params, fromBlock=hex(start).rstrip('L'), toBlock=hex(end).rstrip('L'))
+        try:
+            response = self.provider.make_request('eth_getLogs', [params])
+            if 'error' in response:
+                if self._is_too_many_results(response['error']):
+                    raise RangeTooLargeError(response['error'])
+                raise ValueError(response['error'])
+        except RangeTooLargeError:
+            if start == end:
+                raise ValueError('too many logs in block {}'.format(start))
+            with self._lock:
+                self.chunk_size = max(1, min(self.chunk_size, end - start + 1) // 2)
+            logger.debug('log range {}-{} is too large, splitting'.format(start, end))
+            middle = (start + end) // 2
+            return self._get_logs(filter_params, start, middle) + self._get_logs(filter_params, middle + 1, end)
+        logs = response['result']
+        if len(logs) < SCAN_TARGET_LOGS_PER_CHUNK // 4 and end - start + 1 >= self.chunk_size:
+            with self._lock:
+                self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+        return logs
+
+    @staticmethod
+    def _is_too_many_results(error):
+        message = (error.get('message', '') if isinstance(error, dict) else str(error)).lower()
+        return any(fragment in message for fragment in TOO_MANY_RESULTS_ERRORS)
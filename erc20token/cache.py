@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from collections import OrderedDict
+import threading
+from time import time
+
+
+class LRUCache(object):
+    """A thread-safe LRU cache with optional entry expiry.
+    When the cache is full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        """Create a new cache.
+
+        :param int maxsize: the maximal number of entries.
+
+        :param number ttl: the default entry lifetime in seconds. If None, entries expire only when evicted.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, expiry time)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not None
+
+    def get(self, key, default=None, count=True):
+        """Get a cached value and mark it as recently used.
+
+        :param key: the entry key.
+
+        :param default: the value to return if the key is missing or expired.
+
+        :param bool count: whether to count this lookup in the hit/miss counters.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or (entry[1] is not None and entry[1] < time()):
+                if count:
+                    self.misses += 1
+                return default
+            self._entries[key] = entry  # reinsert as the most recently used
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Add or replace a cached value.
+
+        :param key: the entry key.
+
+        :param value: the value to cache.
+
+        :param number ttl: the entry lifetime in seconds, overrides the cache default.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time() + ttl if ttl is not None else None)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove an entry and return its value."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+class TransactionCache(object):
+    """TransactionCache keeps transactions and their receipts, taking block finality into account.
+    Transactions buried at least `confirmations` blocks deep are treated as immutable and kept until evicted.
+    Pending and shallow transactions can still change (or disappear in a reorganization), so they are only
+    valid while the chain head stays at the block they were fetched at.
+    """
+
+    def __init__(self, maxsize, confirmations):
+        """Create a new cache.
+
+        :param int maxsize: the maximal number of final transactions, and separately of recent transactions.
+
+        :param int confirmations: the number of confirmations after which a transaction is considered final.
+        """
+        self.confirmations = confirmations
+        self.hits = 0
+        self.misses = 0
+        self._final = LRUCache(maxsize)  # tx hash -> (tx, receipt)
+        self._recent = LRUCache(maxsize)  # tx hash -> (tx, receipt, head block number)
+
+    def get_final(self, tx_hash):
+        """Get a final transaction and its receipt. This lookup does not need the current block number,
+        and a miss is not counted.
+
+        :returns: (tx, receipt) tuple, or None if not found.
+        :rtype: tuple
+        """
+        entry = self._final.get(tx_hash.lower(), count=False)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def get(self, tx_hash, head):
+        """Get a cached transaction and its receipt.
+
+        :param str tx_hash: transaction id (hash).
+
+        :param int head: the current block number.
+
+        :returns: (tx, receipt) tuple, or None if not found or fetched before the head has advanced.
+        :rtype: tuple
+        """
+        tx_hash = tx_hash.lower()
+        entry = self._final.get(tx_hash, count=False)
+        if entry is None:
+            entry = self._recent.get(tx_hash, count=False)
+            if entry is not None and entry[2] != head:
+                self._recent.pop(tx_hash)
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0], entry[1]
+
+    def set(self, tx_hash, tx, receipt, head):
+        """Cache a transaction and its receipt.
+
+        :param str tx_hash: transaction id (hash).
+
+        :param dict tx: transaction object. Unknown (None) transactions are not cached.
+
+        :param dict receipt: transaction receipt object, None if the transaction is pending.
+
+        :param int head: the block number the transaction was fetched at.
+        """
+        if not tx:
+            return
+        tx_hash = tx_hash.lower()
+        block_number = tx.get('blockNumber')
+        if receipt and block_number is not None and head - int(block_number) + 1 >= self.confirmations:
+            self._recent.pop(tx_hash)
+            self._final.set(tx_hash, (tx, receipt))
+        else:
+            self._recent.set(tx_hash, (tx, receipt, head))
+
+    def invalidate_recent(self):
+        """Drop all pending and shallow transactions, for example after a chain reorganization."""
+        self._recent.clear()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from collections import OrderedDict
+import threading
+from time import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+# default chain head configuration.
+DEFAULT_HEAD_STALENESS = 1  # seconds
+DEFAULT_BLOCK_HISTORY = 64  # blocks
+STOP_JOIN_TIMEOUT = 1  # seconds to wait for the poller thread on stop
+
+
+class ChainHeadTracker(object):
+    """ChainHeadTracker keeps the current block number and the hashes of recent blocks.
+    The head is updated from the blocks fetched by the new block dispatcher (see `update`), from an optional
+    background poller, or, when it is older than the staleness bound, by fetching the latest block on demand.
+    """
+
+    def __init__(self, web3, max_staleness=DEFAULT_HEAD_STALENESS, history=DEFAULT_BLOCK_HISTORY):
+        """Create a new tracker.
+
+        :param web3: the web3 instance to query.
+
+        :param number max_staleness: the maximal age of the head in seconds before it is refreshed on demand.
+
+        :param int history: the number of recent block hashes to keep.
+        """
+        self.web3 = web3
+        self.max_staleness = max_staleness
+        self.history = history
+        self.block_number = None
+        self.updated_at = 0
+        self._block_hashes = OrderedDict()  # block number -> block hash
+        self._lock = threading.Lock()
+        self._poller = None
+        self._stopped = threading.Event()
+
+    def get_block_number(self):
+        """Get the current block number, refreshing it if it is stale.
+
+        :returns: the current block number.
+        :rtype: int
+        """
+        if self.block_number is None or time() - self.updated_at > self.max_staleness:
+            self.refresh()
+        return self.block_number
+
+    def get_block_hash(self, block_number):
+        """Get the hash of a recent block.
+
+        :returns: the block hash, or None if the block is not among the recent blocks.
+        :rtype: str
+        """
+        with self._lock:
+            return self._block_hashes.get(block_number)
+
+    def refresh(self):
+        """Fetch the latest block header from the node."""
+        block = self.web3.eth.getBlock('latest')
+        self.update(block['number'], block['hash'])
+
+    def update(self, block_number, block_hash=None):
+        """Set the head. A lower block number than the current one is only accepted with a block hash that differs
+        from the known hash of that block, as it happens in reorganizations. Otherwise it is a late notification
+        and is ignored.
+
+        :param int block_number: the head block number.
+
+        :param str block_hash: the head block hash, if known.
+        """
+        with self._lock:
+            if self.block_number is not None and block_number < self.block_number and \
+                    (not block_hash or self._block_hashes.get(block_number, block_hash) == block_hash):
+                return
+            self.block_number = block_number
+            self.updated_at = time()
+            if block_hash:
+                # blocks above the new head are no longer part of the chain
+                for number in [number for number in self._block_hashes if number >= block_number]:
+                    del self._block_hashes[number]
+                self._block_hashes[block_number] = block_hash
+                while len(self._block_hashes) > self.history:
+                    self._block_hashes.popitem(last=False)
+
+    def start_polling(self, interval):
+        """Start refreshing the head in a background thread.
+
+        :param number interval: the polling interval in seconds.
+        """
+        if self._poller:
+            return
+        stopped = self._stopped = threading.Event()
+
+        def _runner():
+            while not stopped.is_set():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.exception(e)
+                stopped.wait(interval)
+
+        self._poller = threading.Thread(target=_runner)
+        self._poller.daemon = True
+        self._poller.start()
+
+    def stop_polling(self):
+        """Stop the background poller, if running, and wait shortly for it to exit."""
+        self._stopped.set()
+        poller, self._poller = self._poller, None
+        if poller and poller is not threading.current_thread():
+            poller.join(STOP_JOIN_TIMEOUT)
+
+
+class ConfirmationTracker(object):
+    """ConfirmationTracker follows transactions seen in new blocks until they reach a set of confirmation depths,
+    and detects transactions whose blocks were orphaned in a chain reorganization.
+
+    The tracker is fed every new block (see `on_block`) and keeps a ring buffer of recent block hashes. In the usual
+    case, a new block extends the known chain and no node request is needed. If the parent hash of a new block does
+    not match the known hash, the new chain is followed back to the fork point, and the transactions in the blocks
+    that are no longer part of the chain are reported as reverted.
+    """
+
+    def __init__(self, history=DEFAULT_BLOCK_HISTORY):
+        """Create a new tracker.
+
+        :param int history: the number of recent block hashes to keep. Reorganizations deeper than this are not
+            detected.
+        """
+        self.history = history
+        self.head = None
+        self.reorgs = 0
+        self._block_hashes = OrderedDict()  # block number -> block hash
+        self._watched = {}  # (tx hash, owner) -> [block number, block hash, remaining depths, event args]
+        self._lock = threading.Lock()
+
+    def watch(self, tx_hash, block_number, block_hash, owner, depths, *args):
+        """Start following a mined transaction.
+
+        :param str tx_hash: the transaction id (hash).
+
+        :param int block_number: the number of the block the transaction is in.
+
+        :param str block_hash: the hash of the block the transaction is in.
+
+        :param owner: the owner of the watch, for example a subscription id.
+
+        :param list depths: the confirmation depths to report.
+
+        :param args: extra event arguments.
+
+        :returns: the events of the depths already reached, see `on_block`.
+        :rtype: list
+        """
+        with self._lock:
+            self._watched[(tx_hash, owner)] = [block_number, block_hash, sorted(depths), args]
+            return self._get_confirmation_events()
+
+    def is_watching(self):
+        """Check whether any transaction is followed."""
+        return bool(self._watched)
+
+    def unwatch(self, owner):
+        """Stop following the transactions of an owner."""
+        with self._lock:
+            for key in [key for key in self._watched if key[1] == owner]:
+                del self._watched[key]
+
+    def on_block(self, block_number, block_hash, parent_hash, get_block_fn):
+        """Process a new block.
+
+        :param int block_number: the block number.
+
+        :param str block_hash: the block hash.
+
+        :param str parent_hash: the parent block hash.
+
+        :param get_block_fn: a function returning a block by its hash, used to follow the new chain back to the fork
+            point on a reorganization.
+
+        :returns: a list of events (tx hash, owner, num_confirmations, args). A reverted transaction has
+            num_confirmations of 0.
+        :rtype: list
+        """
+        with self._lock:
+            if self._block_hashes.get(block_number) == block_hash:  # a late notification of a known block
+                return []
+            new_hashes = {block_number: block_hash}
+            number, expected_parent = block_number - 1, parent_hash
+            while number in self._block_hashes and self._block_hashes[number] != expected_parent and \
+                    block_number - number < self.history:
+                # the known block is not an ancestor of the new block, follow the new chain back
+                parent = get_block_fn(expected_parent)
+                if not parent:
+                    break
+                new_hashes[number] = parent['hash']
+                number, expected_parent = number - 1, parent['parentHash']
+
+            orphaned = set()
+            for number, known_hash in self._block_hashes.items():
+                if number > block_number or (number in new_hashes and new_hashes[number] != known_hash):
+                    orphaned.add(known_hash)
+            if orphaned:
+                self.reorgs += 1
+                logger.warning('chain reorganization at block {}, {} blocks orphaned'.format(block_number,
+                                                                                               len(orphaned)))
+            for number in [number for number in self._block_hashes if number > block_number or number in new_hashes]:
+                del self._block_hashes[number]
+            for number in sorted(new_hashes):
+                self._block_hashes[number] = new_hashes[number]
+            while len(self._block_hashes) > self.history:
+                self._block_hashes.popitem(last=False)
+            self.head = block_number
+
+            events = []
+            for key, watched in list(self._watched.items()):
+                if watched[1] in orphaned:
+                    del self._watched[key]
+                    events.append((key[0], key[1], 0, watched[3]))
+            return events + self._get_confirmation_events()
+
+    def _get_confirmation_events(self):
+        events = []
+        if self.head is None:
+            return events
+        for key, watched in list(self._watched.items()):
+            block_number, _, depths, args = watched
+            num_confirmations = self.head - block_number + 1
+            while depths and depths[0] <= num_confirmations:
+                events.append((key[0], key[1], depths.pop(0), args))
+            if not depths:
+                del self._watched[key]
+        return events
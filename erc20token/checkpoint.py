@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+import json
+import os
+import sqlite3
+import threading
+
+
+class CheckpointStore(object):
+    """CheckpointStore keeps the last fully processed block of monitors across restarts.
+    Subclass it to keep checkpoints in your own storage.
+    """
+
+    def get_checkpoint(self, key):
+        """Get the last processed block of a monitor.
+
+        :param str key: the monitor key.
+
+        :returns: the block number, or None if there is no checkpoint.
+        :rtype: int
+        """
+        raise NotImplementedError
+
+    def set_checkpoint(self, key, block_number):
+        """Record the last processed block of a monitor.
+
+        :param str key: the monitor key.
+
+        :param int block_number: the block number.
+        """
+        raise NotImplementedError
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Keeps checkpoints in a JSON file. The file is replaced atomically on every update."""
+
+    def __init__(self, path):
+        """Create a new store.
+
+        :param str path: the path of the checkpoint file. It is created if it does not exist.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._checkpoints = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._checkpoints = json.load(f)
+
+    def get_checkpoint(self, key):
+        with self._lock:
+            return self._checkpoints.get(key)
+
+    def set_checkpoint(self, key, block_number):
+        with self._lock:
+            self._checkpoints[key] = block_number
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._checkpoints, f)
+                f.flush()
+                os.fsync(f.fileno())
+            if hasattr(os, 'replace'):
+                os.replace(tmp_path, self.path)
+            else:  # python 2
+                os.rename(tmp_path, self.path)
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """Keeps checkpoints in an SQLite database."""
+
+    def __init__(self, path):
+        """Create a new store.
+
+        :param str path: the path of the database file. It is created if it does not exist.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS checkpoints (key TEXT PRIMARY KEY, block_number INTEGER)')
+
+    def get_checkpoint(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT block_number FROM checkpoints WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_checkpoint(self, key, block_number):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO checkpoints (key, block_number) VALUES (?, ?)',
+                               (key, block_number))
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
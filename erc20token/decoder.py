@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+"""Fast decoding of ERC20 call data.
+
+The arguments of `transfer`, `transferFrom` and `approve` are static ABI words at fixed offsets, so they are read
+by slicing the hex input string and converting the slices, without a general-purpose ABI decoder.
+"""
+
+# method names.
+TRANSFER = 'transfer'
+TRANSFER_FROM = 'transferFrom'
+APPROVE = 'approve'
+
+# hex 4-byte selectors, without the 0x prefix.
+TRANSFER_SELECTOR = 'a9059cbb'  # transfer(address,uint256)
+TRANSFER_FROM_SELECTOR = '23b872dd'  # transferFrom(address,address,uint256)
+APPROVE_SELECTOR = '095ea7b3'  # approve(address,uint256)
+
+# selector -> (method name, number of argument words)
+_METHODS = {
+    TRANSFER_SELECTOR: (TRANSFER, 2),
+    TRANSFER_FROM_SELECTOR: (TRANSFER_FROM, 3),
+    APPROVE_SELECTOR: (APPROVE, 2),
+}
+
+# hex offsets in the input string, including the '0x' prefix.
+_ARGS_OFFSET = 10
+_WORD = 64
+_ADDRESS_PADDING = 24  # an address is the last 20 bytes of its word
+
+
+def decode_input(tx_input):
+    """Decode ERC20 `transfer`, `transferFrom` or `approve` call data.
+
+    :param str tx_input: the transaction input, a 0x-prefixed hex string.
+
+    :returns: the method name and its arguments: (to, amount) for `transfer`, (from, to, amount) for `transferFrom`
+        and (spender, amount) for `approve`. Addresses are lowercase hex strings, amounts are integers in wei.
+        None if the input is not one of these calls or is too short.
+    :rtype: tuple
+    """
+    if not tx_input or len(tx_input) < _ARGS_OFFSET:
+        return None
+    method = _METHODS.get(tx_input[2:_ARGS_OFFSET]) or _METHODS.get(tx_input[2:_ARGS_OFFSET].lower())
+    if not method:
+        return None
+    name, num_words = method
+    if len(tx_input) < _ARGS_OFFSET + num_words * _WORD:
+        return None
+    args = []
+    offset = _ARGS_OFFSET
+    for _ in range(num_words - 1):
+        args.append('0x' + tx_input[offset + _ADDRESS_PADDING:offset + _WORD].lower())
+        offset += _WORD
+    args.append(int(tx_input[offset:offset + _WORD], 16))
+    return name, tuple(args)
+
+
+def decode_transfer_input(tx_input):
+    """Decode ERC20 `transfer` call data.
+
+    :param str tx_input: the transaction input, a 0x-prefixed hex string.
+
+    :returns: the recipient address (lowercase) and the amount in wei, or None if the input is not a transfer call.
+    :rtype: tuple
+    """
+    if not tx_input or len(tx_input) < _ARGS_OFFSET + 2 * _WORD:
+        return None
+    selector = tx_input[2:_ARGS_OFFSET]
+    if selector != TRANSFER_SELECTOR and selector.lower() != TRANSFER_SELECTOR:
+        return None
+    return ('0x' + tx_input[_ARGS_OFFSET + _ADDRESS_PADDING:_ARGS_OFFSET + _WORD].lower(),
+            int(tx_input[_ARGS_OFFSET + _WORD:_ARGS_OFFSET + 2 * _WORD], 16))
+
+
+def decode_block_calls(txs, contract_address):
+    """Decode the ERC20 calls to a contract among a list of transactions, such as the transactions of a block.
+
+    :param list txs: transaction objects.
+
+    :param str contract_address: the token contract address.
+
+    :returns: a list of (tx, method name, arguments) tuples, in transaction order. See `decode_input`.
+    :rtype: list
+    """
+    contract_address = contract_address.lower()
+    calls = []
+    for tx in txs:
+        to = tx.get('to')
+        if not to or (to != contract_address and to.lower() != contract_address):
+            continue
+        decoded = decode_input(tx.get('input'))
+        if decoded:
+            calls.append((tx, decoded[0], decoded[1]))
+    return calls
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from eth_utils import (
+    encode_hex,
+    event_signature_to_log_topic,
+    is_integer,
+    to_checksum_address,
+)
+
+# ERC20 Transfer(address indexed _from, address indexed _to, uint256 _value) event topic.
+TRANSFER_EVENT_TOPIC = encode_hex(event_signature_to_log_topic('Transfer(address,address,uint256)'))
+
+
+def address_to_topic(address):
+    """Encode an address as an indexed event topic (left-padded to 32 bytes)."""
+    return '0x' + address.lower()[2:].rjust(64, '0')
+
+
+def topic_to_address(topic):
+    """Decode an address from an indexed event topic."""
+    return to_checksum_address('0x' + topic[-40:])
+
+
+def get_transfer_filter_params(contract_address, from_address=None, to_address=None, from_block=None,
+                               to_block=None):
+    """Build `eth_newFilter`/`eth_getLogs` parameters matching token Transfer events.
+    The node does the filtering: events are matched by the contract address and by the from/to indexed topics.
+
+    :param str contract_address: the token contract address.
+
+    :param str from_address: if provided, only transfers from this address match.
+
+    :param str to_address: if provided, only transfers to this address match.
+
+    :param from_block: the first block to match, number or tag.
+
+    :param to_block: the last block to match, number or tag.
+
+    :returns: filter parameters
+    :rtype: dict
+    """
+    topics = [TRANSFER_EVENT_TOPIC,
+              address_to_topic(from_address) if from_address else None,
+              address_to_topic(to_address) if to_address else None]
+    while topics[-1] is None:
+        topics.pop()
+    filter_params = {'address': contract_address, 'topics': topics}
+    if from_block is not None:
+        filter_params['fromBlock'] = hex(from_block).rstrip('L') if is_integer(from_block) else from_block
+    if to_block is not None:
+        filter_params['toBlock'] = hex(to_block).rstrip('L') if is_integer(to_block) else to_block
+    return filter_params
+
+
+def is_transfer_log(log):
+    """Check whether a log entry is a well-formed Transfer event."""
+    topics = log.get('topics') or []
+    return len(topics) == 3 and topics[0].lower() == TRANSFER_EVENT_TOPIC
+
+
+def decode_transfer_log(log):
+    """Decode a Transfer event log entry, either raw or formatted by web3.
+
+    :param dict log: the log entry.
+
+    :returns: transaction id (hash), from address, to address, amount in wei, block number, log index
+    :rtype: tuple
+    """
+    topics = log['topics']
+    data = log['data']
+    return (log['transactionHash'],
+            topic_to_address(topics[1]),
+            topic_to_address(topics[2]),
+            int(data, 16) if data and data != '0x' else 0,
+            _to_int(log.get('blockNumber')),
+            _to_int(log.get('logIndex')))
+
+
+def _to_int(value):
+    if value is None or is_integer(value):
+        return value
+    return int(value, 16)
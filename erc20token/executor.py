@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from collections import deque
+import os
+import pickle
+from queue import Empty, Full, Queue
+import tempfile
+import threading
+from time import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+# backpressure policies, applied when a worker queue is full.
+POLICY_BLOCK = 'block'  # wait for room in the queue, which also delays filter polling
+POLICY_DROP_OLDEST = 'drop_oldest'  # drop the oldest queued event
+POLICY_SPILL = 'spill'  # write the event to a file on disk, and run it when the queue drains
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_SPILL)
+
+# default callback executor configuration.
+DEFAULT_CALLBACK_QUEUE_SIZE = 1000  # events per worker
+
+# the number of recent callbacks the latency metrics are computed over.
+LATENCY_WINDOW = 1000
+
+
+class CallbackExecutor(object):
+    """CallbackExecutor runs monitoring callbacks in a pool of worker threads, so that a slow callback does not delay
+    filter polling.
+
+    Every worker has its own bounded queue, and the events of the same key (transaction id) always go to the same
+    worker, so they are called back in the order they were submitted. When a queue is full, the backpressure policy
+    decides whether to wait, to drop the oldest event, or to spill the event to disk. Spilled events keep their
+    order: while a worker has spilled events, its new events are spilled too.
+    """
+
+    def __init__(self, workers, queue_size=DEFAULT_CALLBACK_QUEUE_SIZE, policy=POLICY_BLOCK, spill_dir=None):
+        """Create a new executor and start its workers.
+
+        :param int workers: the number of worker threads.
+
+        :param int queue_size: the maximal number of queued events per worker.
+
+        :param str policy: the backpressure policy: 'block', 'drop_oldest' or 'spill'.
+
+        :param str spill_dir: the directory of the spill files, if the policy is 'spill'.
+            If not provided, the system temporary directory is used.
+        """
+        if policy not in POLICIES:
+            raise ValueError('unknown backpressure policy: {}'.format(policy))
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.errors = 0
+        self._spilled_callbacks = {}  # callback id -> [callback, number of spilled events that refer to it]
+        self._latencies = deque(maxlen=LATENCY_WINDOW)  # (queue wait, callback run time)
+        self._next_seq = 0
+        self._unfinished = set()  # sequence numbers of the queued and running events
+        self._deferred = deque()  # (sequence number, function) to call when all the earlier events are done
+        self._lock = threading.Lock()
+        self._running = True
+        self._workers = [_Worker(self, queue_size) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, key, callback_fn, *args):
+        """Queue a callback.
+
+        :param str key: the ordering key. The callbacks of the same key run in the order they are submitted.
+
+        :param callback_fn: the callback function.
+
+        :param args: the callback arguments.
+        """
+        worker = self._workers[hash(key) % len(self._workers)]
+        with self._lock:
+            self.submitted += 1
+            seq = self._next_seq
+            self._next_seq += 1
+            self._unfinished.add(seq)
+        worker.put((seq, callback_fn, args, time()))
+
+    def call_when_done(self, fn):
+        """Call a function once all the callbacks submitted so far are done (or dropped).
+        The function is called in a worker thread, or immediately if there are no such callbacks.
+
+        :param fn: the function to call, without arguments.
+        """
+        with self._lock:
+            if self._unfinished:
+                self._deferred.append((self._next_seq, fn))
+                return
+        fn()
+
+    def stats(self):
+        """Get executor metrics.
+
+        :returns: the number of queued (and spilled) events, the event counters, and the average and maximal
+            queue wait and callback run time in seconds over the recent callbacks.
+        :rtype: dict
+        """
+        with self._lock:
+            latencies = list(self._latencies)
+        waits = [wait for wait, _ in latencies]
+        run_times = [run_time for _, run_time in latencies]
+        return {
+            'queue_depth': sum(worker.depth() for worker in self._workers),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'errors': self.errors,
+            'queue_wait_avg': sum(waits) / len(waits) if waits else 0,
+            'queue_wait_max': max(waits) if waits else 0,
+            'callback_time_avg': sum(run_times) / len(run_times) if run_times else 0,
+            'callback_time_max': max(run_times) if run_times else 0,
+        }
+
+    def shutdown(self):
+        """Stop the workers. Queued events are discarded."""
+        self._running = False
+        for worker in self._workers:
+            worker.stop()
+        with self._lock:
+            self._spilled_callbacks.clear()
+
+    def _run(self, event):
+        seq, callback_fn, args, submitted_at = event
+        started_at = time()
+        try:
+            callback_fn(*args)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.exception(e)
+        with self._lock:
+            self.completed += 1
+            self._latencies.append((started_at - submitted_at, time() - started_at))
+        self._finish(seq)
+
+    def _drop(self, event):
+        with self._lock:
+            self.dropped += 1
+        self._finish(event[0])
+
+    def _pack(self, event):
+        """Replace the callback of an event by its id, so that the event can be pickled to a spill file.
+        The callback is kept until the event is unpacked, so its id cannot be reused meanwhile.
+        """
+        seq, callback_fn, args, submitted_at = event
+        with self._lock:
+            entry = self._spilled_callbacks.setdefault(id(callback_fn), [callback_fn, 0])
+            entry[1] += 1
+        return seq, id(callback_fn), args, submitted_at
+
+    def _unpack(self, event):
+        """Restore the callback of a spilled event, and release it once no spilled event refers to it."""
+        seq, callback_id, args, submitted_at = event
+        with self._lock:
+            entry = self._spilled_callbacks[callback_id]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._spilled_callbacks[callback_id]
+        return seq, entry[0], args, submitted_at
+
+    def _finish(self, seq):
+        """Mark an event as done, and call the deferred functions that no unfinished event precedes."""
+        ready = []
+        with self._lock:
+            self._unfinished.discard(seq)
+            if self._deferred:
+                low = min(self._unfinished) if self._unfinished else self._next_seq
+                while self._deferred and self._deferred[0][0] <= low:
+                    ready.append(self._deferred.popleft()[1])
+        for fn in ready:
+            try:
+                fn()
+            except Exception as e:
+                logger.exception(e)
+
+
+class _Worker(object):
+    """A worker thread with a bounded queue and an optional spill file."""
+
+    def __init__(self, executor, queue_size):
+        self.executor = executor
+        self.queue = Queue(queue_size)
+        self._spill_file = None
+        self._spill_read_pos = 0
+        self._spill_count = 0
+        self._spill_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._runner)
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        try:
+            self.queue.put_nowait(None)
+        except Full:
+            pass
+        with self._spill_lock:
+            if self._spill_file:
+                self._spill_file.close()
+                self._spill_file = None
+
+    def depth(self):
+        return self.queue.qsize() + self._spill_count
+
+    def put(self, event):
+        policy = self.executor.policy
+        if policy == POLICY_BLOCK:
+            self.queue.put(event)
+            return
+        if policy == POLICY_SPILL:
+            with self._spill_lock:
+                if self._spill_count or not self._put_nowait(event):
+                    self._spill(event)
+            return
+        while not self._put_nowait(event):  # drop oldest
+            try:
+                self.executor._drop(self.queue.get_nowait())
+            except Empty:
+                pass
+
+    def _put_nowait(self, event):
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except Full:
+            return False
+
+    def _spill(self, event):
+        if not self._spill_file:
+            self._spill_file = tempfile.TemporaryFile(dir=self.executor.spill_dir)
+            self._spill_read_pos = 0
+        self._spill_file.seek(0, os.SEEK_END)
+        pickle.dump(self.executor._pack(event), self._spill_file, pickle.HIGHEST_PROTOCOL)
+        self._spill_count += 1
+        with self.executor._lock:
+            self.executor.spilled += 1
+
+    def _unspill(self):
+        """Read the oldest spilled event. The spill file is discarded once it is drained."""
+        with self._spill_lock:
+            if not self._spill_count:
+                return None
+            self._spill_file.seek(self._spill_read_pos)
+            event = pickle.load(self._spill_file)
+            self._spill_read_pos = self._spill_file.tell()
+            self._spill_count -= 1
+            if not self._spill_count:
+                self._spill_file.close()
+                self._spill_file = None
+        return self.executor._unpack(event)
+
+    def _runner(self):
+        while self.executor._running:
+            try:
+                event = self.queue.get(timeout=0.5 if self.executor.policy == POLICY_SPILL else None)
+            except Empty:
+                event = self._unspill()
+                if event is None:
+                    continue
+            if event is None:  # stopped
+                return
+            self.executor._run(event)
+            if self.queue.empty() and self._spill_count:
+                # the queue drained, run the spilled events in their order
+                event = self._unspill()
+                while event is not None and self.executor._running:
+                    self.executor._run(event)
+                    event = self._unspill()
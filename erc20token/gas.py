@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from collections import deque
+import threading
+from time import time
+
+from eth_utils import (
+    encode_hex,
+    function_signature_to_4byte_selector,
+)
+from web3.utils.formatters import hex_to_integer
+
+from .cache import LRUCache
+from .provider import batch_request
+
+import logging
+logger = logging.getLogger(__name__)
+
+# default gas estimate cache configuration.
+DEFAULT_GAS_CACHE_TTL = 300  # seconds
+DEFAULT_GAS_CACHE_SIZE = 10000
+DEFAULT_GAS_RESAMPLE_EVERY = 100  # cache hits
+
+# recipient properties (token balance, contract code) change, keep them for a short time only.
+RECIPIENT_INFO_TTL = 60
+
+# gas price urgency tiers, and the percentile of the gas prices included in recent blocks each tier pays.
+URGENCY_SLOW = 'slow'
+URGENCY_STANDARD = 'standard'
+URGENCY_FAST = 'fast'
+URGENCIES = (URGENCY_SLOW, URGENCY_STANDARD, URGENCY_FAST)
+DEFAULT_URGENCY_PERCENTILES = {URGENCY_SLOW: 30, URGENCY_STANDARD: 60, URGENCY_FAST: 90}
+
+# default gas price oracle configuration.
+DEFAULT_GAS_ORACLE_BLOCKS = 20  # recent blocks sampled
+DEFAULT_GAS_ORACLE_TTL = 300  # seconds an oracle price is used after the last successful refresh
+STOP_JOIN_TIMEOUT = 1  # seconds to wait for the poller thread on stop
+
+ERC20_TRANSFER_SELECTOR = function_signature_to_4byte_selector('transfer(address,uint256)')
+ERC20_BALANCE_OF_SELECTOR = function_signature_to_4byte_selector('balanceOf(address)')
+
+_MISSING = object()
+
+
+class GasEstimateCache(object):
+    """GasEstimateCache keeps gas estimates keyed by transaction shape, so that similar transactions do not pay an
+    `eth_estimateGas` round trip each.
+
+    The shape of an Ether transaction is whether the recipient is a contract. The shape of a contract call is the
+    contract, the function selector and, for token transfers, whether the recipient token balance is zero, since
+    creating a balance costs more gas than updating it. Getting an estimate never makes a request: the recipient
+    properties are looked up in the JSON-RPC batch of the gas estimate of a missed shape (see
+    `get_recipient_calls`), and cached for a short time.
+
+    Every `resample_every` hits, the estimate for a shape is dropped and sampled again from the node.
+    """
+
+    def __init__(self, web3, token_contract, ttl=DEFAULT_GAS_CACHE_TTL, maxsize=DEFAULT_GAS_CACHE_SIZE,
+                 resample_every=DEFAULT_GAS_RESAMPLE_EVERY, batch_size=100):
+        self.web3 = web3
+        self.token_address = token_contract.address.lower()
+        self.resample_every = resample_every
+        self.batch_size = batch_size
+        self.resamples = 0
+        self._unknown_recipients = 0  # misses of transactions with uncached recipient properties
+        self._estimates = LRUCache(maxsize, ttl)  # shape -> [gas, hits since sampled]
+        self._recipients = LRUCache(maxsize, RECIPIENT_INFO_TTL)  # (kind, address) -> bool
+        self._lock = threading.Lock()
+
+    @property
+    def hits(self):
+        return self._estimates.hits
+
+    @property
+    def misses(self):
+        return self._estimates.misses + self._unknown_recipients
+
+    def stats(self):
+        """Get cache counters.
+
+        :returns: hits, misses, resamples and the number of cached shapes.
+        :rtype: dict
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'resamples': self.resamples, 'size': len(self._estimates)}
+
+    def get(self, tx):
+        """Get a cached estimate for the transaction shape.
+
+        :param dict tx: the transaction, with binary `data`.
+
+        :returns: gas estimate, or None if there is no estimate, the recipient properties are not cached, or the
+            shape is due for resampling.
+        :rtype: int
+        """
+        shape = self._get_shape(tx)
+        if shape is None:
+            with self._lock:
+                self._unknown_recipients += 1
+            return None
+        entry = self._estimates.get(shape)
+        if entry is None:
+            return None
+        with self._lock:
+            entry[1] += 1
+            if self.resample_every and entry[1] >= self.resample_every:
+                self.resamples += 1
+                self._estimates.pop(shape)
+                return None
+        return entry[0]
+
+    def set(self, tx, gas):
+        """Cache an estimate for the transaction shape.
+
+        :param dict tx: the transaction the estimate was made for, with binary `data`.
+
+        :param int gas: the gas estimate.
+        """
+        shape = self._get_shape(tx)
+        if shape is not None:
+            self._estimates.set(shape, [gas, 0])
+
+    def get_recipient_calls(self, txs):
+        """Get the JSON-RPC calls that look up the uncached recipient properties of transactions. Send them in the
+        batch of the gas estimates, and pass their responses to `set_recipient_info`.
+
+        :param list txs: the transactions, with binary `data`.
+
+        :returns: a list of (recipient key, (method, params)) tuples.
+        :rtype: list
+        """
+        keys = []
+        for tx in txs:
+            key = self._get_recipient_key(tx)
+            if key and self._recipients.get(key, _MISSING, count=False) is _MISSING and key not in keys:
+                keys.append(key)
+        return [(key, self._get_recipient_call(key)) for key in keys]
+
+    def set_recipient_info(self, key, response):
+        """Cache the recipient properties from the response of a call of `get_recipient_calls`.
+
+        :param tuple key: the recipient key of the call.
+
+        :param dict response: the raw JSON-RPC response.
+        """
+        if 'error' in response:
+            logger.warning('cannot look up recipient: ' + str(response['error']))
+            return
+        self._recipients.set(key, self._parse_recipient_result(key, response['result']))
+
+    def _get_shape(self, tx):
+        """The shape of a transaction, or None if its recipient properties are not cached."""
+        data = tx.get('data') or b''
+        key = self._get_recipient_key(tx)
+        if key is None:
+            return 'call', tx['to'].lower(), data[:4]
+        info = self._recipients.get(key, _MISSING, count=False)
+        if info is _MISSING:
+            return None
+        if not data:
+            return 'ether', info
+        return 'call', self.token_address, data[:4], info
+
+    def _get_recipient_key(self, tx):
+        data = tx.get('data') or b''
+        if not data:
+            return 'contract', tx['to'].lower()
+        if tx['to'].lower() == self.token_address and data[:4] == ERC20_TRANSFER_SELECTOR:
+            return 'zero_balance', encode_hex(data[16:36]).lower()
+        return None
+
+    def _get_recipient_call(self, key):
+        kind, address = key
+        if kind == 'contract':
+            return 'eth_getCode', [address, 'latest']
+        return 'eth_call', [{'to': self.token_address,
+                             'data': encode_hex(ERC20_BALANCE_OF_SELECTOR) + address[2:].rjust(64, '0')},
+                            'latest']
+
+    @staticmethod
+    def _parse_recipient_result(key, result):
+        if key[0] == 'contract':
+            return result not in ('0x', '0x0')
+        return result == '0x' or hex_to_integer(result) == 0
+
+
+class GasPriceOracle(object):
+    """GasPriceOracle suggests gas prices from the gas prices of the transactions included in recent blocks.
+
+    A background thread fetches the blocks mined since its previous refresh (all of them in one JSON-RPC batch),
+    and computes the price of every urgency tier as a percentile of the gas prices of the last `blocks` blocks.
+    Getting a price never makes a request: the cached price is used until it is older than `ttl`, after which no
+    price is suggested and the caller falls back to its own gas price. If the sampled blocks have no transactions,
+    the node gas price (`eth_gasPrice`) is used for all the tiers.
+    """
+
+    def __init__(self, web3, interval, blocks=DEFAULT_GAS_ORACLE_BLOCKS, ttl=DEFAULT_GAS_ORACLE_TTL,
+                 percentiles=None, max_gas_price=None, batch_size=100):
+        """Create a new oracle. Call `start` to start refreshing it.
+
+        :param web3: the web3 instance.
+
+        :param number interval: the interval in seconds between refreshes.
+
+        :param int blocks: the number of recent blocks to sample.
+
+        :param number ttl: the number of seconds a price is used after the last successful refresh.
+
+        :param dict percentiles: urgency tier -> the gas price percentile (0-100) of the tier.
+
+        :param int max_gas_price: the maximal suggested gas price in wei, unlimited if None.
+
+        :param int batch_size: the maximal number of JSON-RPC calls in a single batch.
+        """
+        self.web3 = web3
+        self.interval = interval
+        self.blocks = blocks
+        self.ttl = ttl
+        self.percentiles = dict(DEFAULT_URGENCY_PERCENTILES, **(percentiles or {}))
+        self.max_gas_price = max_gas_price
+        self.batch_size = batch_size
+        self.refreshes = 0
+        self.errors = 0
+        self.updated_at = 0
+        self._prices = {}  # urgency -> gas price in wei
+        self._samples = deque(maxlen=blocks)  # (block number, gas prices of the block transactions)
+        self._lock = threading.Lock()
+        self._poller = None
+        self._stopped = threading.Event()
+
+    def get_price(self, urgency=URGENCY_STANDARD):
+        """Get the suggested gas price of an urgency tier.
+
+        :param str urgency: the urgency tier, one of `URGENCIES`.
+
+        :returns: the gas price in wei, or None if there is no recent price.
+        :rtype: int
+        """
+        if time() - self.updated_at > self.ttl:
+            return None
+        return self._prices.get(urgency)
+
+    def refresh(self):
+        """Fetch the blocks mined since the last refresh, and update the prices."""
+        response = self.web3.providers[0].make_request('eth_blockNumber', [])
+        if 'error' in response:
+            raise ValueError(response['error'])
+        head = hex_to_integer(response['result'])
+        with self._lock:
+            last = self._samples[-1][0] if self._samples else None
+        if last is not None and head < last:  # a reorganization, or a lagging node
+            with self._lock:
+                self._samples.clear()
+            last = None
+        first = max(head - self.blocks + 1, last + 1 if last is not None else 0)
+
+        calls = [('eth_getBlockByNumber', [hex(number).rstrip('L'), True]) for number in range(first, head + 1)]
+        samples = []
+        for number, response in zip(range(first, head + 1),
+                                     batch_request(self.web3.providers[0], calls, self.batch_size)):
+            if 'error' in response:
+                raise ValueError(response['error'])
+            if not response['result']:  # not yet available on this node
+                break
+            # zero prices are paid by miners for their own transactions, and do not reflect the market.
+            samples.append((number, [price for price in (hex_to_integer(tx['gasPrice'])
+                                                         for tx in response['result']['transactions']) if price]))
+
+        with self._lock:
+            self._samples.extend(samples)
+            prices = sorted(price for _, block_prices in self._samples for price in block_prices)
+        if not prices:
+            response = self.web3.providers[0].make_request('eth_gasPrice', [])
+            if 'error' in response:
+                raise ValueError(response['error'])
+            prices = [hex_to_integer(response['result'])]
+
+        tier_prices = {}
+        for urgency, percentile in self.percentiles.items():
+            price = prices[min(len(prices) - 1, int(len(prices) * percentile / 100.0))]
+            tier_prices[urgency] = min(price, self.max_gas_price) if self.max_gas_price else price
+        self._prices = tier_prices
+        self.updated_at = time()
+        self.refreshes += 1
+
+    def start(self):
+        """Start refreshing the prices in a background thread."""
+        if self._poller:
+            return
+        self._stopped.clear()
+
+        def _runner():
+            while not self._stopped.is_set():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning('cannot refresh gas prices: ' + str(e))
+                self._stopped.wait(self.interval)
+
+        self._poller = threading.Thread(target=_runner)
+        self._poller.daemon = True
+        self._poller.start()
+
+    def stop(self):
+        """Stop the background refreshes, if running, and wait shortly for the refresh in progress to end.
+        The poller is a daemon thread, so a refresh stuck on a slow node does not hold up the caller."""
+        self._stopped.set()
+        poller, self._poller = self._poller, None
+        if poller and poller is not threading.current_thread():
+            poller.join(STOP_JOIN_TIMEOUT)
+
+    def stats(self):
+        """Get the oracle state.
+
+        :returns: the price of every urgency tier in wei (price_<urgency>), the age of the prices in seconds,
+            the number of sampled blocks, and the number of refreshes and of failed refreshes.
+        :rtype: dict
+        """
+        with self._lock:
+            sampled = len(self._samples)
+        stats = {'age': time() - self.updated_at if self.updated_at else None, 'blocks': sampled,
+                 'refreshes': self.refreshes, 'errors': self.errors}
+        for urgency, price in self._prices.items():
+            stats['price_' + urgency] = price
+        return stats
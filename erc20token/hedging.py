@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from collections import deque
+import heapq
+from queue import Queue
+import threading
+from time import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+# idempotent read methods that may be hedged.
+HEDGED_METHODS = (
+    'web3_clientVersion',
+    'eth_blockNumber',
+    'eth_call',
+    'eth_estimateGas',
+    'eth_gasPrice',
+    'eth_getBalance',
+    'eth_getBlockByHash',
+    'eth_getBlockByNumber',
+    'eth_getCode',
+    'eth_getLogs',
+    'eth_getTransactionByHash',
+    'eth_getTransactionReceipt',
+)
+
+# default hedging configuration.
+DEFAULT_HEDGE_BUDGET = 0.1  # hedges per request
+MAX_HEDGE_TOKENS = 10  # the maximal hedging budget that can be saved up
+HEDGE_MIN_SAMPLES = 20  # the number of latency samples of a method before it is hedged
+HEDGE_LATENCY_WINDOW = 200  # the number of recent latency samples the percentile is computed over
+HEDGE_UPDATE_INTERVAL = 20  # the number of samples between percentile updates
+HEDGE_MAX_THREADS = 32  # the maximal number of threads that send hedged requests, shared by all the hedgers
+
+
+class _Attempts(object):
+    """The attempts of a hedged request: the original request, and the hedge if the original is still running when
+    the hedge delay is up. Both run in the shared attempt threads, and the first successful answer completes
+    the request."""
+
+    __slots__ = ('hedger', 'fn', 'lock', 'done', 'running', 'finished', 'result', 'winner', 'error')
+
+    def __init__(self, hedger, fn):
+        self.hedger = hedger
+        self.fn = fn
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.running = 1  # the original request
+        self.finished = False
+        self.result = None
+        self.winner = None  # the index of the attempt that answered first
+        self.error = None  # the error of the original request
+
+    def run(self, attempt):
+        try:
+            result = self.fn(attempt)
+        except Exception as e:
+            if not attempt:
+                self.error = e
+            self._end()
+        else:
+            self._end(attempt, result)
+
+    def hedge(self):
+        """Send the hedge, unless the request is done or there is no budget. Called when the hedge delay is up."""
+        with self.lock:
+            if self.finished or not self.hedger._take_token():
+                return
+            self.running += 1
+        if not _get_pool().submit(self.run, 1):  # all the threads are busy
+            self.hedger._refund_token()
+            self._end()
+
+    def _end(self, attempt=None, result=None):
+        """End an attempt. The first successful attempt completes the request, and so does the last failed one
+        if all the attempts failed."""
+        with self.lock:
+            self.running -= 1
+            if self.finished or (attempt is None and self.running):
+                return
+            self.finished = True
+            self.result = result
+            self.winner = attempt
+            self.done.set()
+
+
+class _AttemptPool(object):
+    """Threads that send the attempts of hedged requests. Threads are started on demand, up to a maximum, and are
+    reused, so a hedged read does not start a thread of its own."""
+
+    def __init__(self, max_threads):
+        self.max_threads = max_threads
+        self._tasks = Queue()
+        self._threads = 0
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """Run a function in an idle thread, or in a new one if there is room.
+
+        :returns: whether the function was submitted. False if all the threads are busy.
+        :rtype: bool
+        """
+        with self._lock:
+            if self._idle:
+                self._idle -= 1
+            elif self._threads < self.max_threads:
+                self._threads += 1
+                thread = threading.Thread(target=self._runner)
+                thread.daemon = True
+                thread.start()
+            else:
+                return False
+        self._tasks.put((fn, args))
+        return True
+
+    def _runner(self):
+        while True:
+            fn, args = self._tasks.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.exception(e)
+            with self._lock:
+                self._idle += 1
+
+
+class _Timer(object):
+    """A single thread that calls functions at given times, used to start the hedges of all the hedgers."""
+
+    def __init__(self):
+        self._heap = []  # (time, sequence number, function)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, at, fn):
+        """Call a function at the given time. The function should return quickly."""
+        with self._cond:
+            heapq.heappush(self._heap, (at, self._seq, fn))
+            self._seq += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._runner)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+
+    def _runner(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time():
+                    self._cond.wait(self._heap[0][0] - time() if self._heap else None)
+                fn = heapq.heappop(self._heap)[2]
+            try:
+                fn()
+            except Exception as e:
+                logger.exception(e)
+
+
+# the attempt threads and the hedge timer, shared by all the hedgers and started on the first hedged request.
+_pool = None
+_timer = None
+_shared_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _shared_lock:
+        if _pool is None:
+            _pool = _AttemptPool(HEDGE_MAX_THREADS)
+        return _pool
+
+
+def _get_timer():
+    global _timer
+    with _shared_lock:
+        if _timer is None:
+            _timer = _Timer()
+        return _timer
+
+
+class Hedger(object):
+    """Hedger sends a duplicate of a slow read request, and returns the first answer.
+
+    The latencies of every method are tracked, and when a request takes longer than the given percentile of its
+    method, a second attempt is started (to another endpoint or over another connection). Hedges are paid from
+    a budget that grows by `budget` per request, so there are at most `budget` hedges per request on average
+    (and never more than one per request): with a budget of 0.1, hedging adds at most 10% to the load.
+
+    Once a method is hedged, the original request and its hedge both run in a bounded pool of threads shared by
+    all the hedgers, and the caller returns the first successful answer, so a slow original does not hold up
+    the answer of the hedge. A single shared timer starts the hedges when their delay is up. When all the pool
+    threads are busy, the request runs in the calling thread without a hedge.
+    """
+
+    def __init__(self, percentile, budget=DEFAULT_HEDGE_BUDGET):
+        """Create a new hedger.
+
+        :param number percentile: the latency percentile (0-100) of a method after which a request is hedged.
+
+        :param float budget: the number of hedges allowed per request, between 0 and 1.
+        """
+        if not 0 < percentile < 100:
+            raise ValueError('hedge percentile must be between 0 and 100')
+        if not 0 < budget <= 1:
+            raise ValueError('hedge budget must be between 0 and 1')
+        self.percentile = percentile
+        self.budget = budget
+        self.requests = 0
+        self.hedged = 0  # hedges sent
+        self.hedge_wins = 0  # hedges that answered before the original request
+        self.budget_exhausted = 0  # slow requests that were not hedged for lack of budget
+        self._tokens = 1.0
+        self._latencies = {}  # method -> recent latencies
+        self._thresholds = {}  # method -> hedge delay
+        self._sample_counts = {}  # method -> number of samples
+        self._lock = threading.Lock()
+
+    def request(self, method, fn):
+        """Run a request, hedging it if it is slow.
+
+        :param str method: the JSON-RPC method.
+
+        :param fn: sends the request, called with the attempt index (0 for the original request, 1 for the hedge).
+
+        :returns: the first successful result of the attempts.
+
+        :raises: the error of the original request, if all the attempts failed.
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self._tokens + self.budget, MAX_HEDGE_TOKENS)
+            delay = self._thresholds.get(method)
+        start = time()
+        if delay is None:  # not enough samples yet
+            result = fn(0)
+            self._add_sample(method, time() - start)
+            return result
+
+        attempts = _Attempts(self, fn)
+        if not _get_pool().submit(attempts.run, 0):  # no free thread, run the request unhedged
+            result = fn(0)
+            self._add_sample(method, time() - start)
+            return result
+        _get_timer().schedule(start + delay, attempts.hedge)
+        attempts.done.wait()
+        self._add_sample(method, time() - start)
+        if attempts.winner is None:
+            raise attempts.error
+        if attempts.winner:
+            with self._lock:
+                self.hedge_wins += 1
+        return attempts.result
+
+    def stats(self):
+        """Get hedging counters.
+
+        :returns: the number of requests, hedges sent, hedges that answered first, and slow requests that were
+            not hedged for lack of budget, and the current hedge delay per method in seconds.
+        :rtype: dict
+        """
+        with self._lock:
+            return {'requests': self.requests, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins,
+                    'budget_exhausted': self.budget_exhausted, 'delays': dict(self._thresholds)}
+
+    def _take_token(self):
+        """Pay for a hedge from the budget.
+
+        :returns: whether the budget allowed the hedge.
+        :rtype: bool
+        """
+        with self._lock:
+            if self._tokens < 1:
+                self.budget_exhausted += 1
+                return False
+            self._tokens -= 1
+            self.hedged += 1
+            return True
+
+    def _refund_token(self):
+        """Return the budget of a hedge that could not be sent."""
+        with self._lock:
+            self._tokens = min(self._tokens + 1, MAX_HEDGE_TOKENS)
+            self.hedged -= 1
+
+    def _add_sample(self, method, latency):
+        with self._lock:
+            latencies = self._latencies.get(method)
+            if latencies is None:
+                latencies = self._latencies[method] = deque(maxlen=HEDGE_LATENCY_WINDOW)
+                self._sample_counts[method] = 0
+            latencies.append(latency)
+            self._sample_counts[method] += 1
+            count = self._sample_counts[method]
+            if count >= HEDGE_MIN_SAMPLES and count % HEDGE_UPDATE_INTERVAL == 0:
+                ordered = sorted(latencies)
+                self._thresholds[method] = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))]
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from bisect import bisect_left
+from functools import wraps
+import threading
+from time import time
+
+# default latency histogram bucket upper bounds, in seconds.
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram(object):
+    """A cumulative histogram with fixed bucket upper bounds, like a Prometheus histogram."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=DEFAULT_LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """:returns: the count, the sum and a list of (upper bound, cumulative count) buckets, ending with +Inf."""
+        buckets = []
+        total = 0
+        for bound, count in zip(list(self.bounds) + [float('inf')], self.counts):
+            total += count
+            buckets.append((bound, total))
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class _MethodMetrics(object):
+    __slots__ = ('calls', 'errors', 'retries', 'request_bytes', 'response_bytes', 'latency')
+
+    def __init__(self, buckets):
+        self.calls = 0
+        self.errors = {}  # error class -> count
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency = Histogram(buckets)
+
+    def snapshot(self):
+        return {'calls': self.calls, 'errors': dict(self.errors), 'retries': self.retries,
+                'request_bytes': self.request_bytes, 'response_bytes': self.response_bytes,
+                'latency': self.latency.snapshot()}
+
+
+class MetricsRegistry(object):
+    """MetricsRegistry collects per-method call metrics of JSON-RPC requests and of SDK methods:
+    call counts, latency histograms, retry counts, error classes and payload bytes. It is thread-safe.
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        """Create a new registry.
+
+        :param tuple buckets: the latency histogram bucket upper bounds, in seconds.
+        """
+        self.buckets = buckets
+        self._rpc = {}
+        self._sdk = {}
+        self._lock = threading.Lock()
+
+    def record_rpc(self, method, duration, request_bytes=0, response_bytes=0, error=None):
+        """Record a JSON-RPC call.
+
+        :param str method: the JSON-RPC method, or 'batch' for a batch request.
+
+        :param float duration: the call duration in seconds, including retries.
+
+        :param int request_bytes: the size of the request payload.
+
+        :param int response_bytes: the size of the response payload.
+
+        :param str error: the error class, if the call failed.
+        """
+        with self._lock:
+            metrics = self._get(self._rpc, method)
+            metrics.calls += 1
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+            metrics.latency.observe(duration)
+            if error:
+                metrics.errors[error] = metrics.errors.get(error, 0) + 1
+
+    def record_rpc_error(self, method, error):
+        """Record an error of a call that is not timed separately, such as a failed call in a batch."""
+        with self._lock:
+            errors = self._get(self._rpc, method).errors
+            errors[error] = errors.get(error, 0) + 1
+
+    def record_rpc_bytes(self, method, request_bytes, response_bytes):
+        """Record payload bytes separately from the call, such as the bytes of each attempt of a batch request."""
+        with self._lock:
+            metrics = self._get(self._rpc, method)
+            metrics.request_bytes += request_bytes
+            metrics.response_bytes += response_bytes
+
+    def record_retry(self, method):
+        """Record a retry of a JSON-RPC request."""
+        with self._lock:
+            self._get(self._rpc, method or 'unknown').retries += 1
+
+    def record_sdk_call(self, name, duration, error=None):
+        """Record a call of an SDK method.
+
+        :param str name: the method name.
+
+        :param float duration: the call duration in seconds.
+
+        :param str error: the exception class name, if the call raised.
+        """
+        with self._lock:
+            metrics = self._get(self._sdk, name)
+            metrics.calls += 1
+            metrics.latency.observe(duration)
+            if error:
+                metrics.errors[error] = metrics.errors.get(error, 0) + 1
+
+    def snapshot(self):
+        """Get the recorded metrics.
+
+        :returns: {'rpc': method -> metrics, 'sdk': method name -> metrics}. Method metrics are the number of calls,
+            error class -> count, the number of retries, the request and response bytes, and the latency histogram
+            (count, sum and cumulative buckets).
+        :rtype: dict
+        """
+        with self._lock:
+            return {'rpc': dict((method, metrics.snapshot()) for method, metrics in self._rpc.items()),
+                    'sdk': dict((name, metrics.snapshot()) for name, metrics in self._sdk.items())}
+
+    def reset(self):
+        """Clear the recorded metrics."""
+        with self._lock:
+            self._rpc = {}
+            self._sdk = {}
+
+    def _get(self, metrics_dict, key):
+        metrics = metrics_dict.get(key)
+        if metrics is None:
+            metrics = metrics_dict[key] = _MethodMetrics(self.buckets)
+        return metrics
+
+
+def rpc_error_class(response):
+    """Get the error class of a raw JSON-RPC response: 'rpc_<code>' for an error response, otherwise None."""
+    if isinstance(response, dict) and response.get('error') is not None:
+        error = response['error']
+        code = error.get('code') if isinstance(error, dict) else None
+        return 'rpc_{}'.format(code) if code is not None else 'rpc_error'
+    return None
+
+
+def timed(fn):
+    """Decorator for SDK methods: records the call duration and errors in the instance `_metrics` registry."""
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        metrics = getattr(self, '_metrics', None)
+        if metrics is None:
+            return fn(self, *args, **kwargs)
+        start = time()
+        try:
+            result = fn(self, *args, **kwargs)
+        except Exception as e:
+            metrics.record_sdk_call(fn.__name__, time() - start, e.__class__.__name__)
+            raise
+        metrics.record_sdk_call(fn.__name__, time() - start)
+        return result
+    return wrapper
+
+
+def format_prometheus(metrics, prefix='erc20token'):
+    """Format the metrics returned by `SDK.get_metrics` in the Prometheus text exposition format.
+
+    :param dict metrics: the metrics.
+
+    :param str prefix: the metric name prefix.
+
+    :returns: the metrics text.
+    :rtype: str
+    """
+    lines = []
+
+    def add(name, metric_type, help_text, samples):
+        if not samples:
+            return
+        lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+        lines.append('# TYPE {}_{} {}'.format(prefix, name, metric_type))
+        for suffix, labels, value in samples:
+            label_str = ','.join('{}="{}"'.format(k, _escape(v)) for k, v in labels)
+            lines.append('{}_{}{}{} {}'.format(prefix, name, suffix, '{' + label_str + '}' if label_str else '',
+                                               _format_value(value)))
+
+    for section, label in (('rpc', 'method'), ('sdk', 'method')):
+        methods = sorted((metrics.get(section) or {}).items())
+        add(section + '_calls_total', 'counter', 'The number of calls.',
+            [('', [(label, method)], m['calls']) for method, m in methods])
+        add(section + '_errors_total', 'counter', 'The number of failed calls by error class.',
+            [('', [(label, method), ('error', error)], count)
+             for method, m in methods for error, count in sorted(m['errors'].items())])
+        if section == 'rpc':
+            add('rpc_retries_total', 'counter', 'The number of request retries.',
+                [('', [(label, method)], m['retries']) for method, m in methods])
+            add('rpc_request_bytes_total', 'counter', 'The request payload bytes.',
+                [('', [(label, method)], m['request_bytes']) for method, m in methods])
+            add('rpc_response_bytes_total', 'counter', 'The response payload bytes.',
+                [('', [(label, method)], m['response_bytes']) for method, m in methods])
+        samples = []
+        for method, m in methods:
+            latency = m['latency']
+            for bound, count in latency['buckets']:
+                samples.append(('_bucket', [(label, method), ('le', _format_value(bound))], count))
+            samples.append(('_sum', [(label, method)], latency['sum']))
+            samples.append(('_count', [(label, method)], latency['count']))
+        add(section + '_latency_seconds', 'histogram', 'The call latency in seconds.', samples)
+
+    for section in ('gas_cache', 'callbacks', 'hedging', 'tracker', 'gas_oracle'):
+        stats = metrics.get(section) or {}
+        for key, value in sorted(stats.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                add('{}_{}'.format(section, key), 'gauge', 'See SDK.get_metrics.', [('', [], value)])
+
+    filter_samples = {}
+    for filter_key, stats in sorted((metrics.get('monitor') or {}).items()):
+        for key, value in sorted(stats.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                filter_samples.setdefault(key, []).append(('', [('filter', filter_key)], value))
+    for key, samples in sorted(filter_samples.items()):
+        add('monitor_' + key, 'gauge', 'See SDK.get_monitor_stats.', samples)
+
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+import json
+import threading
+from time import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .hedging import DEFAULT_HEDGE_BUDGET
+from .provider import (
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_REQUEST_TIMEOUT,
+    RetryHTTPProvider,
+    retry_request,
+)
+
+import logging
+logger = logging.getLogger(__name__)
+
+# default endpoint health configuration.
+DEFAULT_EWMA_ALPHA = 0.3
+DEFAULT_MAX_ERROR_RATE = 0.5
+DEFAULT_EJECT_TIME = 30  # seconds
+DEFAULT_MAX_BLOCK_LAG = 3  # blocks
+DEFAULT_HEALTH_CHECK_INTERVAL = 5  # seconds
+STOP_JOIN_TIMEOUT = 1  # seconds to wait for the health checker thread on stop
+
+# seconds added to the latency of an endpoint per unit of error rate when ranking endpoints.
+ERROR_RATE_PENALTY = 1
+
+# methods that depend on the state of a single node: the wallet nonce and submitted transactions, and filters.
+# they are sent to the same (sticky) node as long as it is healthy.
+STICKY_METHODS = (
+    'eth_sendRawTransaction',
+    'eth_sendTransaction',
+    'eth_getTransactionCount',
+    'eth_newFilter',
+    'eth_newBlockFilter',
+    'eth_newPendingTransactionFilter',
+    'eth_getFilterChanges',
+    'eth_getFilterLogs',
+    'eth_uninstallFilter',
+)
+_STICKY_METHODS_BYTES = tuple(('"' + method + '"').encode() for method in STICKY_METHODS)
+
+_HEALTH_CHECK_REQUEST = json.dumps({'jsonrpc': '2.0', 'method': 'eth_blockNumber', 'params': [], 'id': 0}).encode()
+
+
+class _Endpoint(object):
+    __slots__ = ('uri', 'latency', 'error_rate', 'requests', 'errors', 'ejected', 'ejected_until', 'block_number',
+                 'lagging')
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.latency = 0.0  # EWMA of successful request durations, in seconds
+        self.error_rate = 0.0  # EWMA of request failures
+        self.requests = 0
+        self.errors = 0
+        self.ejected = False  # until a request or a health check succeeds
+        self.ejected_until = 0  # the time before which an ejected endpoint is not probed
+        self.block_number = None
+        self.lagging = False
+
+    def score(self):
+        """The ranking of the endpoint for reads, lower is better."""
+        return self.latency + self.error_rate * ERROR_RATE_PENALTY
+
+    def is_healthy(self):
+        return not self.ejected and not self.lagging
+
+    def get_stats(self):
+        return {'uri': self.uri, 'latency': self.latency, 'error_rate': self.error_rate, 'requests': self.requests,
+                'errors': self.errors, 'ejected': self.ejected, 'block_number': self.block_number,
+                'lagging': self.lagging}
+
+
+class PoolProvider(RetryHTTPProvider):
+    """PoolProvider sends requests to several JSON-RPC endpoints.
+
+    Each endpoint has an exponentially weighted moving average (EWMA) of its latency and of its error rate. Reads go
+    to the fastest healthy endpoint (with a penalty for recent errors), and fail over to the next ones when
+    a request fails. Nonce-sensitive writes
+    and filter calls (see `STICKY_METHODS`) stick to one endpoint while it is healthy, and batches that contain
+    such calls stick with them.
+
+    An endpoint is ejected when its error rate exceeds `max_error_rate`. It is probed again by the health checker
+    after `eject_time` seconds, and is used again only once a probe (or a failover request) succeeds. The health
+    checker also reads the block number of every endpoint, and does not route to endpoints more than
+    `max_block_lag` blocks behind the highest one. When all the endpoints fail, the request is retried with
+    exponential backoff, as in `RetryHTTPProvider`.
+    """
+
+    def __init__(self, endpoint_uris, request_kwargs=None, pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+                 metrics=None, ewma_alpha=DEFAULT_EWMA_ALPHA, max_error_rate=DEFAULT_MAX_ERROR_RATE,
+                 eject_time=DEFAULT_EJECT_TIME, max_block_lag=DEFAULT_MAX_BLOCK_LAG,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL, hedge_percentile=None,
+                 hedge_budget=DEFAULT_HEDGE_BUDGET):
+        """Create a new provider.
+
+        :param list endpoint_uris: the JSON-RPC endpoint URIs.
+
+        :param dict request_kwargs: extra keyword arguments for `requests.Session.post`.
+
+        :param int pool_maxsize: the maximal number of connections kept open to each endpoint.
+
+        :param bool pool_block: if True, requests wait for a free connection when all the pool connections are busy.
+
+        :param metrics: the registry to record request metrics in. Failovers are recorded as retries.
+        :type metrics: :class:`~erc20token.metrics.MetricsRegistry`
+
+        :param float ewma_alpha: the weight of a new sample in the latency and error rate averages.
+
+        :param float max_error_rate: the error rate above which an endpoint is ejected.
+
+        :param number eject_time: the number of seconds an ejected endpoint is not used.
+
+        :param int max_block_lag: the maximal number of blocks an endpoint may be behind the others.
+
+        :param number health_check_interval: the interval in seconds between background health checks of all the
+            endpoints. If 0, there are no health checks, and block lag is not checked.
+
+        :param number hedge_percentile: if set, slow idempotent reads are hedged to the second best endpoint.
+            See `RetryHTTPProvider`.
+
+        :param float hedge_budget: the maximal number of hedged requests per request, between 0 and 1.
+        """
+        if not endpoint_uris:
+            raise ValueError('at least one endpoint must be provided')
+        super(PoolProvider, self).__init__(endpoint_uris[0], request_kwargs, pool_maxsize, pool_block, metrics,
+                                           hedge_percentile, hedge_budget)
+        adapter = HTTPAdapter(pool_connections=len(endpoint_uris), pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.endpoints = [_Endpoint(uri) for uri in endpoint_uris]
+        self.ewma_alpha = ewma_alpha
+        self.max_error_rate = max_error_rate
+        self.eject_time = eject_time
+        self.max_block_lag = max_block_lag
+        self.health_check_interval = health_check_interval
+        self._sticky = None
+        self._lock = threading.Lock()
+        self._checker = None
+        self._stopped = threading.Event()
+        if health_check_interval:
+            self._checker = threading.Thread(target=self._run_health_checks)
+            self._checker.daemon = True
+            self._checker.start()
+
+    def __str__(self):
+        return 'PoolProvider({})'.format(', '.join(endpoint.uri for endpoint in self.endpoints))
+
+    def stop(self):
+        """Stop the background health checks, and wait shortly for the health checker to exit."""
+        self._stopped.set()
+        checker, self._checker = self._checker, None
+        if checker and checker is not threading.current_thread():
+            checker.join(STOP_JOIN_TIMEOUT)
+
+    def get_endpoint_stats(self):
+        """Get the endpoint health metrics.
+
+        :returns: for every endpoint, its URI, latency and error rate averages, the number of requests and errors,
+            whether it is ejected, its last known block number and whether it is lagging behind.
+        :rtype: list
+        """
+        with self._lock:
+            return [endpoint.get_stats() for endpoint in self.endpoints]
+
+    @retry_request
+    def retriable_post_request(self, request_data, method=None):
+        """overrides the parent method to route the request to the endpoints, failing over on errors.
+        When all the endpoints fail, the whole route is retried with backoff."""
+        sticky = method in STICKY_METHODS or \
+            (method == 'batch' and any(name in request_data for name in _STICKY_METHODS_BYTES))
+        error = None
+        for attempt, endpoint in enumerate(self._route(sticky)):
+            if attempt:
+                self.metrics.record_retry(method)
+                logger.warning('failing over to {}: {}'.format(endpoint.uri, error))
+            start = time()
+            try:
+                content = self._post(endpoint, request_data)
+            except requests.exceptions.RequestException as e:
+                self._record(endpoint, None)
+                error = e
+                continue
+            self._record(endpoint, time() - start)
+            if sticky:
+                self._sticky = endpoint
+            return content
+        raise error
+
+    def hedge_post_request(self, request_data):
+        """overrides the parent method to send the hedge request to the second best endpoint"""
+        endpoints = self._route(False)
+        endpoint = endpoints[1] if len(endpoints) > 1 else endpoints[0]
+        start = time()
+        try:
+            content = self._post(endpoint, request_data)
+        except requests.exceptions.RequestException:
+            self._record(endpoint, None)
+            raise
+        self._record(endpoint, time() - start)
+        return content
+
+    def _route(self, sticky):
+        """Order the endpoints for a request: healthy endpoints by score (the sticky one first for sticky
+        requests), then the others by the time they are ejected until, as failover candidates."""
+        with self._lock:
+            healthy = sorted((endpoint for endpoint in self.endpoints if endpoint.is_healthy()),
+                             key=_Endpoint.score)
+            others = sorted((endpoint for endpoint in self.endpoints if not endpoint.is_healthy()),
+                            key=lambda endpoint: endpoint.ejected_until)
+            if sticky and healthy:
+                if self._sticky not in healthy:
+                    self._sticky = healthy[0]
+                healthy.remove(self._sticky)
+                healthy.insert(0, self._sticky)
+        return healthy + others
+
+    def _post(self, endpoint, request_data, timeout=None):
+        request_kwargs = self.get_request_kwargs()
+        request_kwargs.setdefault('timeout', timeout or DEFAULT_REQUEST_TIMEOUT)
+        response = self.session.post(endpoint.uri, data=request_data, **request_kwargs)
+        response.raise_for_status()
+        return response.content
+
+    def _record(self, endpoint, duration):
+        """Update the averages of an endpoint after a request, ejecting it if its error rate is too high.
+
+        :param float duration: the request duration in seconds, or None if the request failed.
+        """
+        alpha = self.ewma_alpha
+        with self._lock:
+            endpoint.requests += 1
+            if duration is None:
+                endpoint.errors += 1
+                endpoint.error_rate = alpha + (1 - alpha) * endpoint.error_rate
+                if endpoint.error_rate > self.max_error_rate:
+                    if not endpoint.ejected:
+                        logger.warning('ejecting endpoint {}'.format(endpoint.uri))
+                    endpoint.ejected = True
+                    endpoint.ejected_until = time() + self.eject_time
+            else:
+                if endpoint.ejected:  # a successful probe of an ejected endpoint
+                    logger.info('endpoint {} is healthy again'.format(endpoint.uri))
+                    endpoint.ejected = False
+                    endpoint.ejected_until = 0
+                    endpoint.error_rate = 0.0
+                endpoint.error_rate = (1 - alpha) * endpoint.error_rate
+                endpoint.latency = duration if not endpoint.latency else \
+                    alpha * duration + (1 - alpha) * endpoint.latency
+
+    def _run_health_checks(self):
+        stopped = self._stopped
+        while not stopped.is_set():
+            self.check_health()
+            stopped.wait(self.health_check_interval)
+
+    def check_health(self):
+        """Probe all the endpoints with `eth_blockNumber`, and update their block lag.
+        Ejected endpoints are probed only after their eject time, and are used again once their probe succeeds.
+        """
+        now = time()
+        for endpoint in self.endpoints:
+            if now < endpoint.ejected_until:
+                continue
+            start = time()
+            try:
+                content = self._post(endpoint, _HEALTH_CHECK_REQUEST, self.health_check_interval or None)
+                response = json.loads(content.decode())
+                block_number = int(response['result'], 16)
+            except Exception as e:
+                logger.warning('health check of {} failed: {}'.format(endpoint.uri, e))
+                self._record(endpoint, None)
+                continue
+            self._record(endpoint, time() - start)
+            endpoint.block_number = block_number
+
+        with self._lock:
+            block_numbers = [endpoint.block_number for endpoint in self.endpoints if endpoint.block_number is not None]
+            head = max(block_numbers) if block_numbers else None
+            for endpoint in self.endpoints:
+                lagging = head is not None and endpoint.block_number is not None and \
+                    head - endpoint.block_number > self.max_block_lag
+                if lagging and not endpoint.lagging:
+                    logger.warning('endpoint {} is {} blocks behind'.format(endpoint.uri, head - endpoint.block_number))
+                endpoint.lagging = lagging
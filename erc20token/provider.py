@@ -2,34 +2,255 @@
 
 # Copyright (C) 2017 Kin Foundation
 
+import json
+from time import sleep, time
+
 import backoff
 import requests
+from requests.adapters import HTTPAdapter
+from eth_utils import (
+    force_bytes,
+    force_obj_to_text,
+)
 from web3 import HTTPProvider
-from web3.utils.compat import make_post_request
+
+from .hedging import (
+    DEFAULT_HEDGE_BUDGET,
+    HEDGED_METHODS,
+    Hedger,
+)
+from .metrics import MetricsRegistry, rpc_error_class
+
+import logging
+logger = logging.getLogger(__name__)
+
+# default http connection pool configuration.
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_REQUEST_TIMEOUT = 10
+
+# batch request retry configuration (exponential backoff).
+BATCH_RETRY_ATTEMPTS = 3
+BATCH_RETRY_DELAY = 0.2
+
+# JSON-RPC error codes that indicate a transient node failure. Batched calls failing with these are retried.
+BATCH_RETRY_ERROR_CODES = (
+    -32603,  # internal error
+    -32005,  # request limit exceeded
+)
+
+# retries a failed http request with exponential backoff. Client errors (4xx) are not retried.
+retry_request = backoff.on_exception(
+    lambda: backoff.expo(factor=0.2),
+    requests.exceptions.RequestException,
+    max_tries=4,
+    giveup=lambda e: e.response is not None and 400 <= e.response.status_code < 500,
+    on_backoff=lambda details: details['args'][0].metrics.record_retry(details['kwargs'].get('method'))
+)
 
 
 class RetryHTTPProvider(HTTPProvider):
-    """RetryHTTPProvider is a custom HTTPProvider that retries failed http requests."""
+    """RetryHTTPProvider is a custom HTTPProvider that retries failed http requests.
+    All requests go through a single keep-alive session with its own connection pool. The session is not modified
+    after construction, so the provider can be shared across threads.
+    """
+
+    def __init__(self, endpoint_uri, request_kwargs=None, pool_maxsize=DEFAULT_POOL_MAXSIZE, pool_block=False,
+                 metrics=None, hedge_percentile=None, hedge_budget=DEFAULT_HEDGE_BUDGET):
+        """Create a new provider.
+
+        :param str endpoint_uri: the JSON-RPC endpoint URI.
 
-    def __init__(self, endpoint_uri, request_kwargs=None):
+        :param dict request_kwargs: extra keyword arguments for `requests.Session.post`.
+
+        :param int pool_maxsize: the maximal number of connections kept open to the endpoint. Set it to the number
+            of threads using the provider concurrently.
+
+        :param bool pool_block: if True, requests wait for a free connection when all the pool connections are busy.
+            Otherwise, an extra connection is opened and discarded after use.
+
+        :param metrics: the registry to record request metrics in. If not provided, a new registry is created.
+        :type metrics: :class:`~erc20token.metrics.MetricsRegistry`
+
+        :param number hedge_percentile: if set, an idempotent read (see `HEDGED_METHODS`) that takes longer than this
+            latency percentile (0-100) of its method is sent again over another connection, and the first answer
+            is used. See :class:`~erc20token.hedging.Hedger`.
+
+        :param float hedge_budget: the maximal number of hedged requests per request, between 0 and 1.
+        """
         super(RetryHTTPProvider, self).__init__(endpoint_uri, request_kwargs)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.metrics = metrics or MetricsRegistry()
+        self.hedger = Hedger(hedge_percentile, hedge_budget) if hedge_percentile else None
+        self._pre_hooks = []
+        self._post_hooks = []
+
+    def add_request_hook(self, pre_fn=None, post_fn=None):
+        """Add functions to call before and after every request.
+        Batch requests are reported with the method 'batch' and the list of (method, params) calls as params.
+        Exceptions raised by hooks propagate to the caller.
+
+        :param pre_fn: called with (method, params) before the request is sent.
+
+        :param post_fn: called with (method, params, response, error, duration) after the request completes, where
+            response is the decoded response (None on failure), error is the exception (or None) and duration is
+            in seconds.
+        """
+        if pre_fn:
+            self._pre_hooks.append(pre_fn)
+        if post_fn:
+            self._post_hooks.append(post_fn)
+
+    def remove_request_hook(self, pre_fn=None, post_fn=None):
+        """Remove functions added with `add_request_hook`."""
+        if pre_fn in self._pre_hooks:
+            self._pre_hooks.remove(pre_fn)
+        if post_fn in self._post_hooks:
+            self._post_hooks.remove(post_fn)
 
     def make_request(self, method, params):
-        """overrides the parent method to replace `make_post_request` with custom implementation"""
+        """overrides the parent method to send the request through the provider session, with retries"""
+        for pre_fn in self._pre_hooks:
+            pre_fn(method, params)
         request_data = self.encode_rpc_request(method, params)
-        raw_response = self.retriable_post_request(request_data)  # instead of make_post_request
-        response = self.decode_rpc_response(raw_response)
-        return response
-
-    @backoff.on_exception(
-        lambda: backoff.expo(factor=0.2),
-        requests.exceptions.RequestException,
-        max_tries=4,
-        giveup=lambda e: e.response is not None and 400 <= e.response.status_code < 500
-    )
-    def retriable_post_request(self, request_data):
-        return make_post_request(
-            self.endpoint_uri,
-            request_data,
-            **self.get_request_kwargs()
-        )
+        start = time()
+        raw_response = response = error = None
+        try:
+            if self.hedger and method in HEDGED_METHODS:
+                raw_response = self.hedger.request(method, lambda attempt: self._post_attempt(request_data, method,
+                                                                                              attempt))
+            else:
+                raw_response = self.retriable_post_request(request_data, method=method)
+            response = self.decode_rpc_response(raw_response)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            duration = time() - start
+            self.metrics.record_rpc(method, duration, len(request_data), len(raw_response or b''),
+                                    error.__class__.__name__ if error else rpc_error_class(response))
+            for post_fn in self._post_hooks:
+                post_fn(method, params, response, error, duration)
+
+    def make_batch_request(self, calls):
+        """Send several JSON-RPC calls in a single http request.
+        The responses are matched back to the calls by request id. Calls that the node did not answer or
+        answered with a transient error are resent in a smaller batch, the rest are not repeated.
+
+        :param list calls: a list of (method, params) tuples.
+
+        :returns: raw JSON-RPC responses, in the same order as the calls.
+        :rtype: list
+        """
+        for pre_fn in self._pre_hooks:
+            pre_fn('batch', calls)
+        start = time()
+        try:
+            responses = self._send_batch(calls)
+        except Exception as e:
+            duration = time() - start
+            self.metrics.record_rpc('batch', duration, error=e.__class__.__name__)
+            for post_fn in self._post_hooks:
+                post_fn('batch', calls, None, e, duration)
+            raise
+        duration = time() - start
+        self.metrics.record_rpc('batch', duration)
+        for (method, _), response in zip(calls, responses):
+            error = rpc_error_class(response)
+            if error:
+                self.metrics.record_rpc_error(method, error)
+        for post_fn in self._post_hooks:
+            post_fn('batch', calls, responses, None, duration)
+        return responses
+
+    def _send_batch(self, calls):
+        responses = [None] * len(calls)
+        pending = list(range(len(calls)))
+        attempts = 0
+        while True:
+            index_by_id = {}
+            batch = []
+            for index in pending:
+                method, params = calls[index]
+                request_id = next(self.request_counter)
+                index_by_id[request_id] = index
+                batch.append({'jsonrpc': '2.0', 'method': method, 'params': params or [], 'id': request_id})
+            request_data = force_bytes(json.dumps(force_obj_to_text(batch)))
+            raw_response = self.retriable_post_request(request_data, method='batch')
+            self.metrics.record_rpc_bytes('batch', len(request_data), len(raw_response))
+            batch_response = self.decode_rpc_response(raw_response)
+            if isinstance(batch_response, dict):  # the node has rejected the batch as a whole
+                raise ValueError(batch_response.get('error', batch_response))
+
+            for response in batch_response:
+                index = index_by_id.get(response.get('id'))
+                if index is not None:
+                    responses[index] = response
+            pending = [index for index in pending if self._should_retry(responses[index])]
+            if not pending or attempts >= BATCH_RETRY_ATTEMPTS:
+                break
+            attempts += 1
+            self.metrics.record_retry('batch')
+            logger.warning('{} of {} batched requests failed, retrying'.format(len(pending), len(calls)))
+            sleep(BATCH_RETRY_DELAY * 2 ** (attempts - 1))
+
+        for index in pending:
+            if responses[index] is None:
+                responses[index] = {'jsonrpc': '2.0', 'id': None,
+                                    'error': {'code': -32603, 'message': 'no response for batched request'}}
+        return responses
+
+    @retry_request
+    def retriable_post_request(self, request_data, method=None):
+        request_kwargs = self.get_request_kwargs()
+        request_kwargs.setdefault('timeout', DEFAULT_REQUEST_TIMEOUT)
+        response = self.session.post(self.endpoint_uri, data=request_data, **request_kwargs)
+        response.raise_for_status()
+        return response.content
+
+    def _post_attempt(self, request_data, method, attempt):
+        """Send an attempt of a hedged request: the original request with retries, or a single hedge request."""
+        if attempt:
+            return self.hedge_post_request(request_data)
+        return self.retriable_post_request(request_data, method=method)
+
+    def hedge_post_request(self, request_data):
+        """Send a hedge request, without retries. The session sends it over another connection."""
+        request_kwargs = self.get_request_kwargs()
+        request_kwargs.setdefault('timeout', DEFAULT_REQUEST_TIMEOUT)
+        response = self.session.post(self.endpoint_uri, data=request_data, **request_kwargs)
+        response.raise_for_status()
+        return response.content
+
+    @staticmethod
+    def _should_retry(response):
+        if response is None:
+            return True
+        error = response.get('error')
+        return isinstance(error, dict) and error.get('code') in BATCH_RETRY_ERROR_CODES
+
+
+def batch_request(provider, calls, batch_size):
+    """Send JSON-RPC calls in batches of batch_size.
+    If the provider cannot batch requests, the calls are sent one by one.
+
+    :param provider: the JSON-RPC provider.
+
+    :param list calls: a list of (method, params) tuples.
+
+    :param int batch_size: the maximal number of calls in a single batch.
+
+    :returns: raw JSON-RPC responses, in the same order as the calls.
+    :rtype: list
+    """
+    responses = []
+    for start in range(0, len(calls), batch_size):
+        chunk = calls[start:start + batch_size]
+        if hasattr(provider, 'make_batch_request'):
+            responses.extend(provider.make_batch_request(chunk))
+        else:
+            responses.extend(provider.make_request(method, params) for method, params in chunk)
+    return responses
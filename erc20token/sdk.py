@@ -3,36 +3,89 @@
 # Copyright (C) 2017 Kin Foundation
 
 
+from collections import deque
+import json
+from queue import Queue
 import threading
-from time import sleep
+from time import sleep, time
 
-from eth_abi import decode_abi
 from eth_keys import keys
 from eth_keys.exceptions import ValidationError
 from eth_utils import (
     encode_hex,
     function_signature_to_4byte_selector
 )
-from ethereum.transactions import Transaction
-
-import rlp
 from web3 import Web3
+from web3.middleware.pythonic import (
+    receipt_formatter,
+    transaction_formatter,
+)
 from web3.utils.encoding import (
     hexstr_if_str,
     to_bytes,
-    to_hex,
 )
+from web3.utils.formatters import hex_to_integer
 from web3.utils.transactions import get_buffered_gas_estimate
 from web3.utils.validation import (
     validate_abi,
     validate_address,
 )
 
+from .backfill import (
+    DEFAULT_SCAN_CHUNK_SIZE,
+    DEFAULT_SCAN_WORKERS,
+    LogScanner,
+)
+from .cache import TransactionCache
+from .chain import (
+    DEFAULT_HEAD_STALENESS,
+    ChainHeadTracker,
+    ConfirmationTracker,
+)
+from .decoder import decode_transfer_input
+from .events import (
+    decode_transfer_log,
+    get_transfer_filter_params,
+    is_transfer_log,
+)
 from .exceptions import (
     SdkConfigurationError,
     SdkNotConfiguredError,
 )
-from .provider import RetryHTTPProvider
+from .executor import (
+    DEFAULT_CALLBACK_QUEUE_SIZE,
+    POLICIES,
+    POLICY_BLOCK,
+    CallbackExecutor,
+)
+from .gas import (
+    DEFAULT_GAS_ORACLE_BLOCKS,
+    URGENCIES,
+    URGENCY_STANDARD,
+    GasEstimateCache,
+    GasPriceOracle,
+)
+from .hedging import DEFAULT_HEDGE_BUDGET
+from .metrics import MetricsRegistry, timed
+from .pool import PoolProvider
+from .signing import TransactionSigner
+from .senders import (
+    POLICY_LEAST_PENDING,
+    SENDER_POLICIES,
+    SenderPool,
+)
+from .provider import (
+    RetryHTTPProvider,
+    batch_request,
+)
+from .subscriptions import SubscriptionRegistry
+from .tracker import (
+    DEFAULT_EXPIRE_BLOCKS,
+    DEFAULT_GAS_BUMP_FACTOR,
+    MIN_GAS_BUMP_FACTOR,
+    TransactionTracker,
+)
+from .transfers import TransferBatch
 from .utils import load_keyfile
 
 import logging
@@ -45,10 +98,29 @@ ERC20_TRANSFER_ABI_PREFIX = encode_hex(function_signature_to_4byte_selector('tra
 DEFAULT_GAS_PER_TX = 60000
 DEFAULT_GAS_PRICE = 10 * 10 ** 9  # 10 Gwei
 
-# default request retry configuration (linear backoff).
+# default number of JSON-RPC calls sent in a single batch by bulk query methods.
+DEFAULT_BATCH_SIZE = 100
+
+# default filter polling configuration.
+DEFAULT_BLOCK_TIME = 15  # seconds
+DEFAULT_MIN_POLL_INTERVAL = 0.5
+DEFAULT_MAX_POLL_INTERVAL = 4
+POLL_BACKOFF_FACTOR = 1.5
+MAX_POLL_ERROR_BACKOFF = 30
+
+# default confirmation depths reported by monitors.
+DEFAULT_CONFIRMATION_DEPTHS = (12,)
+
+# default number of confirmations after which a cached transaction is considered final.
+DEFAULT_TX_CACHE_CONFIRMATIONS = 12
+
+# default request retry configuration (exponential backoff).
 RETRY_ATTEMPTS = 3
 RETRY_DELAY = 0.3
 
+# default interval in seconds between nonce syncs in pipelined nonce mode.
+DEFAULT_NONCE_SYNC_INTERVAL = 60
+
 
 class TransactionStatus:
     """Transaction status enumerator."""
@@ -56,16 +128,34 @@ class TransactionStatus:
     PENDING = 1
     SUCCESS = 2
     FAIL = 3
+    REVERTED = 4  # the block of the transaction was orphaned in a chain reorganization
 
 
 class TransactionData(object):
     """Token transaction data holder"""
-    from_address = None
-    to_address = None
-    ether_amount = 0
-    token_amount = 0
-    status = TransactionStatus.UNKNOWN
-    num_confirmations = -1
+    __slots__ = ('from_address', 'to_address', 'ether_amount', 'token_amount', 'status', 'num_confirmations')
+
+    def __init__(self, from_address=None, to_address=None, ether_amount=0, token_amount=0,
+                 status=TransactionStatus.UNKNOWN, num_confirmations=-1):
+        self.from_address = from_address
+        self.to_address = to_address
+        self.ether_amount = ether_amount
+        self.token_amount = token_amount
+        self.status = status
+        self.num_confirmations = num_confirmations
+
+
+class TokenTransfer(object):
+    """Token transfer data holder"""
+    __slots__ = ('tx_id', 'from_address', 'to_address', 'token_amount', 'block_number', 'log_index')
+
+    def __init__(self, tx_id, from_address, to_address, token_amount, block_number, log_index):
+        self.tx_id = tx_id
+        self.from_address = from_address
+        self.to_address = to_address
+        self.token_amount = token_amount
+        self.block_number = block_number
+        self.log_index = log_index
 
 
 class SDK(object):
@@ -76,7 +166,16 @@ class SDK(object):
     """
 
     def __init__(self, keyfile='', password='', private_key='', provider='', provider_endpoint_uri='',
-                 contract_address='', contract_abi={}, gas_price=None, gas_limit=None):
+                 contract_address='', contract_abi={}, gas_price=None, gas_limit=None, batch_size=DEFAULT_BATCH_SIZE,
+                 pipelined_nonce=False, nonce_sync_interval=DEFAULT_NONCE_SYNC_INTERVAL, gas_cache_ttl=None,
+                 tx_cache_size=0, tx_cache_confirmations=DEFAULT_TX_CACHE_CONFIRMATIONS,
+                 head_staleness=DEFAULT_HEAD_STALENESS, head_poll_interval=None, block_time=DEFAULT_BLOCK_TIME,
+                 callback_workers=0, callback_queue_size=DEFAULT_CALLBACK_QUEUE_SIZE, callback_policy=POLICY_BLOCK,
+                 callback_spill_dir=None, lazy=False, hedge_percentile=None, hedge_budget=DEFAULT_HEDGE_BUDGET,
+                 sender_private_keys=None, sender_keyfiles=None, sender_policy=POLICY_LEAST_PENDING,
+                 gas_bump_blocks=0, gas_bump_factor=DEFAULT_GAS_BUMP_FACTOR, max_gas_price=None, chain_id=None,
+                 sign_threads=0, gas_oracle_interval=None, gas_oracle_blocks=DEFAULT_GAS_ORACLE_BLOCKS,
+                 track_expire_blocks=DEFAULT_EXPIRE_BLOCKS):
         """Create a new instance of the Token SDK.
 
         The SDK needs a JSON-RPC provider, contract definitions and (optionally) a wallet private key.
@@ -101,16 +200,102 @@ class SDK(object):
             is used, inited with provider_endpoint_uri.
         :type provider: :class:`web3:providers:BaseProvider`
 
-        :param str provider_endpoint_uri: a URI to use with a default HTTPProvider.
+        :param str provider_endpoint_uri: a URI to use with a default HTTPProvider. If a list of URIs is given,
+            a :class:`~erc20token.pool.PoolProvider` balancing the requests across them is used.
 
         :param str contract_address: the address of the token contract.
 
         :param list contract_abi: The contract ABI json.
 
-        :param number gas_price: The price of gas in Gwei.
+        :param number gas_price: The price of gas in Gwei. With a gas price oracle, it is used only when the oracle
+            has no recent price.
 
         :param number gas_limit: Transaction gas limit.
 
+        :param int batch_size: The maximal number of JSON-RPC calls sent in a single batch by bulk query methods.
+
+        :param bool pipelined_nonce: If True, the wallet nonce is tracked locally instead of being read from the
+            node before every transaction, and concurrent transactions are sent in parallel. Use it only if no one
+            else is sending transactions from the same wallet.
+
+        :param number nonce_sync_interval: In pipelined nonce mode, the interval in seconds between nonce syncs with
+            the node. If 0, the nonce is synced only at startup and on nonce errors.
+
+        :param number gas_cache_ttl: If set, gas estimates are cached by transaction shape for this number of seconds,
+            instead of asking the node to estimate every transaction. Has no effect if gas_limit is set.
+
+        :param int tx_cache_size: If positive, transactions and receipts fetched by `get_transaction_status` and
+            `get_transaction_data` are cached, up to this number of final and of recent transactions.
+
+        :param int tx_cache_confirmations: The number of confirmations after which a cached transaction is
+            considered final and is not fetched again. Recent transactions are fetched again when a new block arrives.
+
+        :param number head_staleness: The maximal age in seconds of the current block number used for confirmation
+            counts. An older value is refreshed from the node on demand.
+
+        :param number head_poll_interval: If set, the current block number is refreshed in a background thread
+            at this interval in seconds. While transactions are monitored, it is also updated on every new block.
+
+        :param number block_time: The expected block time of the network in seconds. Monitoring filters are not
+            polled again for most of this time after a new block, and are polled more often as the next block is due.
+
+        :param int callback_workers: If positive, monitoring callbacks run in a pool of this number of threads
+            instead of the filter polling thread. The callbacks of the same transaction still run in order.
+
+        :param int callback_queue_size: The maximal number of callbacks queued per callback thread.
+
+        :param str callback_policy: What to do when a callback queue is full: 'block' waits for room, 'drop_oldest'
+            drops the oldest queued callback, and 'spill' writes the callback to a file in callback_spill_dir
+            and runs it later.
+
+        :param str callback_spill_dir: The directory of the callback spill files. If not provided, the system
+            temporary directory is used.
+
+        :param bool lazy: If True, the SDK makes no requests to the node during initialization: the connection
+            check is skipped, and the wallet nonce and gas price are fetched in a background thread. The first
+            transaction waits for them if they are not ready yet.
+
+        :param number hedge_percentile: If set, an idempotent read request (such as a balance or transaction status
+            query) that takes longer than this latency percentile (0-100) of its JSON-RPC method is sent again, to
+            another endpoint if several are given or over another connection, and the first successful answer is
+            used.
+            Applies only to the provider created by the SDK.
+
+        :param float hedge_budget: The maximal number of hedged requests per request, between 0 and 1. For example,
+            0.1 limits the extra load of hedging to 10%.
+
+        :param list sender_private_keys: Private keys of sender wallets. If sender wallets are configured,
+            `send_ether` and `send_tokens` send from them instead of the SDK wallet, each sender wallet with its own
+            pipelined nonce, and the SDK wallet funds them, see `top_up_senders`. Sender wallets must not be used
+            by anyone else.
+
+        :param list sender_keyfiles: (keyfile path, password) tuples of sender wallets.
+
+        :param str sender_policy: How to choose the sender wallet of a transaction among the wallets that can
+            afford it: 'least_pending' (the fewest transactions being sent) or 'round_robin'.
+
+        :param int gas_bump_blocks: If positive, a tracked transaction (see `track_transaction`) that is not mined
+            for this number of blocks is signed again with the same nonce and a higher gas price, and rebroadcast.
+
+        :param float gas_bump_factor: The gas price multiplier of a rebroadcast, at least 1.1.
+
+        :param number max_gas_price: The maximal gas price of a rebroadcast and of the gas price oracle in Gwei,
+            unlimited if not set.
+
+        :param int chain_id: If set, transactions are signed with EIP-155 replay protection for this chain id.
+
+        :param int sign_threads: If positive, batches of many transactions (see `send_ether_batch` and
+            `send_tokens_batch`) are signed in a pool of this number of threads.
+
+        :param number gas_oracle_interval: If set, the gas price of transactions is suggested by an oracle, refreshed
+            in a background thread at this interval in seconds from the gas prices of recent blocks. Every send can
+            choose an urgency tier: 'slow', 'standard' or 'fast' (the 30th, 60th and 90th percentiles).
+
+        :param int gas_oracle_blocks: The number of recent blocks the gas price oracle samples.
+
+        :param int track_expire_blocks: The number of blocks after which a tracked transaction that is not mined
+            stops being tracked, and its future is cancelled. If 0, transactions are tracked until they are mined.
+
         :returns: An instance of the SDK.
         :rtype: :class:`~erc20token.SDK`
 
@@ -137,16 +322,104 @@ class SDK(object):
         if gas_limit and not isinstance(gas_limit, int):
             raise SdkConfigurationError('gas limit must be integer')
 
+        if not isinstance(batch_size, int) or batch_size <= 0:
+            raise SdkConfigurationError('batch size must be a positive integer')
+
+        if not (isinstance(nonce_sync_interval, int) or isinstance(nonce_sync_interval, float)) \
+                or nonce_sync_interval < 0:
+            raise SdkConfigurationError('nonce sync interval must be a non-negative number')
+
+        if gas_cache_ttl and not (isinstance(gas_cache_ttl, int) or isinstance(gas_cache_ttl, float)):
+            raise SdkConfigurationError('gas cache ttl must be either integer or float')
+
+        if not isinstance(tx_cache_size, int) or tx_cache_size < 0:
+            raise SdkConfigurationError('transaction cache size must be a non-negative integer')
+
+        if not isinstance(tx_cache_confirmations, int) or tx_cache_confirmations <= 0:
+            raise SdkConfigurationError('transaction cache confirmations must be a positive integer')
+
+        if not (isinstance(head_staleness, int) or isinstance(head_staleness, float)) or head_staleness < 0:
+            raise SdkConfigurationError('head staleness must be a non-negative number')
+
+        if head_poll_interval and not (isinstance(head_poll_interval, int) or isinstance(head_poll_interval, float)):
+            raise SdkConfigurationError('head poll interval must be either integer or float')
+
+        if not (isinstance(block_time, int) or isinstance(block_time, float)) or block_time <= 0:
+            raise SdkConfigurationError('block time must be a positive number')
+
+        if not isinstance(callback_workers, int) or callback_workers < 0:
+            raise SdkConfigurationError('callback workers must be a non-negative integer')
+
+        if not isinstance(callback_queue_size, int) or callback_queue_size <= 0:
+            raise SdkConfigurationError('callback queue size must be a positive integer')
+
+        if callback_policy not in POLICIES:
+            raise SdkConfigurationError('callback policy must be one of: ' + ', '.join(POLICIES))
+
+        if hedge_percentile is not None and \
+                (not (isinstance(hedge_percentile, int) or isinstance(hedge_percentile, float)) or
+                 not 0 < hedge_percentile < 100):
+            raise SdkConfigurationError('hedge percentile must be a number between 0 and 100')
+
+        if not (isinstance(hedge_budget, int) or isinstance(hedge_budget, float)) or not 0 < hedge_budget <= 1:
+            raise SdkConfigurationError('hedge budget must be a number between 0 and 1')
+
+        if (sender_private_keys or sender_keyfiles) and not (private_key or keyfile):
+            raise SdkConfigurationError('sender wallets need a funding wallet private key or keyfile')
+
+        if sender_policy not in SENDER_POLICIES:
+            raise SdkConfigurationError('sender policy must be one of: ' + ', '.join(SENDER_POLICIES))
+
+        if not isinstance(gas_bump_blocks, int) or gas_bump_blocks < 0:
+            raise SdkConfigurationError('gas bump blocks must be a non-negative integer')
+
+        if not (isinstance(gas_bump_factor, int) or isinstance(gas_bump_factor, float)) \
+                or gas_bump_factor < MIN_GAS_BUMP_FACTOR:
+            raise SdkConfigurationError('gas bump factor must be a number of at least {}'.format(MIN_GAS_BUMP_FACTOR))
+
+        if max_gas_price and not (isinstance(max_gas_price, int) or isinstance(max_gas_price, float)):
+            raise SdkConfigurationError('max gas price must be either integer or float')
+
+        if chain_id is not None and (not isinstance(chain_id, int) or chain_id <= 0):
+            raise SdkConfigurationError('chain id must be a positive integer')
+
+        if not isinstance(sign_threads, int) or sign_threads < 0:
+            raise SdkConfigurationError('sign threads must be a non-negative integer')
+
+        if gas_oracle_interval and not (isinstance(gas_oracle_interval, int) or isinstance(gas_oracle_interval, float)):
+            raise SdkConfigurationError('gas oracle interval must be either integer or float')
+
+        if not isinstance(gas_oracle_blocks, int) or gas_oracle_blocks <= 0:
+            raise SdkConfigurationError('gas oracle blocks must be a positive integer')
+
+        if not isinstance(track_expire_blocks, int) or track_expire_blocks < 0:
+            raise SdkConfigurationError('track expire blocks must be a non-negative integer')
+
+        self._pool = None
         if provider:
             self.web3 = Web3(provider)
+        elif isinstance(provider_endpoint_uri, (list, tuple)):
+            self._pool = PoolProvider(provider_endpoint_uri, hedge_percentile=hedge_percentile,
+                                      hedge_budget=hedge_budget)
+            self.web3 = Web3(self._pool)
         else:
-            self.web3 = Web3(RetryHTTPProvider(provider_endpoint_uri))
-        if not self.web3.isConnected():
+            self.web3 = Web3(RetryHTTPProvider(provider_endpoint_uri, hedge_percentile=hedge_percentile,
+                                               hedge_budget=hedge_budget))
+        if not lazy and not self.web3.isConnected():
             raise SdkConfigurationError('cannot connect to provider endpoint')
+        self._metrics = getattr(self.web3.providers[0], 'metrics', None) or MetricsRegistry()
 
         self.token_contract = self.web3.eth.contract(contract_address, abi=contract_abi)
+        self.batch_size = batch_size
+        self._tx_cache = TransactionCache(tx_cache_size, tx_cache_confirmations) if tx_cache_size else None
+        self._chain_head = ChainHeadTracker(self.web3, head_staleness)
         self.private_key = None
         self.address = None
+        self._gas_oracle = None
+        if gas_oracle_interval:
+            self._gas_oracle = GasPriceOracle(self.web3, gas_oracle_interval, gas_oracle_blocks,
+                                              max_gas_price=int(max_gas_price * 10**9) if max_gas_price else None,
+                                              batch_size=batch_size)
 
         if keyfile:
             try:
@@ -164,17 +437,84 @@ class SDK(object):
             except ValidationError as e:
                 raise SdkConfigurationError('cannot load private key: ' + str(e))
 
+            gas_cache = None
+            if gas_cache_ttl:
+                gas_cache = GasEstimateCache(self.web3, self.token_contract, ttl=gas_cache_ttl, batch_size=batch_size)
+
             # init transaction manager
             self._tx_manager = TransactionManager(self.web3, self.private_key, self.address, self.token_contract,
-                                                  gas_price, gas_limit)
-
-        # monitoring filter manager
-        self._filter_mgr = FilterManager(self.web3)
+                                                  gas_price, gas_limit, pipelined_nonce, nonce_sync_interval,
+                                                  batch_size, gas_cache, lazy, chain_id, sign_threads,
+                                                  self._gas_oracle)
+
+        # init sender wallets, each with its own pipelined nonce
+        self._senders = None
+        sender_keys = list(sender_private_keys or [])
+        for sender_keyfile, sender_password in sender_keyfiles or []:
+            try:
+                sender_keys.append(load_keyfile(sender_keyfile, sender_password))
+            except Exception as e:
+                raise SdkConfigurationError('cannot load sender keyfile: ' + str(e))
+        if sender_keys:
+            managers = []
+            for sender_key in sender_keys:
+                try:
+                    sender_pk = keys.PrivateKey(hexstr_if_str(to_bytes, sender_key))
+                    sender_address = sender_pk.public_key.to_checksum_address()
+                except ValidationError as e:
+                    raise SdkConfigurationError('cannot load sender private key: ' + str(e))
+                managers.append(TransactionManager(self.web3, sender_key, sender_address, self.token_contract,
+                                                   gas_price, gas_limit, True, nonce_sync_interval, batch_size,
+                                                   self._tx_manager.gas_cache, lazy, chain_id, sign_threads,
+                                                   self._gas_oracle))
+            self._senders = SenderPool(self.web3, self.token_contract, managers, sender_policy, batch_size)
+
+        # transaction tracker, rebroadcasting the transactions of my wallets
+        managers = {}
+        if self.address:
+            managers[self.address.lower()] = self._tx_manager
+        if self._senders:
+            managers.update((wallet.manager.address.lower(), wallet.manager) for wallet in self._senders.wallets)
+        self._tracker = TransactionTracker(self.web3, self._get_receipt_status, managers, batch_size, gas_bump_blocks,
+                                           gas_bump_factor, int(max_gas_price * 10**9) if max_gas_price else None,
+                                           track_expire_blocks)
+        self._tracking = False
+        self._tracking_lock = threading.Lock()
+
+        # monitoring filter manager and subscriptions
+        self._filter_mgr = FilterManager(self.web3, block_time)
+        self._subscriptions = SubscriptionRegistry()
+        self._dispatching = False
+        self._dispatch_lock = threading.Lock()
+        self._checkpoint_lock = threading.RLock()
+        self._confirmations = ConfirmationTracker()
+        self._token_address = self.token_contract.address.lower()
+        self._callback_executor = None
+        if callback_workers:
+            self._callback_executor = CallbackExecutor(callback_workers, callback_queue_size, callback_policy,
+                                                       callback_spill_dir)
+
+        # background threads start only once the whole configuration is valid
+        if head_poll_interval:
+            self._chain_head.start_polling(head_poll_interval)
+        if self._gas_oracle:
+            self._gas_oracle.start()
 
     def __del__(self):
-        """The destructor is used to remove filter subscriptions, if any."""
+        """The destructor is used to remove filter subscriptions and stop background threads, if any."""
         if hasattr(self, '_filter_mgr') and self._filter_mgr:
             self._filter_mgr.remove_filters()
+        if hasattr(self, '_chain_head') and self._chain_head:
+            self._chain_head.stop_polling()
+        if hasattr(self, '_callback_executor') and self._callback_executor:
+            self._callback_executor.shutdown()
+        if hasattr(self, '_pool') and self._pool:
+            self._pool.stop()
+        if hasattr(self, '_gas_oracle') and self._gas_oracle:
+            self._gas_oracle.stop()
+        if hasattr(self, '_tracker') and self._tracker:
+            for manager in self._tracker.managers.values():
+                manager.signer.close()
 
     def get_address(self):
         """Get public address of the SDK wallet.
@@ -189,6 +529,7 @@ class SDK(object):
             raise SdkNotConfiguredError('private key not configured')
         return self.address
 
+    @timed
     def get_ether_balance(self):
         """Get Ether balance of the SDK wallet.
         The wallet is configured by a private key supplied in during SDK initialization.
@@ -202,6 +543,7 @@ class SDK(object):
             raise SdkNotConfiguredError('private key not configured')
         return self.web3.fromWei(self.web3.eth.getBalance(self.address), 'ether')
 
+    @timed
     def get_token_balance(self):
         """Get token balance of the SDK wallet.
         The wallet is configured by a private key supplied in during SDK initialization.
@@ -215,6 +557,7 @@ class SDK(object):
             raise SdkNotConfiguredError('private key not configured')
         return self.web3.fromWei(self.token_contract.call().balanceOf(self.address), 'ether')
 
+    @timed
     def get_address_ether_balance(self, address):
         """Get Ether balance of a public address.
 
@@ -228,6 +571,7 @@ class SDK(object):
         validate_address(address)
         return self.web3.fromWei(self.web3.eth.getBalance(address), 'ether')
 
+    @timed
     def get_address_token_balance(self, address):
         """Get token balance of a public address.
 
@@ -241,6 +585,45 @@ class SDK(object):
         validate_address(address)
         return self.web3.fromWei(self.token_contract.call().balanceOf(address), 'ether')
 
+    @timed
+    def get_address_ether_balances(self, addresses):
+        """Get Ether balances of several public addresses.
+        The queries are sent to the node in batches, see the `batch_size` SDK parameter.
+
+        :param list addresses: public addresses to query.
+
+        :returns: the balances in Ether of the provided addresses, in the same order.
+        :rtype: list of Decimal
+
+        :raises: ValueError: if some of the supplied addresses have a wrong format.
+        """
+        for address in addresses:
+            validate_address(address)
+        calls = [('eth_getBalance', [address, 'latest']) for address in addresses]
+        return [self.web3.fromWei(hex_to_integer(balance), 'ether') for balance in self._batch_request(calls)]
+
+    @timed
+    def get_address_token_balances(self, addresses):
+        """Get token balances of several public addresses.
+        The queries are sent to the node in batches, see the `batch_size` SDK parameter.
+
+        :param list addresses: public addresses to query.
+
+        :returns: the balances in tokens of the provided addresses, in the same order.
+        :rtype: list of Decimal
+
+        :raises: ValueError: if some of the supplied addresses have a wrong format.
+        """
+        for address in addresses:
+            validate_address(address)
+        calls = [('eth_call', [{'to': self.token_contract.address,
+                                'data': self.token_contract._encode_transaction_data('balanceOf', args=(address,))},
+                               'latest'])
+                 for address in addresses]
+        return [self.web3.fromWei(hex_to_integer(balance) if balance != '0x' else 0, 'ether')
+                for balance in self._batch_request(calls)]
+
+    @timed
     def get_token_total_supply(self):
         """Get total number of tokens issued.
 
@@ -249,13 +632,166 @@ class SDK(object):
         """
         return self.web3.fromWei(self.token_contract.call().totalSupply(), 'ether')
 
-    def send_ether(self, address, amount):
+    def get_gas_cache_stats(self):
+        """Get the gas estimate cache counters.
+
+        :returns: the number of cache hits, misses and resamples, and the number of cached transaction shapes,
+            or None if the cache is not enabled.
+        :rtype: dict
+        """
+        if not self.address or not self._tx_manager.gas_cache:
+            return None
+        return self._tx_manager.gas_cache.stats()
+
+    def get_monitor_stats(self):
+        """Get the polling metrics of the monitoring filters.
+
+        :returns: filter parameters (JSON) -> the number of polls, entries, errors and filter recreations,
+            the number of polled batches waiting for the callbacks, the current poll interval, the delay of the last
+            poll behind its schedule, and the seconds since the last poll and since the last change.
+        :rtype: dict
+        """
+        return self._filter_mgr.get_stats()
+
+    def get_sender_addresses(self):
+        """Get the addresses of the sender wallets.
+
+        :returns: the sender wallet addresses, empty if no sender wallets are configured.
+        :rtype: list
+        """
+        return self._senders.addresses if self._senders else []
+
+    def get_sender_stats(self):
+        """Get the sender wallet metrics.
+
+        :returns: for every sender wallet, its address, the number of transactions being sent and sent, and its
+            Ether and token balances in wei, minus the transactions sent since the last balance refresh,
+            or None if no sender wallets are configured.
+        :rtype: list
+        """
+        if not self._senders:
+            return None
+        return self._senders.get_stats()
+
+    def top_up_senders(self, min_ether=0, target_ether=0, min_tokens=0, target_tokens=0):
+        """Send Ether and tokens from my wallet to the sender wallets whose balance is below a minimum, bringing them
+        up to a target balance.
+
+        :param Decimal min_ether: the minimal Ether balance of a sender wallet.
+
+        :param Decimal target_ether: the Ether balance to top up to.
+
+        :param Decimal min_tokens: the minimal token balance of a sender wallet.
+
+        :param Decimal target_tokens: the token balance to top up to.
+
+        :returns: a list of (address, 'ether' or 'token', amount, transaction id or ValueError) tuples, one for every
+            top-up transaction. Amounts are in Ether and tokens.
+        :rtype: list
+
+        :raises: :class:`~erc20token.exceptions.SdkConfigurationError`: if no sender wallets are configured.
+        """
+        if not self._senders:
+            raise SdkNotConfiguredError('sender wallets not configured')
+        report = self._senders.top_up(self._tx_manager,
+                                      self.web3.toWei(min_ether, 'ether'), self.web3.toWei(target_ether, 'ether'),
+                                      self.web3.toWei(min_tokens, 'ether'), self.web3.toWei(target_tokens, 'ether'))
+        return [(address, kind, self.web3.fromWei(amount, 'ether'), result) for address, kind, amount, result in report]
+
+    def get_gas_price(self, urgency=URGENCY_STANDARD):
+        """Get the gas price my transactions are sent with.
+
+        :param str urgency: the urgency tier: 'slow', 'standard' or 'fast'. Tiers differ only with a gas price
+            oracle, see the `gas_oracle_interval` SDK parameter.
+
+        :returns: the gas price in Gwei.
+        :rtype: Decimal
+
+        :raises: ValueError: if the urgency is not one of the tiers.
+        """
+        self._validate_urgency(urgency)
+        if self.address:
+            gas_price = self._tx_manager.get_gas_price(urgency)
+        else:
+            gas_price = (self._gas_oracle and self._gas_oracle.get_price(urgency)) or self.web3.eth.gasPrice
+        return self.web3.fromWei(gas_price, 'gwei')
+
+    def get_gas_oracle_stats(self):
+        """Get the gas price oracle state.
+
+        :returns: the price of every urgency tier in wei (price_<urgency>), the age of the prices in seconds,
+            the number of sampled blocks, and the number of refreshes and of failed refreshes, or None if the
+            oracle is not enabled.
+        :rtype: dict
+        """
+        if not self._gas_oracle:
+            return None
+        return self._gas_oracle.stats()
+
+    def get_tracker_stats(self):
+        """Get the transaction tracker counters.
+
+        :returns: the number of transactions in flight, tracked, mined and rebroadcast with a higher gas price,
+            and the number of receipt polls.
+        :rtype: dict
+        """
+        return self._tracker.stats()
+
+    def get_callback_stats(self):
+        """Get the monitoring callback pool metrics.
+
+        :returns: the number of queued callbacks, the number of submitted, completed, dropped, spilled and failed
+            callbacks, and the average and maximal queue wait and run time of recent callbacks in seconds,
+            or None if callbacks run in the filter polling thread.
+        :rtype: dict
+        """
+        if not self._callback_executor:
+            return None
+        return self._callback_executor.stats()
+
+    @timed
+    def get_metrics(self):
+        """Get the SDK metrics.
+        The metrics can be formatted for Prometheus with :func:`erc20token.metrics.format_prometheus`.
+
+        :returns: a dict with:
+            - rpc: JSON-RPC method -> the number of calls, error class -> count, the number of retries, the request
+              and response bytes, and the latency histogram. Recorded only if the provider is a `RetryHTTPProvider`.
+            - sdk: SDK method -> the number of calls, exception class -> count, and the latency histogram.
+            - gas_cache: see `get_gas_cache_stats`.
+            - monitor: see `get_monitor_stats`.
+            - callbacks: see `get_callback_stats`.
+            - endpoints: the endpoint health metrics, if the provider is a `PoolProvider`.
+            - hedging: the hedging counters (see :class:`~erc20token.hedging.Hedger`), if hedging is enabled.
+            - senders: see `get_sender_stats`.
+            - tracker: see `get_tracker_stats`.
+            - gas_oracle: see `get_gas_oracle_stats`.
+        :rtype: dict
+        """
+        metrics = self._metrics.snapshot()
+        if getattr(self.web3.providers[0], 'hedger', None):
+            metrics['hedging'] = self.web3.providers[0].hedger.stats()
+        if hasattr(self.web3.providers[0], 'get_endpoint_stats'):
+            metrics['endpoints'] = self.web3.providers[0].get_endpoint_stats()
+        metrics['gas_cache'] = self.get_gas_cache_stats()
+        metrics['monitor'] = self.get_monitor_stats()
+        metrics['callbacks'] = self.get_callback_stats()
+        metrics['senders'] = self.get_sender_stats()
+        metrics['tracker'] = self.get_tracker_stats()
+        metrics['gas_oracle'] = self.get_gas_oracle_stats()
+        return metrics
+
+    @timed
+    def send_ether(self, address, amount, urgency=URGENCY_STANDARD):
         """Send Ether from my wallet to address.
 
         :param str address: the address to send Ether to.
 
         :param Decimal amount: the amount of Ether to transfer.
 
+        :param str urgency: the gas price urgency tier: 'slow', 'standard' or 'fast', see the `gas_oracle_interval`
+            SDK parameter.
+
         :return: transaction id (hash)
         :rtype: str
 
@@ -264,21 +800,29 @@ class SDK(object):
         :raises: ValueError: if the address has a wrong format.
         :raises: ValueError: if the nonce is incorrect.
         :raises: ValueError: if insufficient funds for for gas * gas_price + value.
+        :raises: ValueError: if the urgency is not one of the tiers.
         """
         if not self.address:
             raise SdkNotConfiguredError('private key not configured')
         validate_address(address)
         if amount <= 0:
             raise ValueError('amount must be positive')
-        return self._tx_manager.send_transaction(address, amount)
+        self._validate_urgency(urgency)
+        if self._senders:
+            return self._senders.send_transaction(address, self.web3.toWei(amount, 'ether'), urgency=urgency)
+        return self._tx_manager.send_transaction(address, amount, urgency=urgency)
 
-    def send_tokens(self, address, amount):
+    @timed
+    def send_tokens(self, address, amount, urgency=URGENCY_STANDARD):
         """Send tokens from my wallet to address.
 
         :param str address: the address to send tokens to.
 
         :param Decimal amount: the amount of tokens to transfer.
 
+        :param str urgency: the gas price urgency tier: 'slow', 'standard' or 'fast', see the `gas_oracle_interval`
+            SDK parameter.
+
         :returns: transaction id (hash)
         :rtype: str
 
@@ -287,16 +831,148 @@ class SDK(object):
         :raises: ValueError: if the address has a wrong format.
         :raises: ValueError: if the nonce is incorrect.
         :raises: ValueError: if insufficient funds for for gas * gas_price.
+        :raises: ValueError: if the urgency is not one of the tiers.
         """
         if not self.address:
             raise SdkNotConfiguredError('private key not configured')
         validate_address(address)
         if amount <= 0:
             raise ValueError('amount must be positive')
+        self._validate_urgency(urgency)
         hex_data = self.token_contract._encode_transaction_data('transfer', args=(address, self.web3.toWei(amount, 'ether')))
         data = hexstr_if_str(to_bytes, hex_data)
-        return self._tx_manager.send_transaction(self.token_contract.address, 0, data)
+        if self._senders:
+            return self._senders.send_transaction(self.token_contract.address, 0, data,
+                                                  self.web3.toWei(amount, 'ether'), urgency)
+        return self._tx_manager.send_transaction(self.token_contract.address, 0, data, urgency)
+
+    @timed
+    def send_ether_batch(self, payments, urgency=URGENCY_STANDARD):
+        """Send Ether from my wallet to many addresses.
+        The transactions get consecutive nonces and are submitted in batches, see the `batch_size` SDK parameter.
+        All the payments are validated before anything is sent.
+
+        :param list payments: a list of (address, amount) tuples, the amount is in Ether.
+
+        :param str urgency: the gas price urgency tier: 'slow', 'standard' or 'fast', see the `gas_oracle_interval`
+            SDK parameter.
+
+        :returns: for every payment, either the transaction id (hash) or the ValueError the node rejected it with.
+        :rtype: list
+
+        :raises: :class:`~erc20token.exceptions.SdkConfigurationError`: if the SDK was not configured with a private key.
+        :raises: ValueError: if some amount is not positive.
+        :raises: ValueError: if some address has a wrong format.
+        :raises: ValueError: if the urgency is not one of the tiers.
+        """
+        if not self.address:
+            raise SdkNotConfiguredError('private key not configured')
+        self._validate_payments(payments)
+        self._validate_urgency(urgency)
+        return self._tx_manager.send_transactions([(address, amount, b'') for address, amount in payments], urgency)
+
+    @timed
+    def send_tokens_batch(self, payments, urgency=URGENCY_STANDARD):
+        """Send tokens from my wallet to many addresses.
+        The transactions get consecutive nonces and are submitted in batches, see the `batch_size` SDK parameter.
+        All the payments are validated before anything is sent.
+
+        :param list payments: a list of (address, amount) tuples, the amount is in tokens.
+
+        :param str urgency: the gas price urgency tier: 'slow', 'standard' or 'fast', see the `gas_oracle_interval`
+            SDK parameter.
+
+        :returns: for every payment, either the transaction id (hash) or the ValueError the node rejected it with.
+        :rtype: list
+
+        :raises: :class:`~erc20token.exceptions.SdkConfigurationError`: if the SDK was not configured with a private key.
+        :raises: ValueError: if some amount is not positive.
+        :raises: ValueError: if some address has a wrong format.
+        :raises: ValueError: if the urgency is not one of the tiers.
+        """
+        if not self.address:
+            raise SdkNotConfiguredError('private key not configured')
+        self._validate_payments(payments)
+        self._validate_urgency(urgency)
+        transactions = []
+        for address, amount in payments:
+            hex_data = self.token_contract._encode_transaction_data('transfer',
+                                                                    args=(address, self.web3.toWei(amount, 'ether')))
+            transactions.append((self.token_contract.address, 0, hexstr_if_str(to_bytes, hex_data)))
+        return self._tx_manager.send_transactions(transactions, urgency)
+
+    @timed
+    def send_ether_async(self, address, amount, urgency=URGENCY_STANDARD):
+        """Send Ether from my wallet to address, and track the transaction until it is mined.
+        See `send_ether` and `track_transaction`.
+
+        :returns: the future of the transaction.
+        :rtype: :class:`~erc20token.tracker.TransactionFuture`
+        """
+        return self.track_transaction(self.send_ether(address, amount, urgency))
+
+    @timed
+    def send_tokens_async(self, address, amount, urgency=URGENCY_STANDARD):
+        """Send tokens from my wallet to address, and track the transaction until it is mined.
+        See `send_tokens` and `track_transaction`.
+
+        :returns: the future of the transaction.
+        :rtype: :class:`~erc20token.tracker.TransactionFuture`
+        """
+        return self.track_transaction(self.send_tokens(address, amount, urgency))
+
+    @timed
+    def track_transaction(self, tx_id):
+        """Track a transaction until it is mined.
+        On every new block, the receipts of all the tracked transactions are fetched in JSON-RPC batches. If the SDK
+        was inited with `gas_bump_blocks`, a transaction of my wallets that is not mined for that number of blocks
+        is rebroadcast with the same nonce and a higher gas price. A transaction that is not mined for
+        `track_expire_blocks` blocks stops being tracked.
+
+        :param str tx_id: transaction id (hash).
 
+        :returns: the future of the transaction, resolved with its status (SUCCESS or FAIL) when it is mined, or
+            cancelled if it stops being tracked before.
+        :rtype: :class:`~erc20token.tracker.TransactionFuture`
+        """
+        future = self._tracker.track(tx_id)
+        self._start_tracking()
+        return future
+
+    def untrack_transaction(self, tx_id):
+        """Stop tracking a transaction. Its future is cancelled, which wakes up its waiters and runs its callbacks.
+
+        :param str tx_id: transaction id (hash) of any broadcast of the transaction.
+
+        :returns: whether the transaction was tracked.
+        :rtype: bool
+        """
+        return self._tracker.untrack(tx_id)
+
+    @timed
+    def wait_for_receipts(self, tx_ids, timeout=None):
+        """Wait for transactions to be mined.
+        The transactions are tracked (see `track_transaction`), and their receipts are fetched in JSON-RPC batches,
+        right away and then on every new block.
+
+        :param list tx_ids: transaction ids (hashes).
+
+        :param number timeout: the maximal number of seconds to wait for all the transactions, forever if None.
+
+        :returns: for every transaction, its receipt, or None if it was not mined in time. The receipt of a
+            rebroadcast transaction is the receipt of the broadcast that was mined.
+        :rtype: list
+        """
+        # the transactions that were not tracked before are tracked only for this wait
+        own_tx_ids = [tx_id for tx_id in tx_ids if self._tracker.get_future(tx_id) is None]
+        futures = [self.track_transaction(tx_id) for tx_id in tx_ids]
+        self._tracker.poll(new_block=False)
+        if not self._tracker.wait(futures, timeout):
+            for tx_id in own_tx_ids:
+                self._tracker.untrack(tx_id)
+        return [future.receipt for future in futures]
+
+    @timed
     def get_transaction_status(self, tx_id):
         """Get the transaction status for the provided transaction id.
 
@@ -305,11 +981,14 @@ class SDK(object):
         :returns: transaction status.
         :rtype: :class:`~erc20token.TransactionStatus`
         """
-        tx = self.web3.eth.getTransaction(tx_id)
+        tx, tx_receipt, _ = self._get_tx_and_receipt(tx_id)
         if not tx:
             return TransactionStatus.UNKNOWN
-        return self._get_tx_status(tx)
+        if not tx.get('blockNumber'):
+            return TransactionStatus.PENDING
+        return self._get_receipt_status(tx, tx_receipt)
 
+    @timed
     def get_transaction_data(self, tx_id):
         """Gets transaction data for the provided transaction id.
 
@@ -317,28 +996,117 @@ class SDK(object):
         :return: transaction data
         :rtype: :class:`~erc20token.TransactionData`
         """
-        tx_data = TransactionData()
-        tx = self.web3.eth.getTransaction(tx_id)
+        tx, tx_receipt, cur_block_number = self._get_tx_and_receipt(tx_id, need_head=True)
         if not tx:
-            return tx_data
-        tx_data.from_address = tx['from']
-        tx_data.to_address = tx['to']
-        tx_data.ether_amount = self.web3.fromWei(tx['value'], 'ether')
-        tx_data.status = self._get_tx_status(tx)
-        if not tx.get('blockNumber'):
-            tx_data.num_confirmations = 0
-        else:
-            tx_block_number = int(tx['blockNumber'])
-            cur_block_number = int(self.web3.eth.blockNumber)
-            tx_data.num_confirmations = cur_block_number - tx_block_number + 1
-        tx_input = tx.get('input')
-        if tx_input and (tx_input.lower().startswith(ERC20_TRANSFER_ABI_PREFIX.lower())):
-            to, amount = decode_abi(['uint256', 'uint256'], tx_input[len(ERC20_TRANSFER_ABI_PREFIX):])
-            tx_data.to_address = to_hex(to)
-            tx_data.token_amount = self.web3.fromWei(amount, 'ether')
-        return tx_data
+            return TransactionData()
+        return self._make_tx_data(tx, tx_receipt, cur_block_number)
 
-    def monitor_ether_transactions(self, callback_fn, from_address=None, to_address=None):
+    @timed
+    def get_transactions_data(self, tx_ids):
+        """Gets transaction data for several transaction ids.
+        The queries are sent to the node in batches, see the `batch_size` SDK parameter.
+
+        :param list tx_ids: transaction ids (hashes)
+        :return: transaction data, in the same order as the transaction ids.
+        :rtype: list of :class:`~erc20token.TransactionData`
+        """
+        entries = {}  # tx id -> (tx, receipt)
+        if self._tx_cache:
+            for tx_id in tx_ids:
+                entry = self._tx_cache.get_final(tx_id)
+                if entry:
+                    entries[tx_id.lower()] = entry
+        fetch_ids = [tx_id for tx_id in tx_ids if tx_id.lower() not in entries]
+        txs = [transaction_formatter(tx) if tx else None
+               for tx in self._batch_request([('eth_getTransactionByHash', [tx_id]) for tx_id in fetch_ids])]
+        mined_txs = [tx for tx in txs if tx and tx.get('blockNumber')]
+        tx_receipts = {}
+        if mined_txs:
+            results = self._batch_request([('eth_getTransactionReceipt', [tx['hash']]) for tx in mined_txs])
+            for tx, tx_receipt in zip(mined_txs, results):
+                tx_receipts[tx['hash']] = receipt_formatter(tx_receipt) if tx_receipt else None
+        cur_block_number = self._chain_head.get_block_number()
+        for tx_id, tx in zip(fetch_ids, txs):
+            entries[tx_id.lower()] = (tx, tx_receipts.get(tx['hash']) if tx else None)
+            if self._tx_cache:
+                self._tx_cache.set(tx_id, tx, entries[tx_id.lower()][1], cur_block_number)
+        return [self._make_tx_data(tx, tx_receipt, cur_block_number) if tx else TransactionData()
+                for tx, tx_receipt in (entries[tx_id.lower()] for tx_id in tx_ids)]
+
+    def iter_token_transfers(self, from_block, to_block='latest', from_address=None, to_address=None,
+                             workers=DEFAULT_SCAN_WORKERS, chunk_size=DEFAULT_SCAN_CHUNK_SIZE):
+        """Iterate over the past token transfers of a block range.
+        The node is asked for token `Transfer` events with `eth_getLogs`. The range is split into chunks that are
+        fetched concurrently, and shrink if the node reports too many results. Only a few chunks are kept in memory.
+
+        :param int from_block: the first block to scan.
+
+        :param to_block: the last block to scan, a block number or 'latest'.
+
+        :param str from_address: if provided, only transfers from this address are returned.
+
+        :param str to_address: if provided, only transfers to this address are returned.
+
+        :param int workers: the number of chunks fetched concurrently.
+
+        :param int chunk_size: the initial number of blocks in a chunk.
+
+        :returns: an iterator of transfers, in block order.
+        :rtype: iterator of :class:`~erc20token.TokenTransfer`
+
+        :raises: ValueError: if some of the supplied addresses have a wrong format, or the node returned an error.
+        """
+        if from_address:
+            validate_address(from_address)
+        if to_address:
+            validate_address(to_address)
+        if to_block == 'latest':
+            to_block = self.web3.eth.blockNumber
+        filter_params = get_transfer_filter_params(self.token_contract.address, from_address, to_address)
+        scanner = LogScanner(self.web3.providers[0], workers, chunk_size)
+        return self._iter_transfers(scanner.iter_logs(filter_params, from_block, to_block))
+
+    @timed
+    def get_token_transfers(self, from_block, to_block='latest', from_address=None, to_address=None,
+                            workers=DEFAULT_SCAN_WORKERS, chunk_size=DEFAULT_SCAN_CHUNK_SIZE):
+        """Get the past token transfers of a block range in a compact columnar batch.
+        The range is scanned like in `iter_token_transfers`, but the transfers are kept in a
+        :class:`~erc20token.TransferBatch`, which takes much less memory than transfer objects.
+
+        :param int from_block: the first block to scan.
+
+        :param to_block: the last block to scan, a block number or 'latest'.
+
+        :param str from_address: if provided, only transfers from this address are returned.
+
+        :param str to_address: if provided, only transfers to this address are returned.
+
+        :param int workers: the number of chunks fetched concurrently.
+
+        :param int chunk_size: the initial number of blocks in a chunk.
+
+        :returns: the transfers in block order, with amounts in wei.
+        :rtype: :class:`~erc20token.TransferBatch`
+
+        :raises: ValueError: if some of the supplied addresses have a wrong format, or the node returned an error.
+        """
+        if from_address:
+            validate_address(from_address)
+        if to_address:
+            validate_address(to_address)
+        if to_block == 'latest':
+            to_block = self.web3.eth.blockNumber
+        filter_params = get_transfer_filter_params(self.token_contract.address, from_address, to_address)
+        scanner = LogScanner(self.web3.providers[0], workers, chunk_size)
+        batch = TransferBatch()
+        for log in scanner.iter_logs(filter_params, from_block, to_block):
+            if not log.get('removed') and is_transfer_log(log):
+                batch.append(*decode_transfer_log(log))
+        return batch
+
+    def monitor_ether_transactions(self, callback_fn, from_address=None, to_address=None, checkpoint_store=None,
+                                   checkpoint_key=None, confirmation_fn=None,
+                                   confirmations=DEFAULT_CONFIRMATION_DEPTHS):
         """Monitors Ether transactions and calls back on transactions matching the supplied filter.
 
         :param callback_fn: the callback function with the signature `func(tx_id, status, from_address, to_address, amount)`
@@ -348,33 +1116,38 @@ class SDK(object):
 
         :param str to_address: the transactions must be sent to this address. If not provided,
             all addresses will match.
-        """
-        filter_args = self._get_filter_args(from_address, to_address)
 
-        def check_and_callback(tx, status):
-            if tx.get('input') and not (tx['input'] == '0x' or tx['input'] == '0x0'):  # contract transaction, skip it
-                return
-            if (('from' in filter_args and tx['from'].lower() == filter_args['from'].lower() and
-                    ('to' not in filter_args or tx['to'].lower() == filter_args['to'].lower())) or
-                ('to' in filter_args and tx['to'].lower() == filter_args['to'].lower())):
-                    callback_fn(tx['hash'], status, tx['from'], tx['to'], self.web3.fromWei(tx['value'], 'ether'))
-
-        def pending_tx_callback_adapter_fn(tx_id):
-            tx = self.web3.eth.getTransaction(tx_id)
-            if not tx:  # probably invalid and removed from tx pool
-                return
-            check_and_callback(tx, TransactionStatus.PENDING)
+        :param checkpoint_store: If provided, the last fully processed block is recorded in this store. On start,
+            the transactions of the blocks after the recorded block are called back first, and mined transactions
+            are then called back block by block, at least once.
+        :type checkpoint_store: :class:`~erc20token.checkpoint.CheckpointStore`
 
-        def new_block_callback_adapter_fn(block_id):
-            block = self.web3.eth.getBlock(block_id, True)
-            for tx in block['transactions']:
-                check_and_callback(tx, TransactionStatus.SUCCESS)  # TODO: number of block confirmations
+        :param str checkpoint_key: the key of the monitor in the checkpoint store. If not provided, a key is made
+            from the monitor addresses.
+
+        :param confirmation_fn: If provided, mined transactions are followed, and this function is called back with
+            the signature `func(tx_id, status, num_confirmations)` when they reach each of the confirmation depths.
+            If the block of a transaction is orphaned in a chain reorganization, it is called back with the status
+            `REVERTED` and 0 confirmations.
 
-        # start monitoring pending and latest transactions
-        self._filter_mgr.add_filter('pending', pending_tx_callback_adapter_fn)
-        self._filter_mgr.add_filter('latest', new_block_callback_adapter_fn)
+        :param list confirmations: the confirmation depths to call back confirmation_fn at.
 
-    def monitor_token_transactions(self, callback_fn, from_address=None, to_address=None):
+        :returns: the subscription id, to pass to `stop_monitoring`.
+        :rtype: int
+        """
+        self._get_filter_args(from_address, to_address)
+        self._validate_confirmations(confirmation_fn, confirmations)
+        if checkpoint_store:
+            return self._start_checkpointed_monitor('ether', callback_fn, from_address, to_address, False,
+                                                    checkpoint_store, checkpoint_key, confirmation_fn, confirmations)
+        subscription = self._subscriptions.add('ether', callback_fn, from_address, to_address)
+        subscription.confirmation_fn, subscription.confirmations = confirmation_fn, confirmations
+        self._start_dispatch()
+        return subscription.id
+
+    def monitor_token_transactions(self, callback_fn, from_address=None, to_address=None, use_logs=False,
+                                   checkpoint_store=None, checkpoint_key=None, confirmation_fn=None,
+                                   confirmations=DEFAULT_CONFIRMATION_DEPTHS):
         """Monitors token transactions and calls back on transactions matching the supplied filter.
 
         :param callback_fn: the callback function with the signature `func(tx_id, status, from_address, to_address, amount)`
@@ -386,28 +1159,76 @@ class SDK(object):
             all addresses will match. Note that token transactions are always sent to the contract, and the real
             recipient is found in transaction data. This function will decode the data and return the correct
             recipient address.
-        """
-        filter_args = self._get_filter_args(from_address, to_address)
 
-        def pending_tx_callback_adapter_fn(tx_id):
-            tx = self.web3.eth.getTransaction(tx_id)
-            if not tx:  # probably invalid and removed from tx pool
-                return
-            ok, tx_from, tx_to, amount = self._check_parse_contract_tx(tx, filter_args)
-            if ok:
-                callback_fn(tx['hash'], TransactionStatus.PENDING, tx_from, tx_to, amount)
+        :param bool use_logs: If True, mined transfers are found by the node, with a filter on the token `Transfer`
+            event and the from/to addresses, instead of fetching and decoding every new block. This also reports
+            transfers made with `transferFrom` or by other contracts. However, failed transactions emit no events,
+            so they are not reported.
 
-        def new_block_callback_adapter_fn(block_id):
-            block = self.web3.eth.getBlock(block_id, True)
-            for tx in block['transactions']:
-                ok, tx_from, tx_to, amount = self._check_parse_contract_tx(tx, filter_args)
-                if ok:
-                    status = self._get_tx_status(tx)
-                    callback_fn(tx['hash'], status, tx_from, tx_to, amount)
+        :param checkpoint_store: If provided, the last fully processed block is recorded in this store. On start,
+            the transfers of the blocks after the recorded block are read with `eth_getLogs` and called back first,
+            and mined transactions are then called back block by block, at least once. Note that failed transactions
+            are not reported for the blocks read on start.
+        :type checkpoint_store: :class:`~erc20token.checkpoint.CheckpointStore`
 
-        # start monitoring pending and latest transactions
-        self._filter_mgr.add_filter('pending', pending_tx_callback_adapter_fn)
-        self._filter_mgr.add_filter('latest', new_block_callback_adapter_fn)
+        :param str checkpoint_key: the key of the monitor in the checkpoint store. If not provided, a key is made
+            from the monitor addresses.
+
+        :param confirmation_fn: If provided, mined transactions are followed, and this function is called back with
+            the signature `func(tx_id, status, num_confirmations)` when they reach each of the confirmation depths.
+            If the block of a transaction is orphaned in a chain reorganization, it is called back with the status
+            `REVERTED` and 0 confirmations.
+
+        :param list confirmations: the confirmation depths to call back confirmation_fn at.
+
+        :returns: the subscription id, to pass to `stop_monitoring`.
+        :rtype: int
+        """
+        self._get_filter_args(from_address, to_address)
+        self._validate_confirmations(confirmation_fn, confirmations)
+        if checkpoint_store:
+            return self._start_checkpointed_monitor('token', callback_fn, from_address, to_address, use_logs,
+                                                    checkpoint_store, checkpoint_key, confirmation_fn, confirmations)
+        subscription = self._subscriptions.add('token', callback_fn, from_address, to_address, mined=not use_logs)
+        subscription.confirmation_fn, subscription.confirmations = confirmation_fn, confirmations
+        self._start_dispatch()
+        if use_logs:
+            def transfer_log_callback_adapter_fn(log):
+                if not is_transfer_log(log):
+                    return
+                tx_id, tx_from, tx_to, amount, block_number, _ = decode_transfer_log(log)
+                if log.get('removed'):  # the block of the log was orphaned
+                    if confirmation_fn:
+                        self._run_callback(confirmation_fn, tx_id, TransactionStatus.REVERTED, 0)
+                    return
+                self._run_callback(callback_fn, tx_id, TransactionStatus.SUCCESS, tx_from, tx_to,
+                                   self.web3.fromWei(amount, 'ether'))
+                if confirmation_fn:
+                    self._watch_confirmations(subscription, tx_id, block_number, log['blockHash'],
+                                              TransactionStatus.SUCCESS)
+
+            subscription.filter_params = get_transfer_filter_params(self.token_contract.address,
+                                                                    from_address, to_address)
+            subscription.log_callback_fn = transfer_log_callback_adapter_fn
+            self._filter_mgr.add_filter(subscription.filter_params, transfer_log_callback_adapter_fn)
+        return subscription.id
+
+    def stop_monitoring(self, subscription_id):
+        """Stop calling back on transactions of a monitoring subscription.
+
+        :param int subscription_id: the subscription id returned by `monitor_ether_transactions` or
+            `monitor_token_transactions`.
+
+        :returns: True if the subscription was removed, False if there is no such subscription.
+        :rtype: bool
+        """
+        subscription = self._subscriptions.remove(subscription_id)
+        if not subscription:
+            return False
+        if subscription.filter_params:
+            self._filter_mgr.remove_callback(subscription.filter_params, subscription.log_callback_fn)
+        self._confirmations.unwatch(subscription.id)
+        return True
 
     # helpers
 
@@ -424,6 +1245,21 @@ class SDK(object):
 
         # transaction is mined
         tx_receipt = self.web3.eth.getTransactionReceipt(tx['hash'])
+        return self._get_receipt_status(tx, tx_receipt)
+
+    @staticmethod
+    def _get_receipt_status(tx, tx_receipt):
+        """Determines the status of a mined transaction from its receipt.
+
+        :param dict tx: transaction object
+
+        :param dict tx_receipt: transaction receipt object
+
+        :returns: the status of this transaction.
+        :rtype: :class:`~erc20token.TransactionStatus`
+        """
+        if not tx_receipt:  # the block was reorganized out since the transaction was fetched
+            return TransactionStatus.PENDING
 
         # Byzantium fork introduced a status field
         tx_status = tx_receipt.get('status')
@@ -440,35 +1276,328 @@ class SDK(object):
         # We give our transactions extra gas, so it should not happen.
         return TransactionStatus.FAIL
 
-    def _check_parse_contract_tx(self, tx, filter_args):
-        """Parse contract transaction and check whether it matches the supplied filter.
-        If the transaction matches the filter, the first returned value will be True, and the rest will be
-        correctly filled. If there is no match, the first returned value is False and the rest are empty.
+    def _make_tx_data(self, tx, tx_receipt, cur_block_number):
+        """Fills transaction data from the transaction and its receipt.
 
         :param dict tx: transaction object
 
-        :param dict filter_args: a filter that contains fields 'to', 'from' or both.
+        :param dict tx_receipt: transaction receipt object, or None if the transaction is not mined
+
+        :param int cur_block_number: the current block number, used to count confirmations
 
-        :returns: matching status, from address, to address, token amount
+        :returns: transaction data
+        :rtype: :class:`~erc20token.TransactionData`
+        """
+        tx_data = TransactionData()
+        tx_data.from_address = tx['from']
+        tx_data.to_address = tx['to']
+        tx_data.ether_amount = self.web3.fromWei(tx['value'], 'ether')
+        if not tx.get('blockNumber'):
+            tx_data.status = TransactionStatus.PENDING
+            tx_data.num_confirmations = 0
+        else:
+            tx_data.status = self._get_receipt_status(tx, tx_receipt)
+            tx_data.num_confirmations = cur_block_number - int(tx['blockNumber']) + 1
+        transfer = decode_transfer_input(tx.get('input'))
+        if transfer:
+            tx_data.to_address, amount = transfer
+            tx_data.token_amount = self.web3.fromWei(amount, 'ether')
+        return tx_data
+
+    def _start_tracking(self):
+        """Poll the tracked transactions on every new block. The filter is set up only once."""
+        with self._tracking_lock:
+            if self._tracking:
+                return
+            self._tracking = True
+        self._filter_mgr.add_filter('latest', self._tracker.on_new_block)
+
+    def _get_tx_and_receipt(self, tx_id, need_head=False):
+        """Get a transaction and its receipt, using the transaction cache if it is enabled.
+
+        :param str tx_id: transaction id (hash)
+
+        :param bool need_head: whether the current block number is needed by the caller.
+
+        :returns: transaction (None if not found), receipt (None if not mined) and the current block number
+            (None if it was not needed)
         :rtype: tuple
         """
-        if not tx.get('to') or tx['to'].lower() != self.token_contract.address.lower():  # must be sent to our contract
-            return False, '', '', 0
+        cur_block_number = None
+        if self._tx_cache:
+            if not need_head:
+                entry = self._tx_cache.get_final(tx_id)
+                if entry:
+                    return entry[0], entry[1], None
+            cur_block_number = self._chain_head.get_block_number()
+            entry = self._tx_cache.get(tx_id, cur_block_number)
+            if entry:
+                return entry[0], entry[1], cur_block_number
+
+        tx = self.web3.eth.getTransaction(tx_id)
+        tx_receipt = None
+        if tx and tx.get('blockNumber'):
+            tx_receipt = self.web3.eth.getTransactionReceipt(tx['hash'])
+            if need_head and cur_block_number is None:
+                cur_block_number = self._chain_head.get_block_number()
+        if self._tx_cache:
+            self._tx_cache.set(tx_id, tx, tx_receipt, cur_block_number)
+        return tx, tx_receipt, cur_block_number
+
+    def _batch_request(self, calls):
+        """Sends JSON-RPC calls to the node in batches of `batch_size`.
+
+        :param list calls: a list of (method, params) tuples.
+
+        :returns: raw (unformatted) call results, in the same order as the calls.
+        :rtype: list
+
+        :raises: ValueError: if the node returned an error for any of the calls.
+        """
+        results = []
+        for response in batch_request(self.web3.providers[0], calls, self.batch_size):
+            if 'error' in response:
+                raise ValueError(response['error'])
+            results.append(response['result'])
+        return results
+
+    def _iter_transfers(self, logs):
+        """Decode Transfer event logs."""
+        for log in logs:
+            if log.get('removed') or not is_transfer_log(log):
+                continue
+            tx_id, tx_from, tx_to, amount, block_number, log_index = decode_transfer_log(log)
+            yield TokenTransfer(tx_id, tx_from, tx_to, self.web3.fromWei(amount, 'ether'), block_number, log_index)
+
+    def _start_dispatch(self):
+        """Start dispatching pending transactions and new blocks to the monitoring subscriptions.
+        The filters are shared by all the subscriptions and are set up only once.
+        """
+        with self._dispatch_lock:
+            if self._dispatching:
+                return
+            self._dispatching = True
+        self._filter_mgr.add_filter('pending', self._dispatch_pending_tx)
+        self._filter_mgr.add_filter('latest', self._dispatch_block)
+
+    def _dispatch_pending_tx(self, tx_id):
+        """Pending transaction filter callback: fetch the transaction once and call back the matching subscribers."""
+        if not len(self._subscriptions):
+            return
+        tx = self.web3.eth.getTransaction(tx_id)
+        if not tx:  # probably invalid and removed from tx pool
+            return
+        self._dispatch_tx(tx, False)
+
+    def _dispatch_block(self, block_id):
+        """New block filter callback: fetch the block once and call back the subscribers matching its transactions.
+        Subscriptions with a checkpoint first catch up on the blocks they missed, and only receive the block if they
+        have processed all the blocks before it. The fetched block also feeds the chain head tracker, before any
+        monitor callback sees the block.
+        """
+        checkpointed = self._subscriptions.get_checkpointed()
+        need_txs = bool(checkpointed or self._confirmations.is_watching() or
+                        self._subscriptions.has_subscriptions('ether', mined=True) or
+                        self._subscriptions.has_subscriptions('token', mined=True))
+        block = self.web3.eth.getBlock(block_id, need_txs)
+        if not block:
+            return
+        self._chain_head.update(block['number'], block['hash'])
+        if not need_txs:
+            return
+        self._process_confirmations(self._confirmations.on_block(block['number'], block['hash'], block['parentHash'],
+                                                                 self.web3.eth.getBlock))
+        with self._checkpoint_lock:
+            for subscription in checkpointed:
+                try:
+                    self._catch_up(subscription, block['number'] if subscription.use_logs else block['number'] - 1)
+                except Exception as e:
+                    logging.warning('cannot catch up monitor {}: {}'.format(subscription.checkpoint_key, e))
+            for tx in block['transactions']:
+                self._dispatch_tx(tx, True)
+            for subscription in checkpointed:
+                if not subscription.use_logs and subscription.checkpoint == block['number'] - 1:
+                    self._save_checkpoint(subscription, block['number'])
+
+    def _start_checkpointed_monitor(self, kind, callback_fn, from_address, to_address, use_logs, checkpoint_store,
+                                    checkpoint_key, confirmation_fn, confirmations):
+        """Add a subscription with a checkpoint store, and catch up on the blocks after its checkpoint.
+        Mined transactions of such subscriptions are delivered from the new block dispatcher, rather than by
+        a log filter.
+
+        :returns: the subscription id
+        :rtype: int
+        """
+        if not checkpoint_key:
+            checkpoint_key = '{}:{}:{}'.format(kind, (from_address or '').lower(), (to_address or '').lower())
+        with self._checkpoint_lock:
+            subscription = self._subscriptions.add(kind, callback_fn, from_address, to_address,
+                                                   mined=kind == 'ether' or not use_logs,
+                                                   checkpoint_store=checkpoint_store, checkpoint_key=checkpoint_key)
+            subscription.use_logs = use_logs
+            subscription.confirmation_fn, subscription.confirmations = confirmation_fn, confirmations
+            head = self.web3.eth.blockNumber
+            subscription.checkpoint = checkpoint_store.get_checkpoint(checkpoint_key)
+            if subscription.checkpoint is None:  # a new monitor starts from the current block
+                self._save_checkpoint(subscription, head)
+            else:
+                self._catch_up(subscription, head)
+        self._start_dispatch()
+        return subscription.id
+
+    def _catch_up(self, subscription, to_block):
+        """Call back the transactions of a subscription from the block after its checkpoint up to to_block,
+        and advance the checkpoint. Token transfers are read with `eth_getLogs`, Ether transactions from blocks
+        fetched in batches.
+        """
+        from_block = subscription.checkpoint + 1
+        if from_block > to_block:
+            return
+        if subscription.kind == 'token':
+            # a subscription with a recipient matches on the recipient, unless it uses logs like the log filter
+            from_address = subscription.from_address if subscription.use_logs or not subscription.to_address else None
+            filter_params = get_transfer_filter_params(self.token_contract.address, from_address,
+                                                       subscription.to_address)
+            scanner = LogScanner(self.web3.providers[0])
+            for transfer in self._iter_transfers(scanner.iter_logs(filter_params, from_block, to_block)):
+                self._run_callback(subscription.callback_fn, transfer.tx_id, TransactionStatus.SUCCESS,
+                                   transfer.from_address, transfer.to_address, transfer.token_amount)
+        else:
+            for start in range(from_block, to_block + 1, self.batch_size):
+                blocks = self._batch_request([('eth_getBlockByNumber', [hex(number).rstrip('L'), True])
+                                              for number in range(start, min(start + self.batch_size, to_block + 1))])
+                for block in blocks:
+                    for tx in (transaction_formatter(tx) for tx in block['transactions']):
+                        tx_input = tx.get('input')
+                        if tx.get('to') and (not tx_input or tx_input == '0x' or tx_input == '0x0') and \
+                                subscription.matches(tx['from'], tx['to']):
+                            self._run_callback(subscription.callback_fn, tx['hash'], TransactionStatus.SUCCESS,
+                                               tx['from'], tx['to'], self.web3.fromWei(tx['value'], 'ether'))
+        self._save_checkpoint(subscription, to_block)
+
+    def _save_checkpoint(self, subscription, block_number):
+        """Advance the checkpoint of a subscription. The checkpoint is recorded in the store once all the callbacks
+        queued so far are done, so that no transaction is lost on restart.
+        """
+        subscription.checkpoint = block_number
+
+        def save():
+            subscription.checkpoint_store.set_checkpoint(subscription.checkpoint_key, block_number)
+
+        if self._callback_executor:
+            self._callback_executor.call_when_done(save)
+        else:
+            save()
+
+    def _dispatch_tx(self, tx, mined):
+        """Match a transaction with the subscriptions and call back the matching subscribers.
+
+        :param dict tx: transaction object
+
+        :param bool mined: whether the transaction comes from a new block
+        """
         tx_input = tx.get('input')
-        if not tx_input or tx_input == '0x':  # not a contract transaction
-            return False, '', '', 0
-        if not tx_input.lower().startswith(ERC20_TRANSFER_ABI_PREFIX.lower()):
-            # only interested in calls to 'transfer' method
-            return False, '', '', 0
-
-        to, amount = decode_abi(['uint256', 'uint256'], tx_input[len(ERC20_TRANSFER_ABI_PREFIX):])
-        to = to_hex(to)
-        amount = self.web3.fromWei(amount, 'ether')
-        if (('from' in filter_args and tx['from'].lower() == filter_args['from'].lower() and
-                ('to' not in filter_args or to.lower() == filter_args['to'].lower())) or
-            ('to' in filter_args and to.lower() == filter_args['to'].lower())):
-                return True, tx['from'], to, amount
-        return False, '', '', 0
+        if not tx_input or tx_input == '0x' or tx_input == '0x0':
+            if not tx.get('to'):
+                return
+            subscriptions = self._subscriptions.match('ether', tx['from'], tx['to'], mined)
+            if mined:
+                subscriptions = self._filter_checkpointed(subscriptions, tx)
+            if not subscriptions:
+                return
+            status = TransactionStatus.SUCCESS if mined else TransactionStatus.PENDING
+            args = (tx['hash'], status, tx['from'], tx['to'], self.web3.fromWei(tx['value'], 'ether'))
+        else:
+            parsed = self._parse_token_tx(tx)
+            if not parsed:
+                return
+            to, amount = parsed
+            subscriptions = self._subscriptions.match('token', tx['from'], to, mined)
+            if mined:
+                subscriptions = self._filter_checkpointed(subscriptions, tx)
+            if not subscriptions:
+                return
+            status = self._get_tx_status(tx) if mined else TransactionStatus.PENDING
+            args = (tx['hash'], status, tx['from'], to, amount)
+        for subscription in subscriptions:
+            self._run_callback(subscription.callback_fn, *args)
+            if mined and subscription.confirmation_fn:
+                self._watch_confirmations(subscription, tx['hash'], int(tx['blockNumber']), tx['blockHash'], status)
+
+    def _watch_confirmations(self, subscription, tx_id, block_number, block_hash, status):
+        """Follow a mined transaction of a subscription to its confirmation depths."""
+        self._process_confirmations(self._confirmations.watch(tx_id, block_number, block_hash, subscription.id,
+                                                              subscription.confirmations, status))
+
+    def _process_confirmations(self, events):
+        """Call back confirmation tracker events.
+
+        :param list events: (tx id, subscription id, number of confirmations, (status,)) tuples.
+        """
+        reverted = False
+        for tx_id, subscription_id, num_confirmations, args in events:
+            subscription = self._subscriptions.get(subscription_id)
+            if not subscription:
+                continue
+            status = args[0]
+            if not num_confirmations:
+                status = TransactionStatus.REVERTED
+                reverted = True
+            self._run_callback(subscription.confirmation_fn, tx_id, status, num_confirmations)
+        if reverted and self._tx_cache:
+            self._tx_cache.invalidate_recent()
+
+    @staticmethod
+    def _filter_checkpointed(subscriptions, tx):
+        """Keep the subscriptions that have no checkpoint, or have processed all the blocks before the transaction."""
+        return [subscription for subscription in subscriptions
+                if subscription.checkpoint is None or subscription.checkpoint == int(tx['blockNumber']) - 1]
+
+    def _run_callback(self, callback_fn, tx_id, *args):
+        """Call back a monitoring subscriber, in the callback pool if there is one."""
+        if self._callback_executor:
+            self._callback_executor.submit(tx_id.lower(), callback_fn, tx_id, *args)
+            return
+        try:
+            callback_fn(tx_id, *args)
+        except Exception as e:
+            logging.exception(e)
+
+    def _parse_token_tx(self, tx):
+        """Parse a token transfer transaction.
+
+        :param dict tx: transaction object
+
+        :returns: the token recipient address and the token amount, or None if this is not a transfer transaction
+            of our token.
+        :rtype: tuple
+        """
+        to = tx.get('to')
+        if not to or (to != self._token_address and to.lower() != self._token_address):  # must be sent to our contract
+            return None
+        # only interested in calls to 'transfer' method
+        transfer = decode_transfer_input(tx.get('input'))
+        if not transfer:
+            return None
+        return transfer[0], self.web3.fromWei(transfer[1], 'ether')
+
+    @staticmethod
+    def _validate_confirmations(confirmation_fn, confirmations):
+        if confirmation_fn and (not confirmations or
+                                any(not isinstance(depth, int) or depth <= 0 for depth in confirmations)):
+            raise ValueError('confirmations must be a list of positive integers')
+
+    @staticmethod
+    def _validate_urgency(urgency):
+        if urgency not in URGENCIES:
+            raise ValueError('urgency must be one of: ' + ', '.join(URGENCIES))
+
+    @staticmethod
+    def _validate_payments(payments):
+        for address, amount in payments:
+            validate_address(address)
+            if amount <= 0:
+                raise ValueError('amount must be positive')
 
     @staticmethod
     def _get_filter_args(from_address, to_address):
@@ -488,23 +1617,111 @@ class TransactionManager(object):
     """TransactionManager handles sending of raw transactions.
     Due to the requirement that nonce number be continuous, we need to serialize concurrent transactions
     and centralize nonce calculation.
+
+    By default, the nonce is read from the node before every transaction, and the whole send is serialized.
+    In pipelined mode, the local nonce is authoritative: it is synced from the node only at startup, after
+    nonce errors and every `nonce_sync_interval` seconds. The lock then covers only the nonce reservation, so
+    gas estimation, signing and submission of concurrent transactions run in parallel.
+
+    The initial nonce and the gas price are fetched from the node in a single batch, at construction or, in lazy
+    mode, in a background thread. In lazy mode, they are awaited on first use.
+
+    Transactions are signed by a :class:`~erc20token.signing.TransactionSigner`, which keeps the parsed private key.
+    With a :class:`~erc20token.gas.GasPriceOracle`, transactions pay the oracle price of their urgency tier, and the
+    wallet gas price is the fallback when the oracle has no recent price.
     """
 
-    def __init__(self, web3, private_key, address, token_contract, gas_price, gas_limit):
+    def __init__(self, web3, private_key, address, token_contract, gas_price, gas_limit,
+                 pipelined_nonce=False, nonce_sync_interval=DEFAULT_NONCE_SYNC_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                 gas_cache=None, lazy=False, chain_id=None, sign_threads=0, gas_oracle=None):
         self.web3 = web3
         self.private_key = private_key
         self.address = address
         self.token_contract = token_contract
-        self.local_nonce = self.web3.eth.getTransactionCount(self.address)
         self.gas_limit = gas_limit
-        self.lock = threading.Lock()
-
-        if gas_price:
-            self.gas_price = int(gas_price * 10**9)  # gas_price is in Gwei, convert it to wei
+        self.lock = threading.RLock()
+        self.pipelined_nonce = pipelined_nonce
+        self.nonce_sync_interval = nonce_sync_interval
+        self.batch_size = batch_size
+        self.gas_cache = gas_cache
+        self.gas_oracle = gas_oracle
+        self.signer = TransactionSigner(private_key, chain_id, sign_threads)
+        self._nonce_synced_at = 0
+        self._nonce_gap = False
+        self._local_nonce = 0
+        self._gas_price = int(gas_price * 10**9) if gas_price else None  # gas_price is in Gwei, convert it to wei
+        self._ready = False
+        self._init_lock = threading.Lock()
+
+        if lazy:
+            t = threading.Thread(target=self._prefetch)
+            t.daemon = True
+            t.start()
         else:
-            self.gas_price = self.web3.eth.gasPrice or DEFAULT_GAS_PRICE
+            self._ensure_ready()
+
+    @property
+    def local_nonce(self):
+        if not self._ready:
+            self._ensure_ready()
+        return self._local_nonce
+
+    @local_nonce.setter
+    def local_nonce(self, nonce):
+        self._local_nonce = nonce
 
-    def send_transaction(self, address, amount, data=b''):
+    @property
+    def gas_price(self):
+        if not self._ready:
+            self._ensure_ready()
+        return self._gas_price
+
+    @gas_price.setter
+    def gas_price(self, gas_price):
+        self._gas_price = gas_price
+
+    def get_gas_price(self, urgency=URGENCY_STANDARD):
+        """Get the gas price of a transaction: the oracle price of the urgency tier, or the wallet gas price.
+
+        :returns: the gas price in wei.
+        :rtype: int
+        """
+        gas_price = self.gas_oracle.get_price(urgency) if self.gas_oracle else None
+        return gas_price or self.gas_price
+
+    def _ensure_ready(self):
+        """Fetch the initial nonce and the gas price, if not fetched yet.
+        In pipelined mode, the nonce is also synced with the pending transaction count.
+        """
+        with self._init_lock:
+            if self._ready:
+                return
+            calls = [('eth_getTransactionCount', [self.address, 'latest'])]
+            if self.pipelined_nonce:
+                calls.append(('eth_getTransactionCount', [self.address, 'pending']))
+            if self._gas_price is None:
+                calls.append(('eth_gasPrice', []))
+            results = []
+            for response in batch_request(self.web3.providers[0], calls, len(calls)):
+                if 'error' in response:
+                    raise ValueError(response['error'])
+                results.append(hex_to_integer(response['result']))
+            self._local_nonce = results[0]
+            if self.pipelined_nonce:
+                self._local_nonce = max(results[0], results[1])
+                self._nonce_synced_at = time()
+            if self._gas_price is None:
+                self._gas_price = results[-1] or DEFAULT_GAS_PRICE
+            self._ready = True
+
+    def _prefetch(self):
+        """Fetch the initial nonce and the gas price in the background. On failure, they are fetched on first use."""
+        try:
+            self._ensure_ready()
+        except Exception as e:
+            logger.warning('cannot prefetch wallet nonce and gas price: ' + str(e))
+
+    def send_transaction(self, address, amount, data=b'', urgency=URGENCY_STANDARD, gas=None):
         """Send transaction with retry.
         Submitting a raw transaction can result in a nonce collision error. In this case, the submission is
         retried with a new nonce.
@@ -515,9 +1732,17 @@ class TransactionManager(object):
 
         :param data: binary data to put into transaction data field.
 
+        :param str urgency: the gas price urgency tier, see `get_gas_price`.
+
+        :param int gas: the gas limit of the transaction. If not provided, it is estimated.
+
         :returns: transaction id (hash)
         :rtype: str
         """
+        gas_price = self.get_gas_price(urgency)
+        if self.pipelined_nonce:
+            return self._send_transaction_pipelined(address, amount, data, gas_price, gas)
+
         with self.lock:
             attempts = 0
             while True:
@@ -525,37 +1750,291 @@ class TransactionManager(object):
                     remote_nonce = self.web3.eth.getTransactionCount(self.address, 'pending')
                     nonce = max(self.local_nonce, remote_nonce)
                     value = self.web3.toWei(amount, 'ether')
-                    tx = Transaction(
-                        nonce=nonce,
-                        gasprice=self.gas_price,
-                        startgas=self.estimate_tx_gas({'to': address, 'from': self.address, 'value': value, 'data': data}),
-                        to=address,
-                        value=value,
-                        data=data,
-                    )
-                    signed_tx = tx.sign(self.private_key)
-                    raw_tx_hex = self.web3.toHex(rlp.encode(signed_tx))
-                    tx_id = self.web3.eth.sendRawTransaction(raw_tx_hex)
+                    gas = gas or self.estimate_tx_gas({'to': address, 'from': self.address, 'value': value,
+                                                       'data': data})
+                    tx_id = self._sign_and_send(nonce, gas, address, value, data, gas_price)
                     # send successful, increment nonce.
                     self.local_nonce = nonce + 1
                     return tx_id
                 except ValueError as ve:
-                    if 'message' in ve.args[0]:
-                        err_msg = ve.args[0]['message']
-                        if ('nonce too low' in err_msg
-                            or 'another transaction with same nonce' in err_msg
-                            or "the tx doesn't have the correct nonce" in err_msg) \
-                                and attempts < RETRY_ATTEMPTS:
-                            logging.warning('transaction nonce error, retrying')
-                            attempts += 1
-                            sleep(RETRY_DELAY)  # TODO: exponential backoff, configurable retry?
-                            continue
+                    if self._is_nonce_error(ve) and attempts < RETRY_ATTEMPTS:
+                        logging.warning('transaction nonce error, retrying')
+                        attempts += 1
+                        sleep(RETRY_DELAY * 2 ** (attempts - 1))
+                        continue
                     raise
 
+    def send_transactions(self, transactions, urgency=URGENCY_STANDARD):
+        """Send many transactions, submitting them to the node in JSON-RPC batches.
+        Gas is estimated for all the transactions in a single batch, and a contiguous nonce range is reserved for
+        the whole list. If the node rejects a transaction, its nonce is handed to the next transaction in the list,
+        so the accepted transactions are never stuck behind a nonce gap.
+
+        :param list transactions: a list of (address, amount, data) tuples, see `send_transaction`.
+
+        :param str urgency: the gas price urgency tier, see `get_gas_price`.
+
+        :returns: for every transaction, either its id (hash) or the ValueError the node rejected it with.
+        :rtype: list
+        """
+        items = [(address, self.web3.toWei(amount, 'ether'), data) for address, amount, data in transactions]
+        gas = self._estimate_batch_gas(items)
+        gas_price = self.get_gas_price(urgency)
+        if self.pipelined_nonce:
+            return self._send_batch(items, gas, gas_price)
+        with self.lock:
+            return self._send_batch(items, gas, gas_price, resync=True)
+
+    def sync_nonce(self):
+        """Sync the local nonce with the pending transaction count of the node.
+        The local nonce never goes back, unless a failed submission left a gap in the nonce sequence.
+        """
+        with self.lock:
+            self._sync_nonce()
+
+    def _sync_nonce(self):
+        """Sync the local nonce, must be called with the lock held.
+
+        :returns: the pending transaction count of the node
+        :rtype: int
+        """
+        remote_nonce = self.web3.eth.getTransactionCount(self.address, 'pending')
+        if self._nonce_gap:
+            self.local_nonce = remote_nonce
+            self._nonce_gap = False
+        else:
+            self.local_nonce = max(self.local_nonce, remote_nonce)
+        self._nonce_synced_at = time()
+        return remote_nonce
+
+    def _reserve_nonce(self, resync=False):
+        """Reserve the next nonce. The node is only queried when a sync is due.
+
+        :param bool resync: force a sync with the node before the reservation.
+
+        :returns: reserved nonce
+        :rtype: int
+        """
+        return self._reserve_nonces(1, resync)[0]
+
+    def _release_nonce(self, nonce):
+        """Return a reserved nonce that was not used by a submitted transaction.
+        If later nonces were reserved in the meantime, the gap is closed by the next sync.
+        """
+        with self.lock:
+            if self.local_nonce == nonce + 1:
+                self.local_nonce = nonce
+            else:
+                self._nonce_gap = True
+
+    def _send_transaction_pipelined(self, address, amount, data, gas_price, gas=None):
+        """Send transaction using the local nonce. Only the nonce reservation is serialized."""
+        value = self.web3.toWei(amount, 'ether')
+        gas = gas or self.estimate_tx_gas({'to': address, 'from': self.address, 'value': value, 'data': data})
+        attempts = 0
+        resync = False
+        while True:
+            nonce = self._reserve_nonce(resync)
+            try:
+                return self._sign_and_send(nonce, gas, address, value, data, gas_price)
+            except ValueError as ve:
+                if self._is_nonce_error(ve) and attempts < RETRY_ATTEMPTS:
+                    logging.warning('transaction nonce error, resyncing nonce and retrying')
+                    attempts += 1
+                    resync = True
+                    sleep(RETRY_DELAY * 2 ** (attempts - 1))
+                    continue
+                self._release_nonce(nonce)
+                raise
+            except Exception:
+                self._release_nonce(nonce)
+                raise
+
+    def _reserve_nonces(self, count, resync=False):
+        """Reserve a contiguous range of nonces.
+
+        :returns: reserved nonces
+        :rtype: list
+        """
+        with self.lock:
+            if resync or self._nonce_gap or \
+                    (self.nonce_sync_interval and time() - self._nonce_synced_at > self.nonce_sync_interval):
+                self._sync_nonce()
+            nonces = list(range(self.local_nonce, self.local_nonce + count))
+            self.local_nonce += count
+            return nonces
+
+    def _send_batch(self, items, gas, gas_price, resync=False):
+        """Sign and submit transactions in JSON-RPC batches, re-sequencing nonces after rejections."""
+        results = [None] * len(items)
+        attempts = [0] * len(items)
+        pending = deque(range(len(items)))
+        free_nonces = self._reserve_nonces(len(items), resync)
+        while pending:
+            chunk = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+            if len(free_nonces) < len(chunk):
+                free_nonces.extend(self._reserve_nonces(len(chunk) - len(free_nonces)))
+            nonces, free_nonces = free_nonces[:len(chunk)], free_nonces[len(chunk):]
+            raw_txs = self.signer.sign_batch([(nonce, gas_price, gas[index]) + tuple(items[index])
+                                              for index, nonce in zip(chunk, nonces)])
+            calls = [('eth_sendRawTransaction', [raw_tx]) for raw_tx in raw_txs]
+            responses = batch_request(self.web3.providers[0], calls, self.batch_size)
+
+            retry = []
+            nonce_error = False
+            for index, nonce, response in zip(chunk, nonces, responses):
+                if 'error' not in response:
+                    results[index] = response['result']
+                    continue
+                error = ValueError(response['error'])
+                if not self._is_nonce_error(error):
+                    results[index] = error
+                    free_nonces.append(nonce)  # hand the nonce to the next transaction
+                    continue
+                # the nonce was taken by someone else, drop it
+                nonce_error = True
+                if attempts[index] < RETRY_ATTEMPTS:
+                    attempts[index] += 1
+                    retry.append(index)
+                else:
+                    results[index] = error
+            free_nonces.sort()
+
+            if nonce_error:
+                logging.warning('transaction nonce error in batch, resyncing nonce')
+                with self.lock:
+                    remote_nonce = self._sync_nonce()
+                free_nonces = [nonce for nonce in free_nonces if nonce >= remote_nonce]
+            if retry:
+                sleep(RETRY_DELAY * 2 ** (max(attempts[index] for index in retry) - 1))
+                pending.extendleft(reversed(retry))
+
+        self._close_nonce_gaps(free_nonces)
+        return results
+
+    def _close_nonce_gaps(self, free_nonces):
+        """Dispose of nonces that were reserved but not used.
+        Nonces at the top of the sequence are handed back, the rest are filled with empty transactions to self.
+        """
+        with self.lock:
+            while free_nonces and free_nonces[-1] == self.local_nonce - 1:
+                self.local_nonce = free_nonces.pop()
+        if not free_nonces:
+            return
+        gas = self.estimate_tx_gas({'to': self.address, 'from': self.address, 'value': 0, 'data': b''})
+        calls = [('eth_sendRawTransaction', [self._sign(nonce, gas, self.address, 0, b'')]) for nonce in free_nonces]
+        for response in batch_request(self.web3.providers[0], calls, self.batch_size):
+            if 'error' in response:
+                logging.warning('cannot fill nonce gap: ' + str(response['error']))
+                with self.lock:
+                    self._nonce_gap = True
+
+    def _estimate_batch_gas(self, items):
+        """Estimate gas for many transactions in JSON-RPC batches.
+        Transactions with a cached estimate for their shape are not sent to the node.
+
+        :param list items: a list of (address, value in wei, data) tuples.
+
+        :returns: estimated gas for every transaction, or default gas if an estimate has failed.
+        :rtype: list
+        """
+        if self.gas_limit:
+            return [self.gas_limit] * len(items)
+        txs = [{'to': address, 'from': self.address, 'value': value, 'data': data} for address, value, data in items]
+        gas = [self._get_cached_gas(tx) for tx in txs]
+        missing = [index for index, tx_gas in enumerate(gas) if not tx_gas]
+        calls = [('eth_estimateGas', [dict(txs[index], value=self.web3.toHex(txs[index]['value']),
+                                           data=encode_hex(txs[index]['data']))])
+                 for index in missing]
+        # the recipient properties of the gas estimate cache shapes are looked up in the same batch
+        lookups = self.gas_cache.get_recipient_calls([txs[index] for index in missing]) if self.gas_cache else []
+        responses = batch_request(self.web3.providers[0], calls + [call for _, call in lookups], self.batch_size)
+        for (key, _), response in zip(lookups, responses[len(calls):]):
+            self.gas_cache.set_recipient_info(key, response)
+        for index, response in zip(missing, responses):
+            if 'error' in response:
+                logging.warning('cannot estimate gas for transaction: ' + str(response['error']))
+                gas[index] = DEFAULT_GAS_PER_TX
+            else:
+                gas[index] = hex_to_integer(response['result']) + (10000 if txs[index]['data'] else 5000)
+                self._set_cached_gas(txs[index], gas[index])
+        return gas
+
+    def _get_cached_gas(self, tx):
+        """Get a gas estimate from the cache, if enabled. Cache failures are logged and treated as misses."""
+        if not self.gas_cache:
+            return None
+        try:
+            return self.gas_cache.get(tx)
+        except Exception as e:
+            logging.warning('cannot read gas estimate cache: ' + str(e))
+            return None
+
+    def _set_cached_gas(self, tx, gas):
+        """Store a gas estimate in the cache, if enabled."""
+        if not self.gas_cache:
+            return
+        try:
+            self.gas_cache.set(tx, gas)
+        except Exception as e:
+            logging.warning('cannot update gas estimate cache: ' + str(e))
+
+    def _sign(self, nonce, gas, address, value, data, gas_price=None):
+        """Sign a transaction with the wallet private key.
+
+        :param int gas_price: the gas price in wei, the wallet gas price if not given.
+
+        :returns: raw signed transaction, hex encoded
+        :rtype: str
+        """
+        return self.signer.sign(nonce, gas_price or self.gas_price, gas, address, value, data)
+
+    def replace_transaction(self, tx, gas_price):
+        """Sign a pending transaction of the wallet again with a new gas price, and submit it with the same nonce,
+        so that it replaces the pending one.
+
+        :param dict tx: the pending transaction, as returned by `eth.getTransaction`.
+
+        :param int gas_price: the gas price of the replacement in wei.
+
+        :returns: the id (hash) of the replacement, or None if the nonce was used already, as it happens when
+            the pending transaction was mined meanwhile.
+        :rtype: str
+
+        :raises: ValueError: if the node rejected the replacement for another reason.
+        """
+        try:
+            return self._sign_and_send(tx['nonce'], tx['gas'], tx['to'], tx['value'],
+                                       hexstr_if_str(to_bytes, tx['input']), gas_price)
+        except ValueError as ve:
+            if self._is_nonce_error(ve):
+                return None
+            raise
+
+    def _sign_and_send(self, nonce, gas, address, value, data, gas_price=None):
+        """Sign a transaction with the wallet private key and submit it.
+
+        :returns: transaction id (hash)
+        :rtype: str
+        """
+        return self.web3.eth.sendRawTransaction(self._sign(nonce, gas, address, value, data, gas_price))
+
+    @staticmethod
+    def _is_nonce_error(ve):
+        """Check whether a node error is caused by a wrong nonce."""
+        if not isinstance(ve.args[0], dict) or 'message' not in ve.args[0]:
+            return False
+        err_msg = ve.args[0]['message']
+        return ('nonce too low' in err_msg
+                or 'another transaction with same nonce' in err_msg
+                or "the tx doesn't have the correct nonce" in err_msg)
+
     def estimate_tx_gas(self, tx):
         """Estimate transaction gas.
         If there is a predefined limit, return it.
-        Otherwise ask the API to estimate gas and add a buffer for safety.
+        Otherwise, if the gas estimate cache has an estimate for this transaction shape, return it.
+        Otherwise ask the API to estimate gas and add a buffer for safety. With the gas estimate cache, the estimate
+        is requested in a JSON-RPC batch with the lookup of the cache shape.
 
         :param dict tx: sample transaction to estimate gas for.
         :return: estimated gas, or default gas if estimate has failed.
@@ -563,79 +2042,250 @@ class TransactionManager(object):
         """
         if self.gas_limit:
             return self.gas_limit
+        if self.gas_cache:
+            try:
+                return self._estimate_batch_gas([(tx['to'], tx['value'], tx['data'])])[0]
+            except Exception as e:
+                logging.warning('cannot estimate gas for transaction: ' + str(e))
+                return DEFAULT_GAS_PER_TX
         gas_buffer = 10000 if tx.get('data') else 5000
         try:
-            if tx['data']:
-                tx['data'] = encode_hex(tx['data'])
-            return get_buffered_gas_estimate(self.web3, tx, gas_buffer=gas_buffer)
+            estimate_tx = dict(tx)
+            if estimate_tx['data']:
+                estimate_tx['data'] = encode_hex(estimate_tx['data'])
+            gas = get_buffered_gas_estimate(self.web3, estimate_tx, gas_buffer=gas_buffer)
         except Exception as e:
             logging.warning('cannot estimate gas for transaction: ' + str(e))
             return DEFAULT_GAS_PER_TX
+        self._set_cached_gas(tx, gas)
+        return gas
 
 
 class FilterManager(object):
     """FilterManager encapsulates transaction filters management.
-    Currently, its main purpose is to override the `web3.eth.filter._run` worker function that does not handle
-    exceptions and crashes the polling thread whenever an exception occurs.
+    All the filters are polled from a single scheduler thread, with an adaptive cadence: a filter that had no
+    changes is polled less and less often, and a block-paced filter (new blocks, logs) is polled again around
+    the time the next block is expected. Polling errors are backed off per filter, and expired filters are
+    recreated on the node.
+
+    The scheduler only polls: the entries of every filter are handed to a dispatcher thread of that filter, which
+    runs the filter callbacks in order, so a slow callback or a burst of entries does not delay the other filters.
     """
-    def __init__(self, web3):
+    def __init__(self, web3, block_time=DEFAULT_BLOCK_TIME, min_poll_interval=DEFAULT_MIN_POLL_INTERVAL,
+                 max_poll_interval=DEFAULT_MAX_POLL_INTERVAL):
         self.web3 = web3
+        self.block_time = block_time
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
         self.filters = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._scheduler = None
+        self._running = False
         super(FilterManager, self).__init__()
 
     def add_filter(self, filter_params,  *callbacks):
         """Setup a new filter or add a callback if the filter already exists.
-        After registering of a new filter, its worker function is overriden with our custom one.
 
-        :param filter_params: parameters to pass to `web3.eth.filter`
+        :param filter_params: parameters to pass to `web3.eth.filter`: 'latest', 'pending' or a log filter dict
 
         :param callbacks: callback function to add
 
         :returns: filter_id
         :rtype: str
         """
-        filter_key = hash(filter_params)
-        if filter_key not in self.filters:
-            new_filter = self.web3.eth.filter(filter_params)
-            # WARNING: ugly hack to replace thread worker
-            new_filter._Thread__target = self._run_filter(filter_params, new_filter)
-            new_filter.callbacks.extend(callbacks)
-            self.filters[filter_key] = new_filter
-            new_filter.start()
-            sleep(0)
-        else:
-            self.filters[filter_key].callbacks.extend(callbacks)
-        return self.filters[filter_key].filter_id
+        filter_key = json.dumps(filter_params, sort_keys=True)
+        with self._lock:
+            if filter_key not in self.filters:
+                self.filters[filter_key] = _FilterState(filter_params, self.web3.eth.filter(filter_params),
+                                                        self.min_poll_interval)
+                self.filters[filter_key].start_dispatcher()
+            filter_state = self.filters[filter_key]
+            filter_state.callbacks.extend(callbacks)
+            filter_state.next_poll = time()
+            if not self._running or self._scheduler is None:
+                # a scheduler stopped by remove_filters exits on its own, as it is no longer the current one
+                self._running = True
+                self._scheduler = threading.Thread(target=self._run_scheduler)
+                self._scheduler.daemon = True
+                self._scheduler.start()
+        self._wakeup.set()
+        return filter_state.filtr.filter_id
+
+    def remove_callback(self, filter_params, callback_fn):
+        """Remove a callback from a filter. A filter left without callbacks is uninstalled.
+
+        :param filter_params: the parameters the filter was added with.
+
+        :param callback_fn: the callback function to remove.
+        """
+        filter_key = json.dumps(filter_params, sort_keys=True)
+        with self._lock:
+            filter_state = self.filters.get(filter_key)
+            if not filter_state or callback_fn not in filter_state.callbacks:
+                return
+            filter_state.callbacks.remove(callback_fn)
+            if filter_state.callbacks:
+                return
+            del self.filters[filter_key]
+        filter_state.stop_dispatcher()
+        try:
+            self.web3.eth.uninstallFilter(filter_state.filtr.filter_id)
+        except Exception as e:
+            logging.warning('cannot uninstall filter: ' + str(e))
 
-    def _run_filter(self, filter_params, filtr):
-        if filtr.stopped:
-            raise ValueError("Cannot restart a Filter")
-        filtr.running = True
+    def get_stats(self):
+        """Get per-filter polling metrics.
 
-        def _runner():
-            """Our custom filter worker"""
-            while filtr.running:
-                try:
-                    changes = self.web3.eth.getFilterChanges(filtr.filter_id)
-                    if changes:
-                        for entry in changes:
-                            for callback_fn in filtr.callbacks:
-                                if filtr.is_valid_entry(entry):
-                                    callback_fn(filtr.format_entry(entry))
-                    sleep(1)  # TODO: configurable?
-                except ValueError as ve:
-                    if 'message' in ve.args[0] and ve.args[0]['message'] == 'filter not found':
-                        logging.warning('filter {} has expired, recreating'.format(filtr.filter_id))
-                        new_filter = self.web3.eth.filter(filter_params)
-                        filtr.filter_id = new_filter.filter_id
-                        continue
-                    logging.exception(ve)
-                except Exception as e:
-                    logging.exception(e)
-        return _runner
+        :returns: filter key -> metrics: the number of polls, entries, errors and recreations, the number of polled
+            batches waiting for the callbacks, the current poll interval, the delay of the last poll behind its
+            schedule, and the seconds since the last successful poll and since the last change.
+        :rtype: dict
+        """
+        now = time()
+        with self._lock:
+            return dict((key, filter_state.get_stats(now)) for key, filter_state in self.filters.items())
+
+    def _run_scheduler(self):
+        """The scheduler loop: poll the filter that is due first, then sleep until the next one is due."""
+        while self._running and self._scheduler is threading.current_thread():
+            with self._lock:
+                due = min(self.filters.values(), key=lambda f: f.next_poll) if self.filters else None
+            wait = due.next_poll - time() if due else self.max_poll_interval
+            if wait > 0:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+                continue
+            self._poll(due)
+
+    def _poll(self, filter_state):
+        """Poll a filter for changes, hand them to the filter dispatcher and schedule the next poll."""
+        now = time()
+        filter_state.last_poll_delay = now - filter_state.next_poll
+        try:
+            changes = self.web3.eth.getFilterChanges(filter_state.filtr.filter_id)
+        except ValueError as ve:
+            if isinstance(ve.args[0], dict) and ve.args[0].get('message') == 'filter not found':
+                logging.warning('filter {} has expired, recreating'.format(filter_state.filtr.filter_id))
+                self._recreate(filter_state)
+                return
+            self._backoff(filter_state, ve)
+            return
+        except Exception as e:
+            self._backoff(filter_state, e)
+            return
+
+        filter_state.polls += 1
+        filter_state.errors_in_row = 0
+        filter_state.last_poll_at = time()
+        if changes:
+            filter_state.entries += len(changes)
+            filter_state.last_change_at = filter_state.last_poll_at
+            filter_state.dispatch(changes)
+            filter_state.interval = self.min_poll_interval
+            if filter_state.block_paced:
+                # the next change is not expected before the next block
+                filter_state.next_poll = time() + max(self.min_poll_interval, self.block_time * 0.8)
+                return
+        else:
+            filter_state.interval = min(filter_state.interval * POLL_BACKOFF_FACTOR, self.max_poll_interval)
+        filter_state.next_poll = time() + filter_state.interval
+
+    def _recreate(self, filter_state):
+        """Install an expired filter on the node again."""
+        try:
+            new_filter = self.web3.eth.filter(filter_state.params)
+        except Exception as e:
+            self._backoff(filter_state, e)
+            return
+        filter_state.filtr.filter_id = new_filter.filter_id
+        filter_state.recreations += 1
+        filter_state.next_poll = time()
+
+    def _backoff(self, filter_state, error):
+        """Delay the next poll of a failing filter exponentially."""
+        logging.exception(error)
+        filter_state.errors += 1
+        filter_state.errors_in_row += 1
+        delay = min(self.min_poll_interval * 2 ** filter_state.errors_in_row, MAX_POLL_ERROR_BACKOFF)
+        filter_state.next_poll = time() + delay
 
     def remove_filters(self):
         """Unregister our filters from the node. Not mandatory, as filters will time out anyway."""
-        for key, filtr in self.filters.items():
-            filtr.stop_watching(0.1)
-            self.filters.pop(key, None)
+        with self._lock:
+            self._running = False
+            scheduler, self._scheduler = self._scheduler, None
+            filters, self.filters = self.filters, {}
+        self._wakeup.set()
+        if scheduler and scheduler is not threading.current_thread():
+            scheduler.join(self.max_poll_interval)
+        for filter_state in filters.values():
+            filter_state.stop_dispatcher()
+            try:
+                self.web3.eth.uninstallFilter(filter_state.filtr.filter_id)
+            except Exception as e:
+                logging.warning('cannot uninstall filter: ' + str(e))
+
+
+class _FilterState(object):
+    """Polling state of a single filter, and the dispatcher thread that runs its callbacks."""
+
+    def __init__(self, params, filtr, min_poll_interval=DEFAULT_MIN_POLL_INTERVAL):
+        self.params = params
+        self.filtr = filtr
+        self.block_paced = params != 'pending'
+        self.callbacks = []
+        self.interval = min_poll_interval
+        self._queue = Queue()
+        self._dispatcher = None
+        self.next_poll = time()
+        self.last_poll_at = None
+        self.last_change_at = None
+        self.last_poll_delay = 0
+        self.polls = 0
+        self.entries = 0
+        self.errors = 0
+        self.errors_in_row = 0
+        self.recreations = 0
+
+    def start_dispatcher(self):
+        self._dispatcher = threading.Thread(target=self._run_dispatcher)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def stop_dispatcher(self):
+        """Stop the dispatcher after the entries queued so far."""
+        self._queue.put(None)
+
+    def dispatch(self, entries):
+        """Queue new entries for the callbacks."""
+        self._queue.put(entries)
+
+    def _run_dispatcher(self):
+        while True:
+            entries = self._queue.get()
+            if entries is None:
+                return
+            for entry in entries:
+                if not self.filtr.is_valid_entry(entry):
+                    continue
+                formatted_entry = self.filtr.format_entry(entry)
+                for callback_fn in list(self.callbacks):
+                    try:
+                        callback_fn(formatted_entry)
+                    except Exception as e:
+                        logging.exception(e)
+
+    def get_stats(self, now):
+        return {
+            'filter_id': self.filtr.filter_id,
+            'queued': self._queue.qsize(),
+            'polls': self.polls,
+            'entries': self.entries,
+            'errors': self.errors,
+            'recreations': self.recreations,
+            'poll_interval': self.interval,
+            'last_poll_delay': self.last_poll_delay,
+            'seconds_since_poll': now - self.last_poll_at if self.last_poll_at else None,
+            'seconds_since_change': now - self.last_change_at if self.last_change_at else None,
+        }
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+import threading
+from time import time
+
+from web3.utils.encoding import (
+    hexstr_if_str,
+    to_bytes,
+)
+from web3.utils.formatters import hex_to_integer
+
+from .gas import URGENCY_STANDARD
+from .provider import batch_request
+
+import logging
+logger = logging.getLogger(__name__)
+
+# wallet selection policies.
+POLICY_LEAST_PENDING = 'least_pending'  # the wallet with the fewest transactions being sent
+POLICY_ROUND_ROBIN = 'round_robin'  # the wallets in turn
+SENDER_POLICIES = (POLICY_LEAST_PENDING, POLICY_ROUND_ROBIN)
+
+# default interval in seconds between balance refreshes of the sender wallets.
+DEFAULT_BALANCE_REFRESH_INTERVAL = 60
+
+# the minimal interval in seconds between balance refreshes triggered by insufficient balances.
+MIN_BALANCE_REFRESH_INTERVAL = 1
+
+
+class _SenderWallet(object):
+    __slots__ = ('manager', 'pending', 'sent', 'ether_balance', 'token_balance', 'reserved_ether', 'reserved_tokens',
+                 'submitted_ether', 'submitted_tokens')
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.pending = 0  # transactions being sent
+        self.sent = 0
+        self.ether_balance = 0  # in wei, minus the reservations of transactions sent since the last refresh
+        self.token_balance = 0  # in wei, likewise
+        self.reserved_ether = 0  # in wei, reserved by the transactions being sent
+        self.reserved_tokens = 0  # in wei, likewise
+        self.submitted_ether = 0  # in wei, reserved by the transactions submitted during a balance refresh
+        self.submitted_tokens = 0  # in wei, likewise
+
+
+class SenderPool(object):
+    """SenderPool distributes outgoing transactions across several wallets, each with its own nonce sequence,
+    so that transactions of different wallets are sent in parallel.
+
+    Every transaction goes to a wallet that can afford it: the pool keeps the Ether and token balances of the
+    wallets, refreshed from the node periodically and whenever no wallet can afford a transaction, and reserves
+    the amount and the maximal gas cost (gas limit times gas price) of every transaction from the balance of its
+    wallet. A refresh keeps the reservations of the transactions that are still being sent.
+    """
+
+    def __init__(self, web3, token_contract, managers, policy=POLICY_LEAST_PENDING, batch_size=100,
+                 balance_refresh_interval=DEFAULT_BALANCE_REFRESH_INTERVAL):
+        """Create a new sender pool.
+
+        :param web3: the web3 instance.
+
+        :param token_contract: the token contract.
+
+        :param list managers: the `TransactionManager` of every sender wallet.
+
+        :param str policy: how to choose the sending wallet, one of `SENDER_POLICIES`.
+
+        :param int batch_size: the maximal number of JSON-RPC calls in a single batch.
+
+        :param number balance_refresh_interval: the interval in seconds between balance refreshes.
+        """
+        self.web3 = web3
+        self.token_contract = token_contract
+        self.wallets = [_SenderWallet(manager) for manager in managers]
+        self.policy = policy
+        self.batch_size = batch_size
+        self.balance_refresh_interval = balance_refresh_interval
+        self._refreshed_at = 0
+        self._next = 0  # round robin position
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def addresses(self):
+        return [wallet.manager.address for wallet in self.wallets]
+
+    def send_transaction(self, address, value, data=b'', token_amount=0, urgency=URGENCY_STANDARD):
+        """Send a transaction from one of the wallets.
+
+        :param str address: the target address.
+
+        :param int value: the amount of Ether to send, in wei.
+
+        :param data: binary data to put into the transaction data field.
+
+        :param int token_amount: the amount of tokens the transaction transfers, in wei.
+
+        :param str urgency: the gas price urgency tier, see `TransactionManager.get_gas_price`.
+
+        :returns: transaction id (hash)
+        :rtype: str
+
+        :raises: ValueError: if no wallet has enough balance for the transaction.
+        """
+        self._refresh_if_older(self.balance_refresh_interval)
+        # the gas limit hardly depends on the sending wallet. it is estimated once, with the richest wallet, whose
+        # estimate does not fail for lack of balance
+        with self._lock:
+            manager = max(self.wallets, key=lambda wallet: (wallet.token_balance, wallet.ether_balance)).manager
+        gas = manager.estimate_tx_gas({'to': address, 'from': manager.address, 'value': value, 'data': data})
+        wallet, gas_cost = self._reserve(value, token_amount, gas, urgency)
+        if wallet is None:
+            self._refresh_if_older(MIN_BALANCE_REFRESH_INTERVAL)
+            wallet, gas_cost = self._reserve(value, token_amount, gas, urgency)
+        if wallet is None:
+            raise ValueError('insufficient balance in all sender wallets')
+
+        try:
+            tx_id = wallet.manager.send_transaction(address, self.web3.fromWei(value, 'ether'), data, urgency, gas)
+        except Exception:
+            self._release(wallet, value + gas_cost, token_amount)
+            raise
+        with self._lock:
+            wallet.pending -= 1
+            wallet.sent += 1
+            wallet.reserved_ether -= value + gas_cost
+            wallet.reserved_tokens -= token_amount
+            wallet.submitted_ether += value + gas_cost
+            wallet.submitted_tokens += token_amount
+        return tx_id
+
+    def refresh_balances(self):
+        """Fetch the Ether and token balances of all the wallets from the node, in one batch."""
+        with self._refresh_lock:
+            self._refresh_balances()
+
+    def _refresh_if_older(self, max_age):
+        """Refresh the balances if they are older than max_age seconds. The age is checked again once the refresh
+        lock is taken, so that concurrent senders waiting for the same refresh do not repeat it."""
+        if time() - self._refreshed_at <= max_age:
+            return
+        with self._refresh_lock:
+            if time() - self._refreshed_at > max_age:
+                self._refresh_balances()
+
+    def _refresh_balances(self):
+        """Fetch the balances, must be called with the refresh lock held.
+        The balances the node reports do not include the transactions being sent, and may not include those
+        submitted while the balances are fetched, so the reservations of both are kept.
+        """
+        with self._lock:
+            for wallet in self.wallets:
+                wallet.submitted_ether = wallet.submitted_tokens = 0
+        calls = []
+        for address in self.addresses:
+            calls.append(('eth_getBalance', [address, 'pending']))
+            calls.append(('eth_call', [{'to': self.token_contract.address,
+                                        'data': self.token_contract._encode_transaction_data('balanceOf',
+                                                                                             args=(address,))},
+                                       'pending']))
+        balances = []
+        for response in batch_request(self.web3.providers[0], calls, self.batch_size):
+            if 'error' in response:
+                raise ValueError(response['error'])
+            balances.append(hex_to_integer(response['result']) if response['result'] != '0x' else 0)
+        with self._lock:
+            for index, wallet in enumerate(self.wallets):
+                wallet.ether_balance = balances[2 * index] - wallet.reserved_ether - wallet.submitted_ether
+                wallet.token_balance = balances[2 * index + 1] - wallet.reserved_tokens - wallet.submitted_tokens
+        self._refreshed_at = time()
+
+    def top_up(self, funding_manager, min_ether=0, target_ether=0, min_tokens=0, target_tokens=0):
+        """Send Ether and tokens from a funding wallet to the wallets whose balance is below a minimum, bringing them
+        up to a target. The top-ups are sent in batches, see `TransactionManager.send_transactions`.
+
+        :param funding_manager: the `TransactionManager` of the funding wallet.
+
+        :param int min_ether: the minimal Ether balance in wei.
+
+        :param int target_ether: the Ether balance in wei to top up to.
+
+        :param int min_tokens: the minimal token balance in wei.
+
+        :param int target_tokens: the token balance in wei to top up to.
+
+        :returns: a list of (address, 'ether' or 'token', amount in wei, transaction id or ValueError) tuples.
+        :rtype: list
+        """
+        self.refresh_balances()
+        top_ups = []
+        with self._lock:
+            for wallet in self.wallets:
+                if wallet.ether_balance < min_ether and target_ether > wallet.ether_balance:
+                    top_ups.append((wallet, 'ether', target_ether - wallet.ether_balance))
+                if wallet.token_balance < min_tokens and target_tokens > wallet.token_balance:
+                    top_ups.append((wallet, 'token', target_tokens - wallet.token_balance))
+        if not top_ups:
+            return []
+
+        transactions = []
+        for wallet, kind, amount in top_ups:
+            if kind == 'ether':
+                transactions.append((wallet.manager.address, self.web3.fromWei(amount, 'ether'), b''))
+            else:
+                hex_data = self.token_contract._encode_transaction_data('transfer',
+                                                                        args=(wallet.manager.address, amount))
+                transactions.append((self.token_contract.address, 0, hexstr_if_str(to_bytes, hex_data)))
+        results = funding_manager.send_transactions(transactions)
+
+        report = []
+        with self._lock:
+            for (wallet, kind, amount), result in zip(top_ups, results):
+                if not isinstance(result, ValueError):
+                    if kind == 'ether':
+                        wallet.ether_balance += amount
+                    else:
+                        wallet.token_balance += amount
+                else:
+                    logger.warning('cannot top up {} of {}: {}'.format(kind, wallet.manager.address, result))
+                report.append((wallet.manager.address, kind, amount, result))
+        return report
+
+    def get_stats(self):
+        """Get the sender wallet metrics.
+
+        :returns: for every wallet, its address, the number of transactions being sent and sent, and its
+            Ether and token balances in wei, minus the transactions sent since the last refresh.
+        :rtype: list
+        """
+        with self._lock:
+            return [{'address': wallet.manager.address, 'pending': wallet.pending, 'sent': wallet.sent,
+                     'ether_balance': wallet.ether_balance, 'token_balance': wallet.token_balance}
+                    for wallet in self.wallets]
+
+    def _reserve(self, value, token_amount, gas, urgency=URGENCY_STANDARD):
+        """Choose a wallet that can afford a transaction, and reserve the transaction cost from its balances.
+
+        :param int gas: the gas limit of the transaction.
+
+        :returns: the wallet, or None if no wallet can afford the transaction, and the reserved gas cost in wei.
+        :rtype: tuple
+        """
+        # gas prices are resolved before taking the lock, as getting one may wait for the wallet to be ready
+        gas_costs = [gas * wallet.manager.get_gas_price(urgency) for wallet in self.wallets]
+        with self._lock:
+            candidates = []
+            for offset in range(len(self.wallets)):
+                index = (self._next + offset) % len(self.wallets)
+                wallet = self.wallets[index]
+                if wallet.ether_balance >= value + gas_costs[index] and wallet.token_balance >= token_amount:
+                    candidates.append((index, wallet))
+            if not candidates:
+                return None, 0
+            if self.policy == POLICY_ROUND_ROBIN:
+                index, wallet = candidates[0]
+            else:  # least pending, in round robin order among equals
+                index, wallet = min(candidates, key=lambda candidate: candidate[1].pending)
+            self._next = index + 1
+            wallet.pending += 1
+            wallet.ether_balance -= value + gas_costs[index]
+            wallet.token_balance -= token_amount
+            wallet.reserved_ether += value + gas_costs[index]
+            wallet.reserved_tokens += token_amount
+            return wallet, gas_costs[index]
+
+    def _release(self, wallet, ether_amount, token_amount):
+        """Return the reservation of a transaction that was not sent."""
+        with self._lock:
+            wallet.pending -= 1
+            wallet.ether_balance += ether_amount
+            wallet.token_balance += token_amount
+            wallet.reserved_ether -= ether_amount
+            wallet.reserved_tokens -= token_amount
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+import binascii
+from multiprocessing.pool import ThreadPool
+import threading
+
+from eth_keys import keys
+from eth_utils import keccak
+from web3.utils.encoding import (
+    hexstr_if_str,
+    to_bytes,
+)
+
+try:
+    import coincurve
+except ImportError:  # pure Python environments, such as GAE Standard
+    coincurve = None
+
+# the order of the secp256k1 curve.
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+# the minimal number of transactions in a batch signed in the thread pool. Smaller batches are not worth handing
+# over to the pool, and are signed in the calling thread.
+DEFAULT_PARALLEL_SIGN_THRESHOLD = 64
+
+# the maximal number of cached RLP encodings of repeating fields.
+FIELD_CACHE_SIZE = 1024
+
+_EMPTY_STRING = b'\x80'
+
+
+def _int_to_bytes(value):
+    """Big endian, without leading zeros, as RLP encodes integers."""
+    if not value:
+        return b''
+    hex_value = '%x' % value
+    return binascii.unhexlify('0' * (len(hex_value) % 2) + hex_value)
+
+
+def _encode_length(length, offset):
+    if length < 56:
+        return bytes(bytearray([offset + length]))
+    length_bytes = _int_to_bytes(length)
+    return bytes(bytearray([offset + 55 + len(length_bytes)])) + length_bytes
+
+
+def _encode_bytes(value):
+    if len(value) == 1 and bytearray(value)[0] < 0x80:
+        return value
+    return _encode_length(len(value), 0x80) + value
+
+
+def _encode_int(value):
+    return _encode_bytes(_int_to_bytes(value))
+
+
+def _encode_list(payload):
+    """RLP list of already encoded items."""
+    return _encode_length(len(payload), 0xc0) + payload
+
+
+class TransactionSigner(object):
+    """TransactionSigner signs the raw transactions of a wallet.
+
+    The private key is parsed once, and the RLP encodings of the fields that repeat between transactions (gas price,
+    gas, target address and chain id) are cached, so signing a transaction takes an RLP assembly, one keccak hash
+    and one ECDSA signature. The signature is made with libsecp256k1 through coincurve when it is installed, and
+    with the pure Python backend of eth_keys otherwise.
+
+    Large batches can be signed in a pool of threads, see `sign_batch`. With coincurve, libsecp256k1 runs without
+    the GIL, so the signatures of a batch are computed on several cores. The pool is shared by all the signers with
+    the same number of threads, started on the first large batch, and stopped when the last of them is closed.
+    """
+
+    def __init__(self, private_key, chain_id=None, threads=0, parallel_threshold=DEFAULT_PARALLEL_SIGN_THRESHOLD):
+        """Create a new signer.
+
+        :param str private_key: the wallet private key, hex encoded or bytes.
+
+        :param int chain_id: if set, transactions are signed with EIP-155 replay protection for this chain.
+
+        :param int threads: if positive, batches of at least `parallel_threshold` transactions are signed
+            in a pool of this number of threads.
+
+        :param int parallel_threshold: the minimal batch size signed in the thread pool.
+        """
+        self.private_key_bytes = hexstr_if_str(to_bytes, private_key)
+        self.chain_id = chain_id
+        self.threads = threads
+        self.parallel_threshold = parallel_threshold
+        if coincurve:
+            self._key = coincurve.PrivateKey(self.private_key_bytes)
+        else:
+            self._key = keys.PrivateKey(self.private_key_bytes)
+        self._v_offset = 35 + 2 * chain_id if chain_id else 27
+        self._hash_suffix = _encode_int(chain_id) + _EMPTY_STRING * 2 if chain_id else b''
+        self._int_fields = {}  # integer -> RLP encoding
+        self._address_fields = {}  # address -> RLP encoding
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def sign(self, nonce, gas_price, gas, to, value, data):
+        """Sign a transaction.
+
+        :param int nonce: the transaction nonce.
+
+        :param int gas_price: the gas price in wei.
+
+        :param int gas: the gas limit.
+
+        :param str to: the target address.
+
+        :param int value: the amount of Ether to send, in wei.
+
+        :param bytes data: the transaction data.
+
+        :returns: raw signed transaction, hex encoded
+        :rtype: str
+        """
+        fields = _encode_int(nonce) + self._encode_cached_int(gas_price) + self._encode_cached_int(gas) + \
+            self._encode_address(to) + _encode_int(value) + _encode_bytes(data or b'')
+        msg_hash = keccak(_encode_list(fields + self._hash_suffix))
+        v, r, s = self._sign_hash(msg_hash)
+        raw_tx = _encode_list(fields + _encode_int(v) + _encode_int(r) + _encode_int(s))
+        return '0x' + binascii.hexlify(raw_tx).decode()
+
+    def sign_batch(self, transactions):
+        """Sign many transactions, in the thread pool if it is enabled and the batch is large enough.
+
+        :param list transactions: a list of (nonce, gas price, gas, to, value, data) tuples, see `sign`.
+
+        :returns: raw signed transactions, hex encoded, in the same order.
+        :rtype: list
+        """
+        if not self.threads or len(transactions) < self.parallel_threshold:
+            return [self.sign(*tx) for tx in transactions]
+        chunk_size = max(1, len(transactions) // (self.threads * 4))
+        return self._get_pool().map(self._sign_tx, transactions, chunk_size)
+
+    def close(self):
+        """Release the thread pool. The pool stops once all the signers that use it are closed."""
+        with self._pool_lock:
+            if self._pool:
+                _release_pool(self.threads)
+                self._pool = None
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if not self._pool:
+                self._pool = _acquire_pool(self.threads)
+            return self._pool
+
+    def _sign_tx(self, tx):
+        return self.sign(*tx)
+
+    def _sign_hash(self, msg_hash):
+        """Sign a message hash.
+
+        :returns: the v, r and s values of the signature, with a low s value as required by the network.
+        :rtype: tuple
+        """
+        if coincurve:
+            signature = self._key.sign_recoverable(msg_hash, hasher=None)
+            r = int(binascii.hexlify(signature[:32]), 16)
+            s = int(binascii.hexlify(signature[32:64]), 16)
+            recovery_id = bytearray(signature)[64]
+        else:
+            signature = self._key.sign_msg_hash(msg_hash)
+            r, s, recovery_id = signature.r, signature.s, signature.v
+        if s > SECP256K1_N // 2:
+            s = SECP256K1_N - s
+            recovery_id ^= 1
+        return recovery_id + self._v_offset, r, s
+
+    def _encode_cached_int(self, value):
+        encoded = self._int_fields.get(value)
+        if encoded is None:
+            if len(self._int_fields) >= FIELD_CACHE_SIZE:
+                self._int_fields.clear()
+            encoded = self._int_fields[value] = _encode_int(value)
+        return encoded
+
+    def _encode_address(self, address):
+        encoded = self._address_fields.get(address)
+        if encoded is None:
+            if len(self._address_fields) >= FIELD_CACHE_SIZE:
+                self._address_fields.clear()
+            encoded = _encode_bytes(hexstr_if_str(to_bytes, address)) if address else _EMPTY_STRING
+            self._address_fields[address] = encoded
+        return encoded
+
+
+# the signing thread pools, shared by the signers with the same number of threads: threads -> [pool, signers].
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _acquire_pool(threads):
+    with _pools_lock:
+        entry = _pools.get(threads)
+        if entry is None:
+            entry = _pools[threads] = [ThreadPool(threads), 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def _release_pool(threads):
+    with _pools_lock:
+        entry = _pools[threads]
+        entry[1] -= 1
+        if not entry[1]:
+            del _pools[threads]
+            entry[0].close()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from itertools import count
+import threading
+
+
+class Subscription(object):
+    """A transaction monitoring subscription."""
+
+    def __init__(self, subscription_id, kind, callback_fn, from_address=None, to_address=None, mined=True,
+                 checkpoint_store=None, checkpoint_key=None):
+        self.id = subscription_id
+        self.kind = kind
+        self.callback_fn = callback_fn
+        self.from_address = from_address.lower() if from_address else None
+        self.to_address = to_address.lower() if to_address else None
+        self.mined = mined
+        self.filter_params = None  # the log filter of the subscription, if any
+        self.log_callback_fn = None
+        self.use_logs = False
+        self.confirmation_fn = None  # called back when mined transactions reach the confirmation depths
+        self.confirmations = ()
+        self.checkpoint_store = checkpoint_store
+        self.checkpoint_key = checkpoint_key
+        self.checkpoint = None  # the last fully processed block
+
+    def matches(self, from_address, to_address):
+        """Check whether a transaction matches the subscription, see :class:`SubscriptionRegistry`."""
+        if self.to_address:
+            return bool(to_address) and to_address.lower() == self.to_address
+        return bool(from_address) and from_address.lower() == self.from_address
+
+
+class SubscriptionRegistry(object):
+    """SubscriptionRegistry indexes monitoring subscriptions by address, so that every transaction is matched with
+    a couple of hash lookups instead of being checked against every subscription.
+
+    A subscription has a kind ('ether' or 'token'), and a sender address, a recipient address or both. A subscription
+    with a recipient address is indexed by the recipient and matches transactions to that address. A subscription
+    with a sender address only is indexed by the sender and matches transactions from that address.
+    Subscriptions with `mined=False` only receive pending transactions. Subscriptions with a checkpoint store
+    are also listed separately, as mined transactions are delivered to them block by block.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}  # subscription id -> subscription
+        self._by_to = {}  # (kind, address) -> {subscription id -> subscription}
+        self._by_from = {}  # (kind, address) -> {subscription id -> subscription}
+        self._counts = {}  # (kind, mined) -> number of subscriptions
+        self._checkpointed = {}  # subscription id -> subscription with a checkpoint store
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def add(self, kind, callback_fn, from_address=None, to_address=None, mined=True, checkpoint_store=None,
+            checkpoint_key=None):
+        """Add a subscription.
+
+        :param str kind: 'ether' or 'token'.
+
+        :param callback_fn: the function to call back on matching transactions.
+
+        :param str from_address: the sender address to match.
+
+        :param str to_address: the recipient address to match.
+
+        :param bool mined: whether the subscription also receives mined transactions, or only pending ones.
+
+        :param checkpoint_store: the store of the last processed block of the subscription, if any.
+        :type checkpoint_store: :class:`~erc20token.checkpoint.CheckpointStore`
+
+        :param str checkpoint_key: the key of the subscription in the checkpoint store.
+
+        :returns: the new subscription
+        :rtype: :class:`~erc20token.subscriptions.Subscription`
+        """
+        if not from_address and not to_address:
+            raise ValueError('either from_address or to_address or both must be provided')
+        with self._lock:
+            subscription = Subscription(next(self._ids), kind, callback_fn, from_address, to_address, mined,
+                                        checkpoint_store, checkpoint_key)
+            index, key = self._get_index_key(subscription)
+            index.setdefault(key, {})[subscription.id] = subscription
+            self._subscriptions[subscription.id] = subscription
+            if checkpoint_store:
+                self._checkpointed[subscription.id] = subscription
+            self._counts[(kind, mined)] = self._counts.get((kind, mined), 0) + 1
+        return subscription
+
+    def remove(self, subscription_id):
+        """Remove a subscription.
+
+        :param int subscription_id: the subscription id.
+
+        :returns: the removed subscription, or None if there is no such subscription.
+        :rtype: :class:`~erc20token.subscriptions.Subscription`
+        """
+        with self._lock:
+            subscription = self._subscriptions.pop(subscription_id, None)
+            if not subscription:
+                return None
+            index, key = self._get_index_key(subscription)
+            subscribers = index[key]
+            del subscribers[subscription.id]
+            if not subscribers:
+                del index[key]
+            self._counts[(subscription.kind, subscription.mined)] -= 1
+            self._checkpointed.pop(subscription.id, None)
+        return subscription
+
+    def get(self, subscription_id):
+        """Get a subscription by id, or None if there is no such subscription."""
+        with self._lock:
+            return self._subscriptions.get(subscription_id)
+
+    def get_checkpointed(self):
+        """Get the subscriptions with a checkpoint store.
+
+        :rtype: list
+        """
+        with self._lock:
+            return list(self._checkpointed.values())
+
+    def has_subscriptions(self, kind, mined=False):
+        """Check whether there are subscriptions of the given kind.
+
+        :param str kind: 'ether' or 'token'.
+
+        :param bool mined: if True, only count subscriptions that receive mined transactions.
+        """
+        with self._lock:
+            return self._counts.get((kind, True), 0) > 0 or (not mined and self._counts.get((kind, False), 0) > 0)
+
+    def match(self, kind, from_address, to_address, mined=False):
+        """Find the subscriptions matching a transaction.
+
+        :param str kind: 'ether' or 'token'.
+
+        :param str from_address: the transaction sender.
+
+        :param str to_address: the transaction recipient.
+
+        :param bool mined: whether the transaction is mined.
+
+        :returns: the matching subscriptions
+        :rtype: list
+        """
+        matches = []
+        with self._lock:
+            if to_address:
+                matches.extend(self._by_to.get((kind, to_address.lower()), {}).values())
+            if from_address:
+                matches.extend(self._by_from.get((kind, from_address.lower()), {}).values())
+        if mined:
+            matches = [subscription for subscription in matches if subscription.mined]
+        return matches
+
+    def _get_index_key(self, subscription):
+        if subscription.to_address:
+            return self._by_to, (subscription.kind, subscription.to_address)
+        return self._by_from, (subscription.kind, subscription.from_address)
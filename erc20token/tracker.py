@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+import threading
+from time import time
+
+from web3.middleware.pythonic import receipt_formatter
+
+from .provider import batch_request
+
+import logging
+logger = logging.getLogger(__name__)
+
+# default gas price bump of a stuck transaction. Nodes accept a replacement transaction only if it pays at least
+# 10% more for gas than the transaction it replaces.
+DEFAULT_GAS_BUMP_FACTOR = 1.125
+MIN_GAS_BUMP_FACTOR = 1.1
+
+# default number of blocks after which a transaction that is not mined stops being tracked, as it was probably
+# dropped by the nodes (about an hour with 15 seconds blocks).
+DEFAULT_EXPIRE_BLOCKS = 240
+
+
+class TransactionFuture(object):
+    """TransactionFuture is the outcome of a submitted transaction, resolved when the transaction is mined.
+
+    If the transaction is rebroadcast with a higher gas price, `tx_id` is the id of the latest broadcast,
+    and `tx_ids` has the ids of all the broadcasts. The future resolves when any of them is mined.
+    A transaction that stops being tracked before it is mined, because it expired or was untracked, cancels its
+    future: the future is done, without a status.
+    """
+
+    def __init__(self, tx_id):
+        self.tx_id = tx_id
+        self.tx_ids = [tx_id]
+        self.status = None  # TransactionStatus.SUCCESS or FAIL, once mined
+        self.receipt = None
+        self.bumps = 0  # the number of rebroadcasts with a higher gas price
+        self.blocks_pending = 0  # new blocks since the last broadcast
+        self.blocks = 0  # new blocks since the transaction is tracked
+        self.created_at = time()
+        self._cancelled = False
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'TransactionFuture({}, status={})'.format(self.tx_id, self.status)
+
+    def done(self):
+        """Whether the transaction is mined, or the future is cancelled."""
+        return self._event.is_set()
+
+    def cancelled(self):
+        """Whether the transaction stopped being tracked before it was mined."""
+        return self._cancelled
+
+    def result(self, timeout=None):
+        """Wait for the transaction to be mined.
+
+        :param number timeout: the maximal number of seconds to wait, forever if None.
+
+        :returns: the transaction status, SUCCESS or FAIL, or None if the transaction was not mined in time or
+            the future is cancelled.
+        :rtype: :class:`~erc20token.TransactionStatus`
+        """
+        self._event.wait(timeout)
+        return self.status
+
+    def add_done_callback(self, fn):
+        """Call a function with the future when the transaction is mined or the future is cancelled, or at once
+        if it is done already.
+        Callbacks run in the block polling thread, and should return quickly.
+
+        :param fn: the function to call with the future.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        self._run_callback(fn)
+
+    def _resolve(self, status, receipt, cancelled=False):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.status = status
+            self.receipt = receipt
+            self._cancelled = cancelled
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._run_callback(fn)
+
+    def _run_callback(self, fn):
+        try:
+            fn(self)
+        except Exception as e:
+            logger.exception(e)
+
+
+class TransactionTracker(object):
+    """TransactionTracker follows submitted transactions until they are mined.
+
+    On every new block (see `on_new_block`), the receipts of all the transactions in flight are fetched in
+    JSON-RPC batches, and the futures of the mined transactions are resolved. A transaction that is not mined
+    for `bump_blocks` blocks is signed again with the same nonce and a gas price higher by `bump_factor`,
+    and rebroadcast, so that it replaces the stuck transaction. A transaction that is not mined for `expire_blocks`
+    blocks stops being tracked, and its future is cancelled.
+    """
+
+    def __init__(self, web3, status_fn, managers=None, batch_size=100, bump_blocks=0,
+                 bump_factor=DEFAULT_GAS_BUMP_FACTOR, max_gas_price=None, expire_blocks=DEFAULT_EXPIRE_BLOCKS):
+        """Create a new tracker.
+
+        :param web3: the web3 instance.
+
+        :param status_fn: returns the status of a mined transaction, called with the transaction and its receipt.
+
+        :param dict managers: sender address (lowercase) -> the `TransactionManager` that signs its transactions.
+            Only transactions of these senders are rebroadcast.
+
+        :param int batch_size: the maximal number of JSON-RPC calls in a single batch.
+
+        :param int bump_blocks: the number of blocks after which a transaction that is not mined is rebroadcast
+            with a higher gas price. If 0, transactions are never rebroadcast.
+
+        :param float bump_factor: the gas price multiplier of a rebroadcast, at least 1.1.
+
+        :param int max_gas_price: the maximal gas price of a rebroadcast in wei, unlimited if None.
+
+        :param int expire_blocks: the number of blocks after which a transaction that is not mined stops being
+            tracked. If 0, transactions are tracked until they are mined or untracked.
+        """
+        if bump_factor < MIN_GAS_BUMP_FACTOR:
+            raise ValueError('gas bump factor must be at least {}'.format(MIN_GAS_BUMP_FACTOR))
+        self.web3 = web3
+        self.status_fn = status_fn
+        self.managers = managers or {}
+        self.batch_size = batch_size
+        self.bump_blocks = bump_blocks
+        self.bump_factor = bump_factor
+        self.max_gas_price = max_gas_price
+        self.expire_blocks = expire_blocks
+        self.tracked = 0
+        self.mined = 0
+        self.bumped = 0
+        self.expired = 0
+        self.polls = 0
+        self._in_flight = {}  # future id -> future
+        self._by_tx_id = {}  # tx id (lowercase) of every broadcast -> future
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+
+    def track(self, tx_id):
+        """Start tracking a transaction.
+
+        :param str tx_id: transaction id (hash).
+
+        :returns: the future of the transaction. A transaction that is tracked already keeps its future.
+        :rtype: :class:`TransactionFuture`
+        """
+        with self._lock:
+            future = self._by_tx_id.get(tx_id.lower())
+            if future is None:
+                future = TransactionFuture(tx_id)
+                self._by_tx_id[tx_id.lower()] = future
+                self._in_flight[id(future)] = future
+                self.tracked += 1
+            return future
+
+    def get_future(self, tx_id):
+        """Get the future of a tracked transaction.
+
+        :param str tx_id: the id of any broadcast of the transaction.
+
+        :returns: the future, or None if the transaction is not tracked.
+        :rtype: :class:`TransactionFuture`
+        """
+        with self._lock:
+            return self._by_tx_id.get(tx_id.lower())
+
+    def untrack(self, tx_id):
+        """Stop tracking a transaction, and cancel its future.
+
+        :param str tx_id: the id of any broadcast of the transaction.
+
+        :returns: whether the transaction was tracked.
+        :rtype: bool
+        """
+        with self._lock:
+            future = self._by_tx_id.get(tx_id.lower())
+            if future is None:
+                return False
+            self._remove(future)
+        future._resolve(None, None, cancelled=True)
+        return True
+
+    def on_new_block(self, block_hash):
+        """New block filter callback: poll the transactions in flight.
+
+        :param str block_hash: the hash of the new block.
+        """
+        if self._in_flight:
+            self.poll()
+
+    def poll(self, new_block=True):
+        """Fetch the receipts of all the transactions in flight, resolve the mined ones, and rebroadcast
+        the stuck ones.
+
+        :param bool new_block: whether a new block arrived since the last poll. Stuck transactions are counted
+            in blocks, so only new block polls count.
+        """
+        with self._poll_lock:
+            with self._lock:
+                futures = list(self._in_flight.values())
+            if not futures:
+                return
+            self.polls += 1
+
+            calls = []
+            owners = []
+            for future in futures:
+                for tx_id in future.tx_ids:
+                    calls.append(('eth_getTransactionReceipt', [tx_id]))
+                    owners.append(future)
+            mined = {}
+            for future, response in zip(owners, batch_request(self.web3.providers[0], calls, self.batch_size)):
+                if 'error' in response:
+                    logger.warning('cannot get transaction receipt: {}'.format(response['error']))
+                elif response.get('result') and response['result'].get('blockNumber'):
+                    mined[id(future)] = receipt_formatter(response['result'])
+
+            for future in futures:
+                receipt = mined.get(id(future))
+                if receipt:
+                    self._resolve(future, receipt)
+                elif new_block:
+                    future.blocks += 1
+                    future.blocks_pending += 1
+                    if self.expire_blocks and future.blocks >= self.expire_blocks:
+                        self._expire(future)
+                    elif self.bump_blocks and future.blocks_pending >= self.bump_blocks:
+                        self._bump(future)
+
+    def wait(self, futures, timeout=None):
+        """Wait for transactions to be mined.
+
+        :param list futures: the futures to wait for.
+
+        :param number timeout: the maximal number of seconds to wait for all the transactions, forever if None.
+
+        :returns: whether all the transactions were mined. A cancelled future counts as not mined.
+        :rtype: bool
+        """
+        deadline = time() + timeout if timeout is not None else None
+        all_mined = True
+        for future in futures:
+            remaining = max(0, deadline - time()) if deadline is not None else None
+            if future.result(remaining) is None:
+                all_mined = False
+        return all_mined
+
+    def stats(self):
+        """Get the tracker counters.
+
+        :returns: the number of transactions in flight, tracked, mined, rebroadcast with a higher gas price and
+            expired, and the number of receipt polls.
+        :rtype: dict
+        """
+        with self._lock:
+            return {'in_flight': len(self._in_flight), 'tracked': self.tracked, 'mined': self.mined,
+                    'bumped': self.bumped, 'expired': self.expired, 'polls': self.polls}
+
+    def _remove(self, future):
+        """Stop tracking a future, must be called with the lock held."""
+        self._in_flight.pop(id(future), None)
+        for tx_id in future.tx_ids:
+            self._by_tx_id.pop(tx_id.lower(), None)
+
+    def _resolve(self, future, receipt):
+        status = self.status_fn(self._get_tx_for_status(receipt), receipt)
+        with self._lock:
+            self._remove(future)
+            self.mined += 1
+        future._resolve(status, receipt)
+
+    def _expire(self, future):
+        logger.warning('transaction {} was not mined in {} blocks, no longer tracking it'.format(
+            future.tx_id, future.blocks))
+        with self._lock:
+            self._remove(future)
+            self.expired += 1
+        future._resolve(None, None, cancelled=True)
+
+    def _get_tx_for_status(self, receipt):
+        """The transaction is needed for the status only before the Byzantium fork, when receipts had no status."""
+        if receipt.get('status') is not None:
+            return {}
+        return self.web3.eth.getTransaction(receipt['transactionHash']) or {}
+
+    def _bump(self, future):
+        """Rebroadcast a stuck transaction with the same nonce and a higher gas price."""
+        future.blocks_pending = 0
+        tx = self.web3.eth.getTransaction(future.tx_id)
+        if not tx:
+            logger.warning('cannot rebroadcast transaction {}: not found'.format(future.tx_id))
+            return
+        if tx.get('blockNumber'):  # mined since the receipt poll
+            return
+        manager = self.managers.get(tx['from'].lower())
+        if not manager:
+            return
+        gas_price = max(int(tx['gasPrice'] * self.bump_factor), tx['gasPrice'] + 1)
+        if self.max_gas_price:
+            gas_price = min(gas_price, self.max_gas_price)
+            if gas_price < tx['gasPrice'] * MIN_GAS_BUMP_FACTOR:  # the node would reject the replacement
+                return
+        try:
+            tx_id = manager.replace_transaction(tx, gas_price)
+        except ValueError as ve:
+            logger.warning('cannot rebroadcast transaction {}: {}'.format(future.tx_id, ve))
+            return
+        if not tx_id:  # the nonce was used, one of the broadcasts was mined
+            return
+        logger.info('rebroadcast transaction {} as {} with gas price {}'.format(future.tx_id, tx_id, gas_price))
+        with self._lock:
+            if id(future) not in self._in_flight:  # untracked meanwhile
+                return
+            future.tx_ids.append(tx_id)
+            future.tx_id = tx_id
+            future.bumps += 1
+            self._by_tx_id[tx_id.lower()] = future
+            self.bumped += 1
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*
+
+# Copyright (C) 2017 Kin Foundation
+
+from array import array
+from binascii import hexlify, unhexlify
+
+_HASH_SIZE = 32
+_ADDRESS_SIZE = 20
+
+
+class TransferBatch(object):
+    """TransferBatch is a compact columnar container of token transfers.
+
+    Transaction hashes and addresses are kept as fixed-width binary values in contiguous buffers, amounts as integers
+    in wei, and block numbers and log indexes in integer arrays, so that millions of transfers take a fraction of the
+    memory of transfer objects. Transfers can be filtered by address without decoding them.
+    """
+
+    __slots__ = ('_tx_hashes', '_from', '_to', 'amounts', 'block_numbers', 'log_indexes')
+
+    def __init__(self):
+        self._tx_hashes = bytearray()
+        self._from = bytearray()
+        self._to = bytearray()
+        self.amounts = []  # in wei
+        self.block_numbers = array('L')
+        self.log_indexes = array('L')
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def __getitem__(self, index):
+        """Get a transfer.
+
+        :returns: transaction id (hash), from address, to address, amount in wei, block number, log index.
+            Addresses are lowercase hex strings.
+        :rtype: tuple
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('transfer index out of range')
+        return (self._get_hex(self._tx_hashes, index, _HASH_SIZE),
+                self._get_hex(self._from, index, _ADDRESS_SIZE),
+                self._get_hex(self._to, index, _ADDRESS_SIZE),
+                self.amounts[index],
+                self.block_numbers[index],
+                self.log_indexes[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, tx_id, from_address, to_address, amount, block_number, log_index):
+        """Add a transfer.
+
+        :param str tx_id: the transaction id (hash), a 0x-prefixed hex string.
+
+        :param str from_address: the sender address.
+
+        :param str to_address: the recipient address.
+
+        :param int amount: the amount in wei.
+
+        :param int block_number: the block number.
+
+        :param int log_index: the log index in the block.
+        """
+        self._tx_hashes += unhexlify(tx_id[2:])
+        self._from += unhexlify(from_address[2:])
+        self._to += unhexlify(to_address[2:])
+        self.amounts.append(amount)
+        self.block_numbers.append(block_number or 0)
+        self.log_indexes.append(log_index or 0)
+
+    @property
+    def tx_ids(self):
+        """The transaction ids, as hex strings."""
+        return [self._get_hex(self._tx_hashes, index, _HASH_SIZE) for index in range(len(self))]
+
+    @property
+    def from_addresses(self):
+        """The sender addresses, as lowercase hex strings."""
+        return [self._get_hex(self._from, index, _ADDRESS_SIZE) for index in range(len(self))]
+
+    @property
+    def to_addresses(self):
+        """The recipient addresses, as lowercase hex strings."""
+        return [self._get_hex(self._to, index, _ADDRESS_SIZE) for index in range(len(self))]
+
+    def total_amount(self):
+        """Get the sum of the amounts in wei."""
+        return sum(self.amounts)
+
+    def find(self, from_address=None, to_address=None):
+        """Find the transfers from and/or to an address.
+
+        :param str from_address: if provided, only transfers from this address match.
+
+        :param str to_address: if provided, only transfers to this address match.
+
+        :returns: the indexes of the matching transfers, in order.
+        :rtype: list
+        """
+        indexes = None
+        if from_address:
+            indexes = self._find_address(self._from, from_address)
+        if to_address:
+            to_indexes = self._find_address(self._to, to_address)
+            indexes = to_indexes if indexes is None else sorted(set(indexes) & set(to_indexes))
+        return list(range(len(self))) if indexes is None else indexes
+
+    def select(self, indexes):
+        """Get a batch of some of the transfers.
+
+        :param list indexes: the indexes of the transfers, see `find`.
+
+        :rtype: :class:`~erc20token.TransferBatch`
+        """
+        batch = TransferBatch()
+        for index in indexes:
+            batch._tx_hashes += self._tx_hashes[index * _HASH_SIZE:(index + 1) * _HASH_SIZE]
+            batch._from += self._from[index * _ADDRESS_SIZE:(index + 1) * _ADDRESS_SIZE]
+            batch._to += self._to[index * _ADDRESS_SIZE:(index + 1) * _ADDRESS_SIZE]
+            batch.amounts.append(self.amounts[index])
+            batch.block_numbers.append(self.block_numbers[index])
+            batch.log_indexes.append(self.log_indexes[index])
+        return batch
+
+    def filter(self, from_address=None, to_address=None):
+        """Get a batch of the transfers from and/or to an address, see `find`.
+
+        :rtype: :class:`~erc20token.TransferBatch`
+        """
+        return self.select(self.find(from_address, to_address))
+
+    @staticmethod
+    def _get_hex(buf, index, size):
+        return '0x' + hexlify(bytes(buf[index * size:(index + 1) * size])).decode()
+
+    @staticmethod
+    def _find_address(buf, address):
+        """Find the aligned occurrences of an address in an address buffer."""
+        needle = bytes(unhexlify(address[2:].lower()))
+        indexes = []
+        pos = buf.find(needle)
+        while pos >= 0:
+            if pos % _ADDRESS_SIZE == 0:
+                indexes.append(pos // _ADDRESS_SIZE)
+                pos = buf.find(needle, pos + _ADDRESS_SIZE)
+            else:
+                pos = buf.find(needle, pos + 1)
+        return indexes
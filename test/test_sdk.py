@@ -1,11 +1,12 @@
 
+import binascii
 from decimal import Decimal
 import json
 import os
 import pytest
 import sys
 import threading
-from time import sleep
+from time import sleep, time
 
 import erc20token
 
@@ -106,6 +107,73 @@ def test_create_invalid_gas_params(testnet):
                        contract_abi=testnet.contract_abi, gas_price=10, gas_limit='bad')
 
 
+def test_create_invalid_batch_size(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='batch size must be a positive integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, batch_size=0)
+    with pytest.raises(erc20token.SdkConfigurationError, match='batch size must be a positive integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, batch_size='bad')
+
+
+def test_create_invalid_gas_cache_ttl(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='gas cache ttl must be either integer or float'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, gas_cache_ttl='bad')
+
+
+def test_create_invalid_tx_cache_params(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='transaction cache size must be a non-negative integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, tx_cache_size=-1)
+    with pytest.raises(erc20token.SdkConfigurationError,
+                       match='transaction cache confirmations must be a positive integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, tx_cache_size=10, tx_cache_confirmations=0)
+
+
+def test_create_invalid_head_params(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='head staleness must be a non-negative number'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, head_staleness=-1)
+    with pytest.raises(erc20token.SdkConfigurationError, match='head poll interval must be either integer or float'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, head_poll_interval='bad')
+    with pytest.raises(erc20token.SdkConfigurationError, match='block time must be a positive number'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, block_time=0)
+
+
+def test_create_invalid_callback_params(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='callback workers must be a non-negative integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, callback_workers=-1)
+    with pytest.raises(erc20token.SdkConfigurationError, match='callback queue size must be a positive integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, callback_queue_size=0)
+    with pytest.raises(erc20token.SdkConfigurationError, match='callback policy must be one of'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, callback_policy='bad')
+
+
+def test_create_invalid_hedge_params(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='hedge percentile must be a number between 0 and 100'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, hedge_percentile=100)
+    with pytest.raises(erc20token.SdkConfigurationError, match='hedge budget must be a number between 0 and 1'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, hedge_percentile=95, hedge_budget=2)
+
+
+def test_create_invalid_nonce_params(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='nonce sync interval must be a non-negative number'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, nonce_sync_interval=-1)
+    with pytest.raises(erc20token.SdkConfigurationError, match='nonce sync interval must be a non-negative number'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                       contract_abi=testnet.contract_abi, nonce_sync_interval='bad')
+
+
 def test_create_fail_bad_endpoint(testnet):
     with pytest.raises(erc20token.SdkConfigurationError, match='cannot connect to provider endpoint'):
         erc20token.SDK(provider_endpoint_uri='bad', contract_address=testnet.address, contract_abi=testnet.contract_abi)
@@ -196,6 +264,21 @@ def test_create_with_gas_params(testnet):
     assert sdk._tx_manager.gas_limit == 10000
 
 
+def test_create_lazy(testnet):
+    # no requests are made during initialization, so a bad endpoint only fails on first use.
+    sdk = erc20token.SDK(provider_endpoint_uri='http://localhost:60000', private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi, lazy=True)
+    assert sdk.get_address() == testnet.address
+    with pytest.raises(Exception):
+        sdk.get_token_balance()
+
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi, lazy=True)
+    assert sdk._tx_manager.gas_price == sdk.web3.eth.gasPrice
+    assert sdk._tx_manager.local_nonce == sdk.web3.eth.getTransactionCount(testnet.address)
+    assert sdk.get_token_balance() > 0
+
+
 @pytest.fixture(scope='session')
 def test_sdk(testnet):
     sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
@@ -237,6 +320,24 @@ def test_get_address_token_balance(test_sdk, testnet):
     assert balance > 0
 
 
+def test_get_address_balances(test_sdk, testnet):
+    with pytest.raises(ValueError, match="'0xBAD' is not an address"):
+        test_sdk.get_address_ether_balances([testnet.address, '0xBAD'])
+    with pytest.raises(ValueError, match="'0xBAD' is not an address"):
+        test_sdk.get_address_token_balances([testnet.address, '0xBAD'])
+    assert test_sdk.get_address_ether_balances([]) == []
+    assert test_sdk.get_address_token_balances([]) == []
+
+    # more addresses than fit in a single batch
+    addresses = [testnet.address] * (test_sdk.batch_size + 1)
+    balances = test_sdk.get_address_ether_balances(addresses)
+    assert len(balances) == len(addresses)
+    assert balances[0] == balances[-1] == test_sdk.get_address_ether_balance(testnet.address)
+    balances = test_sdk.get_address_token_balances(addresses)
+    assert len(balances) == len(addresses)
+    assert balances[0] == balances[-1] == test_sdk.get_address_token_balance(testnet.address)
+
+
 def test_get_token_total_supply(test_sdk, testnet):
     total_supply = test_sdk.get_token_total_supply()
     if testnet.type == 'testrpc':
@@ -245,6 +346,181 @@ def test_get_token_total_supply(test_sdk, testnet):
         assert total_supply > 1000000000
 
 
+def test_get_metrics(testnet):
+    from erc20token.metrics import format_prometheus
+    from erc20token.provider import RetryHTTPProvider
+
+    calls = []
+    provider = RetryHTTPProvider(testnet.provider_endpoint_uri)
+    provider.add_request_hook(pre_fn=lambda method, params: calls.append(method))
+    sdk = erc20token.SDK(provider=provider, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi)
+    sdk.get_token_balance()
+    sdk.get_address_token_balances([testnet.address])
+    with pytest.raises(ValueError):
+        sdk.get_address_token_balance('0xbad')
+    with pytest.raises(ValueError):
+        sdk.send_ether(testnet.address, 0)
+    assert 'eth_call' in calls
+
+    metrics = sdk.get_metrics()
+    assert metrics['rpc']['eth_call']['calls'] >= 1
+    assert metrics['rpc']['eth_call']['request_bytes'] > 0
+    assert metrics['rpc']['eth_call']['latency']['count'] == metrics['rpc']['eth_call']['calls']
+    assert metrics['rpc']['batch']['calls'] == 1
+    assert metrics['sdk']['get_token_balance']['calls'] == 1
+    assert metrics['sdk']['get_address_token_balance']['errors'] == {'ValueError': 1}
+    assert metrics['sdk']['send_ether']['errors'] == {'ValueError': 1}
+    assert metrics['callbacks'] is None
+    assert metrics['monitor'] == {}
+
+    text = format_prometheus(metrics)
+    assert 'erc20token_rpc_calls_total{method="eth_call"}' in text
+    assert 'erc20token_sdk_latency_seconds_bucket{method="get_token_balance",le="+Inf"} 1' in text
+
+
+def test_pool_provider(testnet):
+    from erc20token.pool import PoolProvider
+
+    provider = PoolProvider(['http://localhost:60000', testnet.provider_endpoint_uri], health_check_interval=0)
+    sdk = erc20token.SDK(provider=provider, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi)
+    assert sdk.get_token_balance() > 0
+    assert sdk.get_token_balance() > 0
+    bad, good = provider.get_endpoint_stats()
+    assert bad['errors'] == 1  # failed over once, then ranked behind the healthy endpoint
+    assert good['requests'] > 1 and good['errors'] == 0
+    assert sdk.get_metrics()['rpc']['web3_clientVersion']['retries'] == 1
+
+    provider.check_health()
+    bad, good = provider.get_endpoint_stats()
+    assert bad['ejected']
+    assert good['block_number'] > 0 and not good['lagging']
+
+    sdk = erc20token.SDK(provider_endpoint_uri=[testnet.provider_endpoint_uri], private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi)
+    assert sdk.get_token_balance() > 0
+    assert len(sdk.get_metrics()['endpoints']) == 1
+
+
+def test_pool_provider_ejection():
+    import requests
+    from erc20token.pool import PoolProvider
+
+    provider = PoolProvider(['http://a', 'http://b'], health_check_interval=0, eject_time=0.2, max_block_lag=3)
+    block_numbers = {'http://a': None, 'http://b': 16}  # None: the endpoint is down
+    posts = []
+
+    def post(endpoint, request_data, timeout=None):
+        posts.append(endpoint.uri)
+        if block_numbers[endpoint.uri] is None:
+            raise requests.exceptions.ConnectionError('{} is down'.format(endpoint.uri))
+        return json.dumps({'jsonrpc': '2.0', 'id': 0, 'result': hex(block_numbers[endpoint.uri])}).encode()
+    provider._post = post
+
+    assert provider.retriable_post_request(b'{}', method='eth_call')  # failed over to b
+    a, b = provider.get_endpoint_stats()
+    assert a['errors'] == 1 and not a['ejected']  # a single error is below the maximal error rate
+    assert [endpoint.uri for endpoint in provider._route(False)] == ['http://b', 'http://a']
+
+    provider.check_health()
+    a, b = provider.get_endpoint_stats()
+    assert a['errors'] == 2 and a['ejected']
+    assert b['block_number'] == 16 and not b['ejected']
+
+    # an ejected endpoint is probed again only after the eject time
+    block_numbers['http://a'] = 10
+    provider.check_health()
+    assert provider.get_endpoint_stats()[0]['ejected']
+    sleep(0.3)
+    assert provider.get_endpoint_stats()[0]['ejected']  # not used again before a probe succeeds
+    provider.check_health()
+    a, b = provider.get_endpoint_stats()
+    assert not a['ejected'] and a['error_rate'] == 0
+    assert a['block_number'] == 10 and a['lagging']  # more than 3 blocks behind b
+    assert [endpoint.uri for endpoint in provider._route(False)] == ['http://b', 'http://a']
+
+    # when all the endpoints fail, the whole route is retried with backoff
+    block_numbers['http://a'] = block_numbers['http://b'] = None
+    del posts[:]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        provider.retriable_post_request(b'{}', method='eth_call')
+    assert len(posts) == 4 * 2
+    assert all(stats['ejected'] for stats in provider.get_endpoint_stats())
+    provider.stop()
+
+
+def test_hedged_reads(testnet):
+    from erc20token.hedging import HEDGE_MIN_SAMPLES
+
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.contract_address,
+                         contract_abi=testnet.contract_abi, hedge_percentile=50, hedge_budget=1)
+    for _ in range(HEDGE_MIN_SAMPLES * 2):
+        assert sdk.get_address_token_balance(testnet.address) > 0
+    stats = sdk.get_metrics()['hedging']
+    assert 'eth_call' in stats['delays']
+    assert stats['hedged'] <= stats['requests']
+    assert stats['hedge_wins'] <= stats['hedged']
+
+
+def test_hedger_budget():
+    from erc20token.hedging import Hedger, HEDGE_MIN_SAMPLES
+
+    hedger = Hedger(50, budget=0.1)
+    for _ in range(HEDGE_MIN_SAMPLES):  # fast samples, the hedge delay is close to 0
+        assert hedger.request('eth_call', lambda attempt: attempt) == 0
+    assert hedger.stats()['hedged'] == 0
+
+    def slow(attempt):
+        if attempt == 0:
+            sleep(0.1)
+        return attempt
+
+    # the saved budget (1 + 20 * 0.1 tokens) pays for the first hedges, then every 10th request is hedged.
+    # the faster answer of a hedge is returned without waiting for the slow original request
+    answers = [hedger.request('eth_call', slow) for _ in range(HEDGE_MIN_SAMPLES - 1)]
+    stats = hedger.stats()
+    assert stats['requests'] == HEDGE_MIN_SAMPLES * 2 - 1
+    assert 3 <= stats['hedged'] <= 5
+    assert stats['hedged'] + stats['budget_exhausted'] == HEDGE_MIN_SAMPLES - 1
+    assert answers.count(1) == stats['hedge_wins'] == stats['hedged']
+    assert answers.count(0) == stats['budget_exhausted']
+
+    hedger = Hedger(50, budget=1)
+    for _ in range(HEDGE_MIN_SAMPLES):
+        hedger.request('eth_call', lambda attempt: attempt)
+
+    def stuck(attempt):
+        if attempt == 0:
+            sleep(1)
+        return attempt
+    start = time()
+    assert hedger.request('eth_call', stuck) == 1
+    assert time() - start < 0.5
+
+    # a hedge that answers after the original request is not a win
+    def slow_hedge(attempt):
+        if attempt == 1:
+            sleep(0.1)
+        return attempt
+    assert hedger.request('eth_call', slow_hedge) == 0
+    assert hedger.stats()['hedge_wins'] == 1
+
+    # the answer of the hedge is used when the original request fails
+    def failing(attempt):
+        if attempt == 0:
+            sleep(0.05)
+            raise ValueError('original failed')
+        return attempt
+    assert hedger.request('eth_call', failing) == 1
+
+    def all_failing(attempt):
+        sleep(0.05 * (1 - attempt))
+        raise ValueError(attempt)
+    with pytest.raises(ValueError, match='0'):
+        hedger.request('eth_call', all_failing)
+
+
 def test_send_ether_fail(test_sdk, testnet):
     with pytest.raises(ValueError, match='amount must be positive'):
         test_sdk.send_ether(testnet.address, 0)
@@ -258,6 +534,420 @@ def test_send_ether_fail(test_sdk, testnet):
         test_sdk.send_ether(testnet.address, 100)
 
 
+def test_send_pipelined(testnet):
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                         pipelined_nonce=True, nonce_sync_interval=0)
+    start_nonce = sdk._tx_manager.local_nonce
+    assert start_nonce == sdk.web3.eth.getTransactionCount(testnet.address, 'pending')
+
+    # a failed submission must not leave a gap in the nonce sequence
+    with pytest.raises(ValueError):
+        sdk.send_ether(testnet.address, 100)
+    assert sdk._tx_manager.local_nonce == start_nonce
+
+    tx_ids = []
+    threads = [threading.Thread(target=lambda: tx_ids.append(sdk.send_tokens(testnet.address, 1))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(tx_ids)) == 4
+    assert sdk._tx_manager.local_nonce == start_nonce + 4
+    nonces = set(sdk.web3.eth.getTransaction(tx_id)['nonce'] for tx_id in tx_ids)
+    assert nonces == set(range(start_nonce, start_nonce + 4))
+
+
+def test_sender_pool(testnet):
+    sender_keys = ['0x' + 'a1' * 32, '0x' + 'b2' * 32]
+    with pytest.raises(erc20token.SdkConfigurationError, match='sender wallets need a funding wallet'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.contract_address,
+                       contract_abi=testnet.contract_abi, sender_private_keys=sender_keys)
+    with pytest.raises(erc20token.SdkConfigurationError, match='sender policy must be one of'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                       contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                       sender_private_keys=sender_keys, sender_policy='random')
+
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                         sender_private_keys=sender_keys, sender_policy='round_robin')
+    senders = sdk.get_sender_addresses()
+    assert len(senders) == 2 and testnet.address not in senders
+
+    report = sdk.top_up_senders(min_ether=Decimal('0.01'), target_ether=Decimal('0.02'), min_tokens=10,
+                                target_tokens=20)
+    for address, kind, amount, tx_id in report:
+        assert address in senders and kind in ('ether', 'token') and amount > 0
+        assert not isinstance(tx_id, ValueError)
+    if testnet.type == 'ropsten':
+        sleep(30)  # wait for the top-ups to be mined
+    assert not sdk.top_up_senders(min_ether=Decimal('0.01'), target_ether=Decimal('0.02'), min_tokens=10,
+                                  target_tokens=20)
+
+    tx_ids = []
+    threads = [threading.Thread(target=lambda: tx_ids.append(sdk.send_tokens(testnet.address, 1))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(tx_ids)) == 4
+    assert set(sdk.web3.eth.getTransaction(tx_id)['from'] for tx_id in tx_ids) == set(senders)
+    assert [stats['sent'] for stats in sdk.get_sender_stats()] == [2, 2]
+
+    with pytest.raises(ValueError, match='insufficient balance in all sender wallets'):
+        sdk.send_tokens(testnet.address, 1000)
+
+
+def test_sender_pool_reservations():
+    from erc20token.senders import SenderPool
+
+    balances = {'0xa': 10**6}  # in wei, as the node reports them
+    gate = threading.Event()
+    errors = []
+
+    class FakeProvider(object):
+        def make_request(self, method, params):
+            result = hex(balances[params[0]]) if method == 'eth_getBalance' else '0x0'
+            return {'jsonrpc': '2.0', 'id': 0, 'result': result}
+
+    class FakeWeb3(object):
+        providers = [FakeProvider()]
+
+        @staticmethod
+        def fromWei(value, unit):
+            return value
+
+    class FakeContract(object):
+        address = '0xtoken'
+
+        @staticmethod
+        def _encode_transaction_data(name, args):
+            return '0x'
+
+    class FakeManager(object):
+        address = '0xa'
+
+        def get_gas_price(self, urgency):
+            return 10
+
+        def estimate_tx_gas(self, tx):
+            return 21000
+
+        def send_transaction(self, address, amount, data, urgency, gas):
+            assert gas == 21000  # sent with the gas limit its cost was reserved for
+            gate.wait()
+            if errors:
+                raise errors[0]
+            return '0x01'
+
+    pool = SenderPool(FakeWeb3(), FakeContract(), [FakeManager()])
+    cost = 1000 + 21000 * 10
+
+    results = []
+
+    def send_one():
+        try:
+            results.append(pool.send_transaction('0xb', 1000))
+        except ValueError as e:
+            results.append(e)
+
+    def send():
+        sender = threading.Thread(target=send_one)
+        sender.start()
+        for _ in range(100):
+            if pool.get_stats()[0]['pending']:
+                break
+            sleep(0.01)
+        return sender
+
+    sender = send()
+    assert pool.get_stats()[0]['ether_balance'] == 10**6 - cost
+    pool.refresh_balances()  # a refresh keeps the reservation of the transaction being sent
+    assert pool.get_stats()[0]['ether_balance'] == 10**6 - cost
+    gate.set()
+    sender.join()
+    balances['0xa'] -= cost
+    pool.refresh_balances()
+    assert pool.get_stats()[0]['ether_balance'] == 10**6 - cost
+
+    # a failed transaction returns its reservation onto the refreshed balance
+    gate.clear()
+    errors.append(ValueError('rejected'))
+    sender = send()
+    pool.refresh_balances()
+    gate.set()
+    sender.join()
+    assert pool.get_stats()[0]['ether_balance'] == 10**6 - cost
+    assert results == ['0x01', errors[0]]
+
+
+def test_transaction_tracker(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='gas bump blocks must be a non-negative integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.contract_address,
+                       contract_abi=testnet.contract_abi, gas_bump_blocks=-1)
+    with pytest.raises(erc20token.SdkConfigurationError, match='gas bump factor must be a number of at least 1.1'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.contract_address,
+                       contract_abi=testnet.contract_abi, gas_bump_factor=1.05)
+
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                         gas_bump_blocks=3)
+    future = sdk.send_tokens_async(testnet.address, 1)
+    assert sdk.track_transaction(future.tx_id) is future
+    tx_ids = [future.tx_id, sdk.send_ether(testnet.address, Decimal('0.001'))]
+    receipts = sdk.wait_for_receipts(tx_ids, timeout=120)
+    assert [receipt['transactionHash'] for receipt in receipts] == tx_ids
+    assert future.done() and future.result() == erc20token.TransactionStatus.SUCCESS
+    assert future.receipt is receipts[0]
+
+    called = []
+    future.add_done_callback(called.append)
+    assert called == [future]
+
+    stats = sdk.get_tracker_stats()
+    assert stats['in_flight'] == 0 and stats['tracked'] == 2 and stats['mined'] == 2
+    assert sdk.wait_for_receipts(['0xdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeef'],
+                                 timeout=0.1) == [None]
+    assert sdk.get_tracker_stats()['in_flight'] == 0  # tracked only for the wait that timed out
+
+
+def test_transaction_tracker_bump_cap():
+    from erc20token.tracker import TransactionTracker
+
+    class FakeManager(object):
+        sent = []
+
+        def replace_transaction(self, tx, gas_price):
+            assert tx['nonce'] == 1
+            self.sent.append(gas_price)
+            return '0x{}'.format(len(self.sent))
+
+    class FakeEth(object):
+        def getTransaction(self, tx_id):
+            return {'from': '0xAB', 'to': '0xCD', 'nonce': 1, 'gas': 21000, 'gasPrice': 100, 'value': 0,
+                    'input': '0x', 'blockNumber': None}
+
+    class FakeWeb3(object):
+        eth = FakeEth()
+
+    for max_gas_price, bumped_gas_price in ((None, 112), (115, 112), (111, 111), (105, None)):
+        FakeManager.sent = []
+        tracker = TransactionTracker(FakeWeb3(), None, {'0xab': FakeManager()}, bump_blocks=1,
+                                     max_gas_price=max_gas_price)
+        future = tracker.track('0x0')
+        tracker._bump(future)
+        # a replacement must pay at least 10% more, a smaller bump within the cap is not sent
+        assert FakeManager.sent == ([bumped_gas_price] if bumped_gas_price else [])
+        assert future.bumps == (1 if bumped_gas_price else 0)
+
+
+def test_transaction_tracker_expiry():
+    from erc20token.tracker import TransactionTracker
+
+    class FakeProvider(object):
+        def make_request(self, method, params):
+            return {'jsonrpc': '2.0', 'id': 0, 'result': None}  # never mined
+
+    class FakeWeb3(object):
+        providers = [FakeProvider()]
+
+    tracker = TransactionTracker(FakeWeb3(), None, expire_blocks=2)
+    dropped, untracked = tracker.track('0x1'), tracker.track('0x2')
+    called = []
+    untracked.add_done_callback(called.append)
+    assert tracker.untrack('0x2') and not tracker.untrack('0x2')
+    assert called == [untracked] and untracked.cancelled() and untracked.result(0) is None
+
+    tracker.poll()
+    assert not dropped.done()
+    tracker.poll(new_block=False)  # only new blocks count
+    tracker.poll()
+    assert dropped.done() and dropped.cancelled() and dropped.result() is None
+    assert tracker.get_future('0x1') is None
+    stats = tracker.stats()
+    assert stats['in_flight'] == 0 and stats['tracked'] == 2 and stats['expired'] == 1 and stats['mined'] == 0
+
+
+def test_gas_price_oracle(testnet):
+    with pytest.raises(erc20token.SdkConfigurationError, match='gas oracle blocks must be a positive integer'):
+        erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.contract_address,
+                       contract_abi=testnet.contract_abi, gas_oracle_interval=1, gas_oracle_blocks=0)
+
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                         gas_oracle_interval=1, gas_oracle_blocks=5)
+    for _ in range(50):
+        if sdk.get_gas_oracle_stats()['refreshes']:
+            break
+        sleep(0.1)
+    stats = sdk.get_gas_oracle_stats()
+    assert stats['refreshes'] and stats['blocks'] <= 5
+    assert sdk.get_gas_price('slow') <= sdk.get_gas_price('standard') <= sdk.get_gas_price('fast')
+    assert sdk.get_metrics()['gas_oracle']['refreshes']
+
+    with pytest.raises(ValueError, match='urgency must be one of'):
+        sdk.send_tokens(testnet.address, 1, urgency='urgent')
+    tx_id = sdk.send_tokens(testnet.address, 1, urgency='fast')
+    gas_price = sdk.web3.eth.getTransaction(tx_id)['gasPrice']
+    assert sdk.web3.fromWei(gas_price, 'gwei') == sdk.get_gas_price('fast')
+
+    poller = sdk._gas_oracle._poller
+    sdk._gas_oracle.stop()
+    assert not poller.is_alive()
+
+
+def test_transaction_signer(testnet):
+    from ethereum.transactions import Transaction
+    import rlp
+    from erc20token import signing
+    from erc20token.signing import TransactionSigner
+
+    signer = TransactionSigner(testnet.private_key)
+    for nonce, to, value, data in [(0, testnet.contract_address, 0, b'\xa9\x05\x9c\xbb' + b'\x00' * 64),
+                                   (200, testnet.address, 10 ** 18, b''), (2 ** 20, testnet.address, 1, b'\x01')]:
+        tx = Transaction(nonce=nonce, gasprice=10 ** 10, startgas=60000, to=to, value=value, data=data)
+        expected = '0x' + binascii.hexlify(rlp.encode(tx.sign(testnet.private_key))).decode()
+        assert signer.sign(nonce, 10 ** 10, 60000, to, value, data) == expected
+
+    # EIP-155
+    raw_tx = TransactionSigner(testnet.private_key, chain_id=3).sign(1, 10 ** 10, 21000, testnet.address, 1, b'')
+    tx = rlp.decode(binascii.unhexlify(raw_tx[2:]), Transaction)
+    assert tx.v in (41, 42) and tx.sender == binascii.unhexlify(testnet.address[2:].lower())
+
+    # a batch signed in the shared thread pool
+    signer = TransactionSigner(testnet.private_key, threads=2, parallel_threshold=4)
+    other_signer = TransactionSigner(testnet.private_key, threads=2, parallel_threshold=4)
+    txs = [(nonce, 10 ** 10, 21000, testnet.address, 1, b'') for nonce in range(8)]
+    assert signer.sign_batch(txs) == [signer.sign(*tx) for tx in txs]
+    assert other_signer.sign_batch(txs) == signer.sign_batch(txs)
+    assert len(signing._pools) == 1 and signing._pools[2][1] == 2
+    signer.close()
+    other_signer.close()
+    assert not signing._pools
+
+
+def test_send_batch(test_sdk, testnet):
+    with pytest.raises(ValueError, match='amount must be positive'):
+        test_sdk.send_tokens_batch([(testnet.address, 1), (testnet.address, 0)])
+    with pytest.raises(ValueError, match="'0xBAD' is not an address"):
+        test_sdk.send_ether_batch([(testnet.address, 1), ('0xBAD', 1)])
+
+    start_nonce = test_sdk.web3.eth.getTransactionCount(testnet.address, 'pending')
+    results = test_sdk.send_tokens_batch([(testnet.address, 1)] * 3)
+    assert len(results) == 3
+    assert all(not isinstance(result, Exception) for result in results)
+    nonces = [test_sdk.web3.eth.getTransaction(tx_id)['nonce'] for tx_id in results]
+    assert nonces == list(range(start_nonce, start_nonce + 3))
+
+    # a rejected payment in the middle passes its nonce on to the next one
+    results = test_sdk.send_ether_batch([(testnet.address, Decimal('0.001')), (testnet.address, 100),
+                                         (testnet.address, Decimal('0.001'))])
+    assert not isinstance(results[0], Exception)
+    assert isinstance(results[1], ValueError)
+    assert not isinstance(results[2], Exception)
+    assert test_sdk.web3.eth.getTransaction(results[2])['nonce'] == start_nonce + 4
+    assert test_sdk._tx_manager.local_nonce == start_nonce + 5
+
+
+def test_send_batch_nonce_resequencing(testnet):
+    from erc20token.sdk import TransactionManager
+
+    class FakeNode(object):
+        """Accepts transactions signed by FakeSigner, the pending nonce is the first nonce not taken."""
+        def __init__(self, nonce, rejected_address):
+            self.nonce = nonce
+            self.rejected_address = rejected_address
+            self.taken = {}  # nonce -> address
+
+        def make_request(self, method, params):
+            if method == 'eth_getTransactionCount':
+                nonce = self.nonce
+                while nonce in self.taken:
+                    nonce += 1
+                return {'result': hex(nonce)}
+            nonce, address = params[0].split(':')
+            if int(nonce) in self.taken:
+                return {'error': {'code': -32000, 'message': 'nonce too low'}}
+            if address == self.rejected_address:
+                return {'error': {'code': -32000, 'message': 'insufficient funds for gas * price + value'}}
+            self.taken[int(nonce)] = address
+            return {'result': '0x' + address}
+
+    class FakeSigner(object):
+        def sign(self, nonce, gas_price, gas, to, value, data):
+            return '{}:{}'.format(nonce, to)
+
+        def sign_batch(self, transactions):
+            return [self.sign(*tx) for tx in transactions]
+
+    node = FakeNode(5, 'b')
+
+    class FakeEth(object):
+        def getTransactionCount(self, address, block_identifier):
+            return int(node.make_request('eth_getTransactionCount', [address, block_identifier])['result'], 16)
+
+    class FakeWeb3(object):
+        providers = [node]
+        eth = FakeEth()
+
+    manager = TransactionManager(FakeWeb3(), testnet.private_key, testnet.address, None, 1, 21000,
+                                 pipelined_nonce=True)
+    manager.signer = FakeSigner()
+    assert manager.local_nonce == 5
+    node.taken[5] = 'other'  # another client took the next nonce
+
+    items = [(address, 0, b'') for address in ('a', 'b', 'c', 'd')]
+    results = manager._send_batch(items, [21000] * len(items), 10 ** 9)
+    assert results[0] == '0xa' and results[2] == '0xc' and results[3] == '0xd'
+    assert isinstance(results[1], ValueError)
+    # the nonce of the rejected transaction went to the retried one, so there is no gap
+    assert node.taken == {5: 'other', 6: 'a', 7: 'c', 8: 'd'}
+    assert manager.local_nonce == 9
+
+
+def test_gas_cache(testnet):
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                         gas_cache_ttl=60)
+    assert sdk.get_gas_cache_stats() == {'hits': 0, 'misses': 0, 'resamples': 0, 'size': 0}
+    sdk.send_tokens(testnet.address, 1)
+    sdk.send_tokens(testnet.address, 1)
+    sdk.send_ether(testnet.address, Decimal('0.001'))
+    stats = sdk.get_gas_cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['size'] == 2
+
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi)
+    assert sdk.get_gas_cache_stats() is None
+
+
+def test_gas_cache_recipient_lookups():
+    from erc20token.gas import GasEstimateCache, ERC20_TRANSFER_SELECTOR
+
+    class FakeContract(object):
+        address = '0x' + 'ab' * 20
+    cache = GasEstimateCache(None, FakeContract())  # without web3, a request from the cache would fail
+    tx = {'to': FakeContract.address, 'value': 0,
+          'data': ERC20_TRANSFER_SELECTOR + b'\x00' * 12 + b'\xcd' * 20 + b'\x00' * 31 + b'\x01'}
+    assert cache.get(tx) is None  # the recipient balance is not known yet
+    cache.set(tx, 50000)
+    assert cache.stats()['size'] == 0
+
+    lookups = cache.get_recipient_calls([tx, tx])
+    assert len(lookups) == 1
+    key, (method, params) = lookups[0]
+    assert key == ('zero_balance', '0x' + 'cd' * 20)
+    assert method == 'eth_call' and params[0]['to'] == FakeContract.address
+    cache.set_recipient_info(key, {'result': '0x' + '0' * 64})
+    assert cache.get_recipient_calls([tx]) == []
+
+    cache.set(tx, 50000)
+    assert cache.get(tx) == 50000
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'resamples': 0, 'size': 1}
+
+
 def test_send_tokens_fail(test_sdk, testnet):
     with pytest.raises(ValueError, match='amount must be positive'):
         test_sdk.send_tokens(testnet.address, 0)
@@ -268,6 +958,22 @@ def test_send_tokens_fail(test_sdk, testnet):
     # but will result in failed onchain transaction
 
 
+def test_chain_head(testnet):
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, contract_address=testnet.address,
+                         contract_abi=testnet.contract_abi, head_staleness=60)
+    block_number = sdk._chain_head.get_block_number()
+    assert block_number == sdk.web3.eth.blockNumber
+    assert sdk._chain_head.get_block_hash(block_number) == sdk.web3.eth.getBlock(block_number)['hash']
+    updated_at = sdk._chain_head.updated_at
+    assert sdk._chain_head.get_block_number() == block_number
+    assert sdk._chain_head.updated_at == updated_at  # fresh enough, not fetched again
+
+    # a late notification of an older block does not move the head back
+    sdk._chain_head.update(block_number + 1, '0x01')
+    sdk._chain_head.update(block_number, sdk._chain_head.get_block_hash(block_number))
+    assert sdk._chain_head.get_block_number() == block_number + 1
+
+
 def test_get_transaction_status(test_sdk, testnet):
     # unknown transaction
     tx_status = test_sdk.get_transaction_status('0xdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeef')
@@ -307,10 +1013,58 @@ def test_get_transaction_data(test_sdk, testnet):
         tx_block_number = int(tx['blockNumber'])
         cur_block_number = int(test_sdk.web3.eth.blockNumber)
         calc_confirmations = cur_block_number - tx_block_number + 1
-        tx_data = test_sdk.get_transaction_data(tx_id)
+        # without head staleness, the SDK block number is not older than the one fetched above
+        sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri,
+                             contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                             head_staleness=0)
+        tx_data = sdk.get_transaction_data(tx_id)
         assert tx_data.num_confirmations == calc_confirmations or tx_data.num_confirmations == calc_confirmations + 1
 
 
+def test_transaction_cache(testnet):
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                         tx_cache_size=10, tx_cache_confirmations=1)
+    unknown_tx_id = '0xdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeef'
+    assert sdk.get_transaction_status(unknown_tx_id) == erc20token.TransactionStatus.UNKNOWN
+    assert sdk._tx_cache.get_final(unknown_tx_id) is None  # unknown transactions are not cached
+
+    tx_id = sdk.send_ether(testnet.address, Decimal('0.001'))
+    for wait in range(0, 90):
+        if sdk.get_transaction_status(tx_id) > erc20token.TransactionStatus.PENDING:
+            break
+        sleep(1)
+    tx_data = sdk.get_transaction_data(tx_id)
+    assert tx_data.status == erc20token.TransactionStatus.SUCCESS
+    assert sdk._tx_cache.get_final(tx_id)
+    hits = sdk._tx_cache.hits
+    tx_data = sdk.get_transaction_data(tx_id)
+    assert tx_data.status == erc20token.TransactionStatus.SUCCESS
+    assert tx_data.ether_amount == Decimal('0.001')
+    assert tx_data.num_confirmations >= 1
+    assert sdk.get_transactions_data([tx_id])[0].status == erc20token.TransactionStatus.SUCCESS
+    assert sdk._tx_cache.hits == hits + 2
+
+
+def test_get_transactions_data(test_sdk, testnet):
+    unknown_tx_id = '0xdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeefdeadbeef'
+    assert test_sdk.get_transactions_data([]) == []
+    tx_data_list = test_sdk.get_transactions_data([unknown_tx_id, unknown_tx_id])
+    assert len(tx_data_list) == 2
+    assert tx_data_list[0].status == tx_data_list[1].status == erc20token.TransactionStatus.UNKNOWN
+    assert tx_data_list[0].num_confirmations == -1
+
+    # some tests for Ropsten only
+    if testnet.type == 'ropsten':
+        tx_id = '0x94d0ca03b3e5c132d3821c6fa416d74bab7e77969d5293a0df73ae7e15b46d7f'
+        tx_data_list = test_sdk.get_transactions_data([tx_id, unknown_tx_id])
+        assert tx_data_list[0].status == erc20token.TransactionStatus.SUCCESS
+        assert tx_data_list[0].to_address.lower() == testnet.address.lower()
+        assert tx_data_list[0].ether_amount == Decimal('0.001')
+        assert tx_data_list[0].num_confirmations >= 1
+        assert tx_data_list[1].status == erc20token.TransactionStatus.UNKNOWN
+
+
 def monitor_ether_transactions(test_sdk, testnet):
     tx_statuses = {}
 
@@ -426,6 +1180,369 @@ def monitor_token_transactions(test_sdk, testnet):
     assert tx_data.num_confirmations >= 1
 
 
+def test_monitor_token_transactions_with_logs(test_sdk, testnet):
+    tx_statuses = {}
+
+    def my_callback(tx_id, status, from_address, to_address, amount):
+        if tx_id not in tx_statuses:  # not mine, skip it
+            return
+        assert from_address.lower() == testnet.address.lower()
+        assert to_address.lower() == testnet.address.lower()
+        assert amount == 10
+        tx_statuses[tx_id] = status
+
+    test_sdk.monitor_token_transactions(my_callback, from_address=testnet.address, to_address=testnet.address,
+                                        use_logs=True)
+    tx_id = test_sdk.send_tokens(testnet.address, 10)
+    tx_statuses[tx_id] = erc20token.TransactionStatus.UNKNOWN
+    for wait in range(0, 90):
+        if tx_statuses[tx_id] == erc20token.TransactionStatus.SUCCESS:
+            break
+        sleep(1)
+    assert tx_statuses[tx_id] == erc20token.TransactionStatus.SUCCESS
+
+    stats = test_sdk.get_monitor_stats()
+    assert stats
+    for filter_stats in stats.values():
+        assert filter_stats['polls'] > 0
+    assert sum(filter_stats['entries'] for filter_stats in stats.values()) > 0
+
+
+def test_monitor_with_callback_workers(testnet):
+    sdk = erc20token.SDK(provider_endpoint_uri=testnet.provider_endpoint_uri, private_key=testnet.private_key,
+                         contract_address=testnet.contract_address, contract_abi=testnet.contract_abi,
+                         callback_workers=2, callback_queue_size=1, callback_policy='spill')
+    tx_statuses = {}
+    callback_threads = set()
+
+    def my_callback(tx_id, status, from_address, to_address, amount):
+        if tx_id not in tx_statuses:  # not mine, skip it
+            return
+        sleep(0.1)  # a slow callback
+        callback_threads.add(threading.current_thread().name)
+        assert status >= tx_statuses[tx_id]  # events of the same transaction arrive in order
+        tx_statuses[tx_id] = status
+
+    sdk.monitor_ether_transactions(my_callback, from_address=testnet.address)
+    tx_id = sdk.send_ether(testnet.address, Decimal('0.001'))
+    tx_statuses[tx_id] = erc20token.TransactionStatus.UNKNOWN
+    for wait in range(0, 90):
+        if tx_statuses[tx_id] == erc20token.TransactionStatus.SUCCESS:
+            break
+        sleep(1)
+    assert tx_statuses[tx_id] == erc20token.TransactionStatus.SUCCESS
+    assert threading.current_thread().name not in callback_threads
+
+    stats = sdk.get_callback_stats()
+    assert stats['completed'] > 0
+    assert stats['callback_time_max'] >= 0.1
+    assert stats['queue_depth'] >= 0
+
+
+def test_callback_executor_policies(tmpdir):
+    from erc20token.executor import CallbackExecutor
+
+    for policy, expected_calls in (('block', [0, 1, 2, 3, 4]), ('drop_oldest', [0, 3, 4]),
+                                   ('spill', [0, 1, 2, 3, 4])):
+        gate = threading.Event()
+        calls = []
+
+        def callback(number):
+            if number == 0:
+                gate.wait()  # keep the single worker busy, while the queue fills up
+            calls.append(number)
+        executor = CallbackExecutor(1, queue_size=2, policy=policy, spill_dir=str(tmpdir))
+        executor.submit('key', callback, 0)
+        for _ in range(50):
+            if calls or not executor.stats()['queue_depth']:
+                break
+            sleep(0.01)
+        submitter = threading.Thread(target=lambda: [executor.submit('key', callback, number)
+                                                     for number in range(1, 5)])
+        submitter.daemon = True
+        submitter.start()
+        submitter.join(0.5)
+        assert submitter.is_alive() == (policy == 'block')  # a full queue blocks the submitter
+
+        gate.set()
+        submitter.join(5)
+        done = threading.Event()
+        executor.call_when_done(done.set)
+        assert done.wait(5)
+        assert calls == expected_calls
+        stats = executor.stats()
+        assert stats['dropped'] == (2 if policy == 'drop_oldest' else 0)
+        assert stats['spilled'] == (2 if policy == 'spill' else 0)
+        assert stats['completed'] == len(expected_calls)
+        assert not executor._spilled_callbacks  # released once their spilled events ran
+        executor.shutdown()
+
+
+def test_iter_token_transfers(test_sdk, testnet):
+    with pytest.raises(ValueError):
+        test_sdk.iter_token_transfers(0, from_address='0xbad')
+
+    tx_id = test_sdk.send_tokens(testnet.address, 10)
+    for wait in range(0, 90):
+        if test_sdk.get_transaction_status(tx_id) > erc20token.TransactionStatus.PENDING:
+            break
+        sleep(1)
+    tx_block = test_sdk.web3.eth.getTransaction(tx_id)['blockNumber']
+
+    transfers = list(test_sdk.iter_token_transfers(max(0, tx_block - 50), 'latest', from_address=testnet.address,
+                                                   workers=2, chunk_size=7))
+    assert [(t.block_number, t.log_index) for t in transfers] == \
+        sorted((t.block_number, t.log_index) for t in transfers)
+    mine = [t for t in transfers if t.tx_id == tx_id]
+    assert len(mine) == 1
+    assert mine[0].from_address.lower() == testnet.address.lower()
+    assert mine[0].to_address.lower() == testnet.address.lower()
+    assert mine[0].token_amount == 10
+    assert mine[0].block_number == tx_block
+
+
+def test_log_scanner_chunks():
+    from erc20token.backfill import LogScanner
+
+    class FakeProvider(object):
+        """One log per block, ranges with more than max_logs logs are refused."""
+        def __init__(self, max_logs):
+            self.max_logs = max_logs
+            self.ranges = []
+
+        def make_request(self, method, params):
+            start, end = int(params[0]['fromBlock'], 16), int(params[0]['toBlock'], 16)
+            self.ranges.append((start, end))
+            if end - start + 1 > self.max_logs:
+                return {'error': {'code': -32005, 'message': 'query returned more than 10000 results'}}
+            return {'result': [{'blockNumber': number} for number in range(start, end + 1)]}
+
+    provider = FakeProvider(10)
+    scanner = LogScanner(provider, workers=2, chunk_size=50)
+    logs = list(scanner.iter_logs({'address': '0x0'}, 0, 99))
+    assert [log['blockNumber'] for log in logs] == list(range(100))
+    assert (0, 49) in provider.ranges  # refused, and split in halves
+    assert (0, 24) in provider.ranges
+    assert scanner.chunk_size < 50  # the following chunks are smaller
+
+    scanner = LogScanner(FakeProvider(0), workers=2, chunk_size=4)
+    with pytest.raises(ValueError, match='too many logs in block 0'):
+        list(scanner.iter_logs({'address': '0x0'}, 0, 7))
+
+
+def test_monitor_with_checkpoint(test_sdk, testnet, tmpdir):
+    from erc20token.checkpoint import SQLiteCheckpointStore
+    store = SQLiteCheckpointStore(str(tmpdir.join('checkpoints.db')))
+    tx_statuses = {}
+
+    def my_callback(tx_id, status, from_address, to_address, amount):
+        if tx_id in tx_statuses:
+            tx_statuses[tx_id] = status
+
+    # a new monitor records the current block
+    subscription_id = test_sdk.monitor_token_transactions(my_callback, to_address=testnet.address,
+                                                          checkpoint_store=store, checkpoint_key='deposits')
+    start_block = store.get_checkpoint('deposits')
+    assert start_block is not None
+    test_sdk.stop_monitoring(subscription_id)
+
+    # a transfer made while the monitor is down is called back on restart
+    tx_id = test_sdk.send_tokens(testnet.address, 10)
+    tx_statuses[tx_id] = erc20token.TransactionStatus.UNKNOWN
+    for wait in range(0, 90):
+        if test_sdk.get_transaction_status(tx_id) > erc20token.TransactionStatus.PENDING:
+            break
+        sleep(1)
+    test_sdk.monitor_token_transactions(my_callback, to_address=testnet.address, checkpoint_store=store,
+                                        checkpoint_key='deposits')
+    assert tx_statuses[tx_id] == erc20token.TransactionStatus.SUCCESS
+    assert store.get_checkpoint('deposits') >= test_sdk.web3.eth.getTransaction(tx_id)['blockNumber']
+
+
+def test_monitor_confirmations(test_sdk, testnet):
+    if testnet.type == 'testrpc':
+        pytest.skip("testrpc mines a block per transaction, confirmations are not reached")
+    confirmations = {}
+
+    def my_callback(tx_id, status, from_address, to_address, amount):
+        pass
+
+    def my_confirmation_callback(tx_id, status, num_confirmations):
+        if tx_id in confirmations:
+            assert status == erc20token.TransactionStatus.SUCCESS
+            confirmations[tx_id].append(num_confirmations)
+
+    with pytest.raises(ValueError, match='confirmations must be a list of positive integers'):
+        test_sdk.monitor_token_transactions(my_callback, to_address=testnet.address,
+                                            confirmation_fn=my_confirmation_callback, confirmations=[0])
+
+    test_sdk.monitor_token_transactions(my_callback, to_address=testnet.address,
+                                        confirmation_fn=my_confirmation_callback, confirmations=[1, 2])
+    tx_id = test_sdk.send_tokens(testnet.address, 10)
+    confirmations[tx_id] = []
+    for wait in range(0, 180):
+        if len(confirmations[tx_id]) == 2:
+            break
+        sleep(1)
+    assert confirmations[tx_id] == [1, 2]
+
+
+def test_confirmation_tracker_reorg():
+    from erc20token.chain import ConfirmationTracker
+
+    def block(name, parent):
+        return {'hash': name, 'parentHash': parent}
+    blocks = dict((name, block(name, parent)) for name, parent in
+                  (('a1', 'a0'), ('a2', 'a1'), ('a3', 'a2'), ('a4', 'a3'), ('a5', 'a4'),
+                   ('b4', 'a3'), ('b5', 'b4'), ('b6', 'b5')))
+    fetched = []
+
+    def get_block(block_hash):
+        fetched.append(block_hash)
+        return blocks.get(block_hash)
+
+    tracker = ConfirmationTracker()
+    for number in range(1, 6):
+        name = 'a{}'.format(number)
+        assert tracker.on_block(number, name, blocks[name]['parentHash'], get_block) == []
+    assert fetched == []  # the chain was extended, nothing to follow back
+
+    assert tracker.watch('tx1', 4, 'a4', 'sub', [1, 3], 'arg') == [('tx1', 'sub', 1, ('arg',))]
+    assert tracker.watch('tx2', 2, 'a2', 'sub', [10]) == []
+
+    # the new chain forks after block 3: blocks 4 and 5 are orphaned and tx1 is reverted
+    assert tracker.on_block(6, 'b6', 'b5', get_block) == [('tx1', 'sub', 0, ('arg',))]
+    assert fetched == ['b5', 'b4']
+    assert tracker.reorgs == 1
+    assert tracker.head == 6
+
+    # a late notification of a known block and an extension of the new chain need no requests
+    assert tracker.on_block(6, 'b6', 'b5', get_block) == []
+    assert tracker.on_block(7, 'b7', 'b6', get_block) == []
+    assert fetched == ['b5', 'b4']
+    assert tracker.reorgs == 1
+    assert tracker.is_watching()
+    tracker.unwatch('sub')
+    assert not tracker.is_watching()
+
+
+def test_decoder():
+    from erc20token.decoder import decode_input, decode_transfer_input, decode_block_calls
+    address = '0x' + 'ab' * 20
+    transfer_input = '0xa9059cbb' + address[2:].rjust(64, '0') + hex(10 ** 18)[2:].rstrip('L').rjust(64, '0')
+    assert decode_transfer_input(transfer_input) == (address, 10 ** 18)
+    assert decode_input(transfer_input) == ('transfer', (address, 10 ** 18))
+    assert decode_input('0x23b872dd' + '0' * 64 + address[2:].rjust(64, '0') + '0' * 63 + '5') == \
+        ('transferFrom', ('0x' + '0' * 40, address, 5))
+    assert decode_input('0x095ea7b3' + address[2:].rjust(64, '0') + '0' * 63 + '1') == ('approve', (address, 1))
+    assert decode_transfer_input(transfer_input[:-2]) is None  # too short
+    assert decode_transfer_input('0x') is None
+    assert decode_input('0x12345678' + '0' * 128) is None
+
+    txs = [{'to': address, 'input': '0x'}, {'to': '0xCD' + 'cd' * 19, 'input': transfer_input},
+           {'to': None, 'input': transfer_input}]
+    assert decode_block_calls(txs, '0x' + 'cd' * 20) == [(txs[1], 'transfer', (address, 10 ** 18))]
+
+
+def test_get_token_transfers(test_sdk, testnet):
+    tx_id = test_sdk.send_tokens(testnet.address, 10)
+    for wait in range(0, 90):
+        if test_sdk.get_transaction_status(tx_id) > erc20token.TransactionStatus.PENDING:
+            break
+        sleep(1)
+    tx_block = test_sdk.web3.eth.getTransaction(tx_id)['blockNumber']
+
+    batch = test_sdk.get_token_transfers(max(0, tx_block - 50), tx_block)
+    assert isinstance(batch, erc20token.TransferBatch)
+    assert list(batch.block_numbers) == sorted(batch.block_numbers)
+    mine = batch.select([index for index, batch_tx_id in enumerate(batch.tx_ids) if batch_tx_id == tx_id])
+    assert len(mine) == 1
+    assert mine[0] == (tx_id, testnet.address.lower(), testnet.address.lower(), 10 * 10 ** 18, tx_block, mine[0][5])
+    assert len(batch.filter(from_address=testnet.address, to_address=testnet.address)) >= 1
+    assert batch.filter(to_address='0x' + '0' * 40).total_amount() == 0
+
+
+def test_transaction_data_slots():
+    tx_data = erc20token.TransactionData()
+    assert tx_data.status == erc20token.TransactionStatus.UNKNOWN
+    assert tx_data.num_confirmations == -1
+    with pytest.raises(AttributeError):
+        tx_data.unknown_field = 1
+
+
+class FakeFilter(object):
+    def __init__(self, filter_id):
+        self.filter_id = filter_id
+
+    def is_valid_entry(self, entry):
+        return True
+
+    def format_entry(self, entry):
+        return entry
+
+
+class FakeFilterWeb3(object):
+    """A web3 stand-in whose filters return one new entry per poll."""
+    def __init__(self):
+        self.eth = self
+        self.installed = []
+        self.uninstalled = []
+
+    def filter(self, params):
+        self.installed.append(params)
+        return FakeFilter(str(len(self.installed)))
+
+    def getFilterChanges(self, filter_id):
+        return ['{}-{}'.format(filter_id, time())]
+
+    def uninstallFilter(self, filter_id):
+        self.uninstalled.append(filter_id)
+
+
+def test_filter_manager_dispatch():
+    from erc20token.sdk import FilterManager
+    web3 = FakeFilterWeb3()
+    manager = FilterManager(web3, block_time=0.05, min_poll_interval=0.05, max_poll_interval=0.2)
+
+    slow_entries = []
+    fast_entries = []
+    manager.add_filter('latest', lambda entry: slow_entries.append(entry) or sleep(5))
+    manager.add_filter('pending', fast_entries.append)
+    assert all(stats['poll_interval'] == 0.05 for stats in manager.get_stats().values())
+    sleep(1)
+    # the slow callback blocks only its own filter
+    assert len(slow_entries) == 1
+    assert len(fast_entries) > 5
+    assert manager.get_stats()[json.dumps('latest')]['queued'] > 0
+
+    manager.remove_filters()
+    assert sorted(web3.uninstalled) == ['1', '2']
+    assert manager.filters == {}
+
+    # the scheduler restarts after remove_filters
+    restarted_entries = []
+    manager.add_filter('pending', restarted_entries.append)
+    sleep(0.5)
+    assert len(restarted_entries) > 2
+    manager.remove_filters()
+
+
+def test_stop_monitoring(test_sdk, testnet):
+    def my_callback(tx_id, status, from_address, to_address, amount):
+        pass
+
+    with pytest.raises(ValueError, match='either from_address or to_address or both must be provided'):
+        test_sdk.monitor_ether_transactions(my_callback)
+
+    ether_subscription_id = test_sdk.monitor_ether_transactions(my_callback, to_address=testnet.address)
+    token_subscription_id = test_sdk.monitor_token_transactions(my_callback, from_address=testnet.address,
+                                                                use_logs=True)
+    assert ether_subscription_id != token_subscription_id
+    assert test_sdk.stop_monitoring(ether_subscription_id)
+    assert test_sdk.stop_monitoring(token_subscription_id)
+    assert not test_sdk.stop_monitoring(token_subscription_id)
+
+
 def test_monitor_ether_transactions(test_sdk, testnet):
     if testnet.type == 'ropsten':
         pytest.skip("test is skipped in ropsten in favor of concurrent test")